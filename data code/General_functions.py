@@ -19,7 +19,7 @@ Created on Wed Feb 14 16:18:21 2018
 ##############################################
 ##############################################
 
-from numpy import array, matrix, roll, dot, tile, cumsum, random
+from numpy import array, matrix, roll, dot, tile, cumsum, random, asarray, arange, diff, nonzero, where, unique, ones, zeros, searchsorted
 
 ############################################################
 #  find the local maxima and minima ("peaks") in a vector  #
@@ -69,6 +69,61 @@ def FindPeakLocations(vector1,vector2,delta): # vector1 and vector 2 are linear
                     
     return max_peaks,min_peaks
 
+##########################################################################
+#  find the local maxima and minima ("peaks") in one or several vectors  #
+##########################################################################
+
+def FindPeakLocationsVectorized(vector1,vector2,delta,compact=False): # vector1 is a linear array (or a 2D array, one row per day), vector2 the matching labels, delta the threshold to compare the points
+
+    """find the local maxima and minima ("peaks") in a vector, with the same rules as FindPeakLocations but computed with numpy masks in O(n).
+    vector1 can also be a 2D array (e.g. the loadcurve, one row per day): each row is then processed independently, in one single call.
+    
+    - **Input**:
+        - :vector1: linear array (or list) of data, or 2D array of data with one sequence per row
+        - :vector2: linear array (or list) of labels (e.g. time points), one per column of vector1 => None (or vector1 itself for linear data) to use the regular index
+        - :delta: the threshold to compare the points
+        - :compact: if True, the peaks are returned as arrays instead of lists
+    
+    - **Output**:
+        - :max_peaks: dictionnary that contains all maximum peaks of vector1, its index, and the corresponding value in vector2 => for 2D data, a list with one dictionnary per row (compact: one dictionnary with an extra 'day' array)
+        - :min_peaks: dictionnary that contains all minimum peaks of vector1, its index, and the corresponding value in vector2 => same logic as max_peaks"""
+    
+    values = asarray(vector1,dtype=float) # just in case vector1 was not a proper array
+    single = values.ndim==1 # linear data => one single row
+    if single:
+        values = values.reshape(1,-1) # one row, to treat linear and 2D data the same way
+    Nrow, Ncol = values.shape # number of rows (days) and columns (time points)
+    
+    if vector2 is None or (single and list(vector2)==list(vector1)): # if we just need the regular index
+        labels = arange(Ncol) # labels will correspond to the indexes of vector1
+        first = labels # the first occurrence of each label is its own position
+    else:
+        labels = asarray(vector2) # just in case vector2 was not a proper array
+        uniques, first_index, inverse = unique(labels,return_index=True,return_inverse=True) # first position where each distinct label appears
+        first = first_index[inverse] # for each position, the first position holding the same label => equivalent of list(vector2).index(...)
+    
+    rows, cols = nonzero(abs(diff(values,axis=1))>delta) # all jumps above the threshold, row by row
+    cols = cols+1 # position of the point after the jump
+    rising = values[rows,cols]>values[rows,cols-1] # True where the current value is higher than the previous one
+    
+    def collect(pos): # gather the peaks found at positions pos, dropping the ones already added just before
+        keep = ones(len(pos),dtype=bool) # by default, all peaks are kept
+        keep[1:] = (rows[1:]!=rows[:-1]) | (labels[pos[1:]]!=labels[pos[:-1]]) # if we have not already added this peak (new row, or a different label)
+        day, pos = rows[keep], pos[keep] # remaining peaks
+        peaks = {'time':labels[pos],'value':values[day,pos],'index':first[pos]} # same structure as FindPeakLocations, as arrays
+        if compact: # compact index/value arrays
+            if not single:
+                peaks['day'] = day # row (day) of each peak
+            return peaks
+        bounds = searchsorted(day,arange(Nrow+1)) # where the peaks of each row start and end
+        peaks = [{key:peaks[key][bounds[n]:bounds[n+1]].tolist() for key in ('time','value','index')} for n in range(Nrow)] # one dictionnary of lists per row
+        return peaks[0] if single else peaks
+    
+    max_peaks = collect(where(rising,cols,cols-1)) # current=max if rising, previous=max otherwise
+    min_peaks = collect(where(rising,cols-1,cols)) # previous=min if rising, current=min otherwise
+    
+    return max_peaks,min_peaks
+
 ####################################################################################################################
 # Find the hypothetical index of where a value should be in a sorted list containing other values of the same kind # 
 ####################################################################################################################
@@ -116,11 +171,125 @@ def discreteRand(discreteP): # Discrete distribution coefficients, in matrix/arr
     R = random.rand(1)[0] # uses the random module: picks a random number between 0 and 1
     index = array(list(range(len(least))),dtype=int) # all indexes of least vector
     index = index[least>=R] # returns vector containing only least square products that are higher than the random number
-    if len(index)==0: # if no square number was higher than the random number
-        return array([min(least)],dtype=int) # we set the default index any element that has the minimum probability
+    if len(index)==0: # if no square number was higher than the random number (rounding of the last cumulative value)
+        return nonzero(discreteP>0)[0][-1] if (discreteP>0).any() else len(least)-1 # we set the default index to the last element with a non zero probability
     else:
         return index[0] # returns the randomly selected number (index) between 1 and length(discreteP) => The lowest found value that is higher or equal to the random number
 
+###########################################################################
+# Cumulative distributions shared by DiscreteSampler and discreteRandBatch #
+###########################################################################
+
+def _flat_cdf(discreteP):
+
+    """Normalized cumulative distributions of the rows of discreteP ((k,) or (m, k)) in one sorted vector => the distribution of row r is between r and r+1"""
+
+    discreteP = asarray(discreteP,dtype=float)
+    cum = cumsum(discreteP.reshape(-1,discreteP.shape[-1]),axis=1)
+    cum = cum/cum[:,-1:]
+    cum[:,-1] = 1 # no rounding at the end of each distribution
+    return (cum+arange(len(cum))[:,None]).ravel()
+
+def _search_cdf(flat,k,u,rows):
+
+    """Indexes drawn with the uniform numbers u from the rows of a _flat_cdf vector => the first index whose cumulative probability is higher than the random number"""
+
+    return (searchsorted(flat,u+rows,side='right')-rows*k).clip(0,k-1)
+
+###########################################################################
+# Reusable sampler of one or several discrete distributions (alias method) #
+###########################################################################
+
+class DiscreteSampler(object):
+
+    """Sampler of one or several discrete distributions, built once and reused for all the draws (e.g. the start probabilities of a device per slot, every day)
+
+    With the alias method (Vose), each distribution is turned into a table of k (probability, alias) pairs: a draw picks one
+    of the k columns uniformly, then the column itself or its alias => O(1) per draw whatever k. The 'cdf' method keeps the
+    cumulative distributions instead (O(log k) per draw, cf: discreteRandBatch).
+
+    - **Input**:
+        - :discreteP: discrete distribution coefficients => (k,) for one distribution, (m, k) for m distributions (one per row). Do not have to be normalized.
+        - :method: 'alias' or 'cdf'
+        - :generator: numpy.random.Generator (or a seed) used by the draws => a new unseeded one if None"""
+
+    def __init__(self,discreteP,method='alias',generator=None):
+        from numpy import atleast_2d
+
+        P = atleast_2d(asarray(discreteP,dtype=float))
+        if (P<0).any() or not (P.sum(axis=1)>0).all():
+            raise ValueError('the distributions must have non negative coefficients and a positive sum')
+        if method not in ('alias','cdf'):
+            raise ValueError("unknown method, must be 'alias' or 'cdf'")
+        self.single = asarray(discreteP).ndim==1
+        self.method = method
+        self.generator = generator if isinstance(generator,random.Generator) else random.default_rng(generator)
+        self.m, self.k = P.shape
+        P = P/P.sum(axis=1,keepdims=True)
+
+        if method=='cdf':
+            self.flat = _flat_cdf(P)
+            return
+
+        self.prob = zeros((self.m,self.k)) # probability to keep the column
+        self.alias = zeros((self.m,self.k),dtype=int) # the other index of the column
+        for r in range(self.m): # Vose alias method, one distribution at a time
+            scaled = list(P[r]*self.k)
+            small = [i for i in range(self.k) if scaled[i]<1]
+            large = [i for i in range(self.k) if scaled[i]>=1]
+            while small and large:
+                l, g = small.pop(), large.pop()
+                self.prob[r,l], self.alias[r,l] = scaled[l], g
+                scaled[g] = scaled[g]+scaled[l]-1 # the rest of g
+                (small if scaled[g]<1 else large).append(g)
+            for i in small+large: # what is left is 1 (up to rounding)
+                self.prob[r,i], self.alias[r,i] = 1, i
+
+    def sample(self,size=None,rows=None):
+
+        """Random indexes drawn from the distributions
+
+        - **Input**:
+            - :size: number of draws from the single distribution (or from the first one)
+            - :rows: for m distributions, the distribution (row) of each draw
+
+        - **Output**:
+            - :indexes: array of the randomly selected indexes"""
+
+        rows = zeros(int(size or 1),dtype=int) if rows is None else asarray(rows,dtype=int) # all from the first distribution if no rows
+        u = self.generator.random(len(rows))
+        if self.method=='cdf':
+            return _search_cdf(self.flat,self.k,u,rows)
+        column = u*self.k
+        index = column.astype(int).clip(0,self.k-1) # uniform column
+        keep = (column-index)<self.prob[rows,index] # the fractional part is a second uniform number
+        return where(keep,index,self.alias[rows,index])
+
+###########################################################################
+# Picks many random indexes from one or several discrete distributions   #
+###########################################################################
+
+def discreteRandBatch(discreteP,size=None,rows=None,generator=None):
+
+    """Picks random indexes from one or several discrete distributions at once, with cumulative sums and a binary search (cumsum + searchsorted)
+
+    - **Input**:
+        - :discreteP: discrete distribution coefficients => (k,) for one distribution, (m, k) for m distributions (one per row). Do not have to be normalized.
+        - :size: number of draws (one distribution), ignored if rows is given
+        - :rows: for m distributions, the row (distribution) of each draw
+        - :generator: numpy.random.Generator => a new unseeded one if None
+
+    - **Output**:
+        - :indexes: array of the randomly selected indexes"""
+
+    generator = generator or random.default_rng()
+    discreteP = asarray(discreteP,dtype=float)
+    flat = _flat_cdf(discreteP)
+    if discreteP.ndim==1:
+        return _search_cdf(flat,len(discreteP),generator.random(size),0)
+    rows = asarray(rows,dtype=int)
+    return _search_cdf(flat,discreteP.shape[1],generator.random(len(rows)),rows)
+
 
 ############################################################
 # Returns random vectors drawn from a single GaussD object #
@@ -173,6 +342,35 @@ def randGaussianV2(mean,stdev,coveigen,datasize,nData):
     R = R + tile(mu, (1, nData)) # create copies of the Matrix
     return random.choice(array(R)[0])
 
+#####################################################################
+# Returns many random vectors drawn from a multivariate Gaussian    #
+#####################################################################
+
+def randGaussianBatch(mean,cov,nData,generator=None):
+
+    """Returns random vectors drawn from a multivariate Gaussian, all at once
+
+    - **Input**:
+         :mean: mean vector of the distribution (d,)
+         :cov: covariance matrix (d, d), or the vector of the variances for independent variables
+         :nData: scalar defining the number of wanted random data vectors
+         :generator: numpy.random.Generator => a new unseeded one if None
+
+    - **Output**:
+         :R: (nData, d) random sample from the Gaussian"""
+
+    from numpy import diag, sqrt, atleast_1d
+    from numpy.linalg import eigh
+
+    generator = generator or random.default_rng()
+    mean = atleast_1d(asarray(mean,dtype=float))
+    cov = asarray(cov,dtype=float)
+    if cov.ndim<2: # independent variables
+        cov = diag(cov*ones(len(mean)))
+    w, v = eigh(cov) # eigen decomposition of the covariance => works for singular covariances too
+    R = generator.standard_normal((int(nData),len(mean))) # normalized independent Gaussian random variables
+    return dot(R*sqrt(w.clip(0)),v.T) + mean # scaled along the eigen vectors, then shifted to the mean
+
 #######################################################################################################
 # returns a random duration (random indexes) of activity, among a possible maximum full time duration #
 #######################################################################################################
@@ -262,6 +460,42 @@ def randindexV3(freeslot,start,end,duration,P):
     indexes = interval[Nsmallest] # the corresponding indexes
             
     return indexes
+
+#######################################################################################################
+# places many activities (start index, duration, value) in the rows of a matrix, all at once          #
+#######################################################################################################
+
+def randindexBatch(starts,durations,values,rows,shape):
+
+    """Places activities in the rows of a matrix: each activity adds its value to the indexes start to start+duration of its row (cut at the end of the row)
+
+    - **Input**:
+         :starts: start index of each activity
+         :durations: duration (number of indexes) of each activity
+         :values: value added by each activity on each of its indexes (e.g. the power of the device)
+         :rows: row of each activity
+         :shape: (number of rows, number of indexes per row) of the matrix
+
+    - **Output**:
+         :M: the matrix, sum of the activities"""
+
+    from numpy import zeros, add
+
+    Nrow, Nindex = shape
+    starts = asarray(starts,dtype=int).clip(0,Nindex)
+    ends = (starts+asarray(durations,dtype=int).clip(0)).clip(0,Nindex)
+    values = asarray(values,dtype=float)
+    steps = zeros((Nrow,Nindex+1)) # each activity is a step up at its start and a step down at its end
+    add.at(steps,(rows,starts),values)
+    add.at(steps,(rows,ends),-values)
+    occupancy = zeros((Nrow,Nindex+1),dtype=int) # the same with integer steps => number of activities on each index, exact
+    add.at(occupancy,(rows,starts),1)
+    add.at(occupancy,(rows,ends),-1)
+    M = cumsum(steps,axis=1)[:,:Nindex]
+    M[cumsum(occupancy,axis=1)[:,:Nindex]==0] = 0 # no activity => exactly 0, without the rounding residue of the float steps
+    if (values>=0).all():
+        M = M.clip(0) # sums of non negative values
+    return M
     
 
 #######################################################################################################################################
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+CALENDAR-AWARE GROUPED AGGREGATION
+###########################################
+###########################################
+
+This module computes the profiles (mean, median, quantiles, counts) of a day x slot matrix (e.g. the loadcurve) grouped by
+month, season, weekday class or any other calendar, in one vectorized pass:
+    - the labels of the days come from their dates (datetime64), so the counts are exact (leap years, incomplete months, etc.)
+    - sums and counts use numpy.bincount on (group, slot) pairs
+    - medians and quantiles use one sort of the matrix by (group, value), column by column
+Days with a negative label, and NaN values, are left out.
+"""
+
+from numpy import asarray, arange, bincount, isnan, where, nan, errstate, floor, ceil, argsort, take_along_axis, searchsorted, datetime64, concatenate, array # import module to work with arrays / matrices
+from instrumentation import timed # import module to time the aggregation
+
+dico_weekday_index = {0:0, 1:0, 2:0, 3:0, 4:0, 5:1, 6:2} # for each weekday key returns the index value: 0 = working day, 1 = Saturday, 2 = Sunday
+season_list = ['Spring','Summer','Autumn','Winter'] # names of the season labels 0, 1, 2, 3
+month_list = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'] # names of the month labels 0 to 11
+
+##############################################
+##############################################
+##              CALENDAR LABELS             ##
+##############################################
+##############################################
+
+def month_labels(dates):
+
+    """Month of each date => 0 (January) to 11 (December)"""
+
+    return asarray(dates,dtype='datetime64[M]').astype(int)%12
+
+def weekday_labels(dates):
+
+    """Weekday of each date => 0 (Monday) to 6 (Sunday)"""
+
+    return (asarray(dates,dtype='datetime64[D]').astype(int)+3)%7 # 1970-01-01 was a Thursday
+
+def weekday_class_labels(dates):
+
+    """Weekday class of each date (cf: dico_weekday_index) => 0 (Monday to Friday), 1 (Saturday), 2 (Sunday)"""
+
+    return array([dico_weekday_index[weekday] for weekday in range(7)])[weekday_labels(dates)]
+
+def season_labels(dates,seasons=None):
+
+    """Season of each date => 0 (spring), 1 (summer), 2 (autumn), 3 (winter)
+
+    - **Input**:
+        - :dates: the dates (datetime64, strings, datetime.date...)
+        - :seasons: dictionnary of the first day of each season per year, e.g. {'2018':{'spring':'03-20','summer':'06-21','autumn':'09-23','winter':'12-22'}}
+                    => if None, the astronomical seasons (equinoxes and solstices, northern hemisphere) are computed with the sunset module
+
+    - **Output**:
+        - :labels: array of season labels"""
+
+    dates = asarray(dates,dtype='datetime64[D]')
+    if seasons is None: # the season is given by the apparent longitude of the sun at noon: 0 at the spring equinox, 90 at the summer solstice, etc.
+        from sunset.noaa import calcJDArray, calcTimeJulianCent, calcSunApparentLongArray
+        from sunset.utils import dates_to_arrays
+        day, month, year = dates_to_arrays(dates)
+        longitude = calcSunApparentLongArray(calcTimeJulianCent(calcJDArray(year,month,day)+0.5))
+        return (floor((longitude%360)/90)).astype(int).reshape(dates.shape)
+
+    names = {'spring':0,'summer':1,'autumn':2,'winter':3}
+    starts = sorted((datetime64(year+'-'+start,'D'),names[name]) for year in seasons for name, start in seasons[year].items()) # first day of each season, in time order
+    bounds = array([start for start, label in starts])
+    labels = array([label for start, label in starts])
+    position = searchsorted(bounds,dates,side='right')-1 # last season start before (or on) each date
+    return where(position>=0,labels[position],(labels[0]-1)%4) # before the first start => the season before
+
+##############################################
+##############################################
+##              GROUPED PROFILES            ##
+##############################################
+##############################################
+
+@timed()
+def group_profiles(matrix,labels,n_groups=None,median=False,quantiles=()):
+
+    """Profiles of the rows of a matrix grouped by label, in one vectorized pass
+
+    - **Input**:
+        - :matrix: (days, slots) array, e.g. the loadcurve
+        - :labels: group of each day (integers from 0 to n_groups-1, negative to leave a day out)
+        - :n_groups: number of groups => max(labels)+1 if None
+        - :median: if True, also compute the median of each group
+        - :quantiles: list of quantiles (between 0 and 1) to compute for each group
+
+    - **Output**:
+        - :profiles: dictionnary with 'count', 'sum', 'mean' (and 'median', 'quantiles') => (groups, slots) arrays, (quantiles, groups, slots) for 'quantiles'"""
+
+    matrix = asarray(matrix,dtype=float)
+    labels = asarray(labels,dtype=int)
+    keep = labels>=0 # days left out
+    matrix, labels = matrix[keep], labels[keep]
+    Nday, Nslot = matrix.shape
+    if n_groups is None:
+        n_groups = int(labels.max())+1 if Nday else 0
+
+    present = ~isnan(matrix)
+    cell = (labels[:,None]*Nslot+arange(Nslot)).ravel() # one bin per (group, slot)
+    count = bincount(cell,weights=present.ravel(),minlength=n_groups*Nslot).reshape(n_groups,Nslot)
+    total = bincount(cell,weights=where(present,matrix,0).ravel(),minlength=n_groups*Nslot).reshape(n_groups,Nslot)
+    with errstate(invalid='ignore',divide='ignore'):
+        profiles = {'count':count.astype(int), 'sum':total, 'mean':where(count>0,total/count,nan)}
+
+    quantiles = list(quantiles)
+    if median:
+        quantiles = [0.5]+quantiles
+    if quantiles:
+        order = argsort(matrix,axis=0) # values sorted column by column (NaN last)
+        order = take_along_axis(order,argsort(labels[order],axis=0,kind='stable'),axis=0) # then grouped by label, keeping the value order inside each group
+        values = take_along_axis(matrix,order,axis=0)
+        first = concatenate(([0],bincount(labels,minlength=n_groups).cumsum()[:-1])) # first row of each group
+        position = array(quantiles)[:,None,None]*(count-1) # position of each quantile among the (sorted, non NaN) values of each group and slot
+        low, high = floor(position), ceil(position)
+        low, high = [where(count>0,first[:,None]+index,0).astype(int) for index in (low,high)]
+        slots = arange(Nslot)
+        low, high = values[low,slots], values[high,slots]
+        result = where(count>0,low+(position-floor(position))*(high-low),nan) # linear interpolation between the 2 nearest values
+        if median:
+            profiles['median'], result = result[0], result[1:]
+        if len(result):
+            profiles['quantiles'] = result
+    return profiles
+
+def monthly_profiles(matrix,dates,**kwargs):
+
+    """Profiles of the rows of a matrix by month (0 = January) => cf: group_profiles"""
+
+    return group_profiles(matrix,month_labels(dates),12,**kwargs)
+
+def seasonal_profiles(matrix,dates,seasons=None,**kwargs):
+
+    """Profiles of the rows of a matrix by season (0 = spring) => cf: group_profiles and season_labels"""
+
+    return group_profiles(matrix,season_labels(dates,seasons),4,**kwargs)
+
+def weekday_profiles(matrix,dates,**kwargs):
+
+    """Profiles of the rows of a matrix by weekday class (0 = working day, 1 = Saturday, 2 = Sunday) => cf: group_profiles"""
+
+    return group_profiles(matrix,weekday_class_labels(dates),3,**kwargs)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+ROLLING SAME-WEEKDAY BASELINE
+###########################################
+###########################################
+
+This module computes the baseline of each day as the average of the same timepoints on the same weekday of the N previous weeks
+(the day itself included), which generalizes the "4 previous weeks Average" of visualize_energy.py:
+    - weeks: lookback N, in weeks
+    - weighting: 'flat' (all weeks count the same) or 'exponential' (the week k weeks ago counts decay**k)
+    - edge: 'partial' (the first weeks are averaged on the available weeks) or 'nan' (NaN until N weeks are available) => never any wraparound
+
+The whole loadcurve is computed with cumulative sums (flat) or a recursive filter (exponential) along the weeks, so the cost does not depend on N.
+RollingBaseline does the same incrementally, for a live feed: each new day (or each new reading) costs O(96) (or O(1)).
+Days (or readings) with NaN values are skipped: they do not count in the average.
+"""
+
+from numpy import asarray, zeros, full, concatenate, cumsum, isnan, where, nan, errstate, datetime64, arange, ceil, maximum # import module to work with arrays / matrices
+from scipy.signal import lfilter # import module to apply a recursive (IIR) filter
+
+WEIGHTINGS = ('flat','exponential')
+EDGES = ('partial','nan')
+
+def day_number(day):
+
+    """Number of days since 1970-01-01 of a date (datetime.date, string or datetime64) => day_number % 7 gives the weekday class, day_number // 7 the week"""
+
+    return int(datetime64(day,'D').astype(int))
+
+def _check(weeks,weighting,edge):
+    if weeks<1:
+        raise ValueError('weeks must be at least 1')
+    if weighting not in WEIGHTINGS:
+        raise ValueError("unknown weighting, must be 'flat' or 'exponential'")
+    if edge not in EDGES:
+        raise ValueError("unknown edge, must be 'partial' or 'nan'")
+
+##############################################
+##############################################
+##             WHOLE LOADCURVE              ##
+##############################################
+##############################################
+
+def same_weekday_baseline(loadcurve,weeks=4,weighting='flat',decay=0.5,edge='partial'):
+
+    """Baseline of each day: average of the same weekday of the N previous weeks (the day itself included), for all days at once
+
+    - **Input**:
+        - :loadcurve: (days, slots) array of consecutive days
+        - :weeks: number of weeks N of the lookback
+        - :weighting: 'flat' or 'exponential'
+        - :decay: for exponential weighting, the weight of the week before relative to the current one
+        - :edge: 'partial' or 'nan' => what to do when less than N weeks are available
+
+    - **Output**:
+        - :baseline: (days, slots) array"""
+
+    _check(weeks,weighting,edge)
+    loadcurve = asarray(loadcurve,dtype=float)
+    Nday, Nslot = loadcurve.shape
+    Nweek = int(ceil(Nday/7.)) # number of (possibly incomplete) weeks
+
+    values = full((Nweek*7,Nslot),nan) # padded to full weeks
+    values[:Nday] = loadcurve
+    values = values.reshape(Nweek,7,Nslot) # values[w,d] is the day 7*w+d => the same weekdays follow each other along the first axis
+    present = ~isnan(values) # the values that count
+    values = where(present,values,0)
+
+    if weighting=='flat': # window sums from cumulative sums => sum(w-N+1..w) = cum[w+1]-cum[w+1-N]
+        def window(x):
+            cum = concatenate((zeros((1,)+x.shape[1:]),cumsum(x,axis=0)))
+            return cum[1:] - cum[maximum(arange(1,Nweek+1)-weeks,0)]
+        total, weight = window(values), window(present.astype(float))
+        count = weight
+    else: # recursive filter y[w] = x[w] + decay*y[w-1] => infinite exponential sum, minus decay**N*y[w-N] for the finite window
+        def window(x):
+            y = lfilter([1.],[1.,-decay],x,axis=0)
+            y[weeks:] -= decay**weeks*y[:-weeks]
+            return y
+        total, weight = window(values), window(present.astype(float))
+        count = cumsum(present,axis=0).astype(float) # number of values in the window
+        count[weeks:] -= count[:-weeks]
+
+    with errstate(invalid='ignore',divide='ignore'):
+        baseline = where(count>0,total/weight,nan)
+    if edge=='nan':
+        baseline[count<weeks] = nan
+    return baseline.reshape(Nweek*7,Nslot)[:Nday]
+
+##############################################
+##############################################
+##           INCREMENTAL BASELINE           ##
+##############################################
+##############################################
+
+class RollingBaseline(object):
+
+    """Incremental same-weekday baseline, for a live feed
+
+    Keeps, for each weekday class and each slot, the values of the N last weeks in a ring buffer together with their weighted sum,
+    so a new day costs O(slots) and a single reading O(1). Readings can arrive out of order or twice: a value replaces the previous
+    one of the same day and slot, values older than the window are ignored.
+
+    - **Input**:
+        - :weeks: number of weeks N of the lookback
+        - :weighting: 'flat' or 'exponential'
+        - :decay: for exponential weighting, the weight of the week before relative to the current one
+        - :edge: 'partial' or 'nan' => what to return when less than N weeks are available
+        - :n_slots: number of time slots per day"""
+
+    def __init__(self,weeks=4,weighting='flat',decay=0.5,edge='partial',n_slots=96):
+        _check(weeks,weighting,edge)
+        self.weeks = weeks
+        self.decay = decay if weighting=='exponential' else 1.
+        self.edge = edge
+        self.n_slots = n_slots
+        self.ring = full((7,weeks,n_slots),nan) # last N values of each weekday class and slot => week k is in position k % N
+        self.latest = full((7,n_slots),-weeks-1,dtype=int) # latest week of each weekday class and slot
+        self.total = zeros((7,n_slots)) # weighted sum of the values of the window
+        self.weight = zeros((7,n_slots)) # sum of the weights of the values of the window
+        self.count = zeros((7,n_slots),dtype=int) # number of values in the window
+
+    def _update(self,number,slots,values):
+        r, week = number%7, number//7 # weekday class and week of the day
+        N, a = self.weeks, self.decay
+        latest = self.latest[r,slots]
+        gap = week-latest
+
+        reset = gap>=N # nothing of the window remains
+        if reset.any():
+            s = slots[reset]
+            self.ring[r,:,s] = nan
+            self.total[r,s] = self.weight[r,s] = self.count[r,s] = 0
+        move = (gap>0) & ~reset # the window moves forward by gap weeks => the gap oldest weeks leave the window
+        for j in range(1,int(gap[move].max())+1 if move.any() else 1):
+            s = slots[move & (gap>=j)]
+            position = (latest[move & (gap>=j)]+j)%N
+            old = self.ring[r,position,s]
+            leaving = ~isnan(old)
+            self.total[r,s[leaving]] -= a**(N-j)*old[leaving]
+            self.weight[r,s[leaving]] -= a**(N-j)
+            self.count[r,s[leaving]] -= 1
+            self.ring[r,position,s] = nan
+        forward = gap>0
+        if forward.any():
+            s = slots[forward]
+            self.total[r,s] *= a**gap[forward]
+            self.weight[r,s] *= a**gap[forward]
+            self.latest[r,s] = week
+
+        age = self.latest[r,slots]-week # 0 for the latest week
+        inside = (age<N) & ~isnan(values) # too old values are ignored
+        s, w, position = slots[inside], a**age[inside], week%N
+        old = self.ring[r,position,s]
+        new = isnan(old) # first value of this day and slot, otherwise it replaces the previous value
+        self.total[r,s] += w*(values[inside]-where(new,0,old))
+        self.weight[r,s[new]] += w[new]
+        self.count[r,s[new]] += 1
+        self.ring[r,position,s] = values[inside]
+
+    def update(self,new_day,day):
+
+        """Add the values of a day
+
+        - **Input**:
+            - :new_day: array of the values of the day (one per slot)
+            - :day: the date of the day
+
+        - **Output**:
+            - :baseline: the current baseline of the weekday of the day"""
+
+        number = day_number(day)
+        self._update(number,arange(self.n_slots),asarray(new_day,dtype=float))
+        return self.baseline(day)
+
+    def update_value(self,day,slot,value):
+
+        """Add a single reading
+
+        - **Input**:
+            - :day: the date of the reading
+            - :slot: the slot of the reading in the day
+            - :value: the value of the reading
+
+        - **Output**:
+            - :baseline: the current baseline of this weekday and slot"""
+
+        number = day_number(day)
+        self._update(number,asarray([slot]),asarray([value],dtype=float))
+        return self.baseline(day)[slot]
+
+    def baseline(self,day):
+
+        """Current baseline (latest window) of the weekday of a day => array of one value per slot"""
+
+        r = day_number(day)%7
+        with errstate(invalid='ignore',divide='ignore'):
+            baseline = where(self.count[r]>0,self.total[r]/self.weight[r],nan)
+        if self.edge=='nan':
+            baseline[self.count[r]<self.weeks] = nan
+        return baseline
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the compact binary time series against the CSV file of the front end
+
+Writes the same series (DateTime, average, power, like data/4weeks_MD_T1_MHF1.csv) as CSV, float32 and int16 binary files,
+checks that the binary files read back the same values, and prints the sizes and the read times.
+
+run from the "data code" folder: python benchmarks/bench_export.py
+"""
+
+import sys # import module to access the python path
+from os import path, remove, close # import module to deal with files
+from time import perf_counter # import module to measure time
+from tempfile import mkstemp # import module to create temporary files
+from numpy import allclose, abs as npabs # import module to work with arrays / matrices
+from pandas import read_csv # import module to load csv data
+
+sys.path.insert(0,path.join(path.dirname(path.abspath(__file__)),'..')) # to import the modules of the "data code" folder
+from binary_export import write_series, read_series, iter_series
+
+CSV = path.join(path.dirname(path.abspath(__file__)),'..','..','data','4weeks_MD_T1_MHF1.csv') # the file read by the front end
+
+
+def timed(function,*args,**kwargs):
+
+    """Run a function once => (result, duration in seconds)"""
+
+    start = perf_counter()
+    result = function(*args,**kwargs)
+    return result, perf_counter()-start
+
+
+if __name__ == "__main__":
+
+    data, duration = timed(read_csv,CSV,parse_dates=['DateTime'])
+    print('csv:\t%8d bytes\tread %.1f ms' % (path.getsize(CSV),duration*1000))
+    channels = [('average',data['average'].values), ('power',data['power'].values)]
+
+    for dtype in ('float32','int16'):
+        handle, filename = mkstemp(suffix='.bin')
+        close(handle)
+        write_series(filename,data['DateTime'].values[0],15,channels,dtype)
+        (timestamps, values), duration = timed(read_series,filename,False)
+        streamed, stream_duration = timed(lambda: sum(len(chunk) for chunk, values in iter_series(filename)))
+        assert timestamps[0]==data['DateTime'].values[0] and len(timestamps)==streamed==len(data) # the CSV labels jump at the summer/winter time changes, the binary timestamps are regular
+        error = max(npabs(values[name]-original).max() for name, original in channels)
+        assert allclose([values[name] for name, original in channels],[original for name, original in channels],atol=1e-3)
+        print('%s:\t%8d bytes\tread %.1f ms\tstreamed %.1f ms\tmax error %.2g' % (dtype,path.getsize(filename),duration*1000,stream_duration*1000,error))
+        remove(filename)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the fleet training of the forecast models on synthetic households
+
+Compares fit household by household (python loop) with fit_fleet (shared calendar features, one solve per group of households
+with the same training days), checks that both give the same forecasts, and prints the timings.
+
+run from the "data code" folder: python benchmarks/bench_fleet.py [number of households]
+"""
+
+import sys # import module to access the python path
+from os import path # import module to build file paths
+from numpy import arange, datetime64, nan, abs, nanmax, random # import module to work with arrays / matrices
+
+sys.path.insert(0,path.join(path.dirname(path.abspath(__file__)),'..')) # to import the modules of the "data code" folder
+from bench_peaks import measure
+from simulator import simulate, example_devices
+from forecast import fit, forecast, fit_fleet, fleet_model, forecast_fleet
+
+site = (47.0982,7.4405,1) # St-Imier, like visualize_energy.py
+
+
+if __name__ == "__main__":
+
+    households = int(sys.argv[1]) if len(sys.argv)>1 else 1000
+    dates = datetime64('2017-08-01')+arange(396)
+    cube = simulate(example_devices(),dates,households,seed=0) # (households, days, 96) in Watt [W]
+    generator = random.default_rng(1)
+    for household in generator.choice(households,households//10,replace=False): # a few meters with missing days
+        start = generator.integers(0,len(dates)-20)
+        cube[household,start:start+generator.integers(1,20)] = nan
+
+    fleet, fleet_time = measure(fit_fleet,cube,dates,site=site)
+    result, forecast_time = measure(forecast_fleet,fleet,cube,dates[0])
+    checked = min(households,100) # the loop is slow, only the first households
+    models, loop_time = measure(lambda: [fit(cube[n],dates,site=site) for n in range(checked)])
+    loop = [forecast(model,cube[n],dates[0]) for n, model in enumerate(models)]
+    error = max(nanmax(abs(one['mean']-result['mean'][n])) for n, one in enumerate(loop))
+    assert error<1e-6*nanmax(cube), 'the fleet forecasts differ from the household forecasts'
+    assert all(abs(fleet_model(fleet,n).coefficients-model.coefficients).max()<1e-6*nanmax(cube) for n, model in enumerate(models))
+
+    print(households,'households x',len(dates),'days')
+    print('  fit (loop):\t\t%.4f s per household' % (loop_time/checked))
+    print('  fit_fleet:\t\t%.4f s per household\t(x%.0f)\t%.2f s in all' % (fleet_time/households,loop_time/checked/(fleet_time/households),fleet_time))
+    print('  forecast_fleet:\t%.4f s in all' % forecast_time)
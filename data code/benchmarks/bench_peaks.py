@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the peak detection functions on the canton consumption files
+
+Compares FindPeakLocations (python loop) with FindPeakLocationsVectorized (numpy masks),
+checks that both return the same peaks, and prints the timings.
+
+run from the "data code" folder: python benchmarks/bench_peaks.py
+"""
+
+import sys # import module to access the python path
+from os import path # import module to build file paths
+from time import perf_counter # import module to measure time
+from pandas import read_csv # import module to load csv data
+
+sys.path.insert(0,path.join(path.dirname(path.abspath(__file__)),'..')) # to import the modules of the "data code" folder
+from General_functions import FindPeakLocations, FindPeakLocationsVectorized
+
+DATA = path.join(path.dirname(path.abspath(__file__)),'..','..','data') # folder containing the canton files
+FILES = ['Canton_Argau_Consumption_2017.csv','Canton_Argau_Consumption_2018.csv']
+delta = 1000 # threshold in kWh between 2 points
+
+
+def measure(function,*args,**kwargs):
+    
+    """Run a function once and measure its duration
+    
+    - **Output**:
+        - :result: what the function returns
+        - :duration: the duration in seconds"""
+    
+    start = perf_counter()
+    result = function(*args,**kwargs)
+    return result, perf_counter()-start
+
+
+if __name__ == "__main__":
+    
+    for name in FILES:
+        
+        consumption = read_csv(path.join(DATA,name),sep=';').iloc[:,1].values # consumption column of the canton file
+        
+        loop, loop_time = measure(FindPeakLocations,consumption,consumption,delta)
+        vectorized, vectorized_time = measure(FindPeakLocationsVectorized,consumption,None,delta)
+        days, days_time = measure(FindPeakLocationsVectorized,consumption[:len(consumption)//96*96].reshape(-1,96),None,delta,compact=True)
+        
+        assert loop == vectorized, 'the vectorized peaks differ from FindPeakLocations'
+        
+        print(name,'-',len(consumption),'points -',len(loop[0]['index']),'max peaks -',len(loop[1]['index']),'min peaks')
+        print('  FindPeakLocations:\t\t\t%.4f s' % loop_time)
+        print('  FindPeakLocationsVectorized:\t\t%.4f s\t(x%.0f)' % (vectorized_time,loop_time/vectorized_time))
+        print('  FindPeakLocationsVectorized (days):\t%.4f s' % days_time)
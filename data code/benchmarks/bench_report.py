@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the PDF report rendering
+
+Renders the same synthetic report (one page per day, like Loadcurve_*.pdf) with different numbers of processes and prints the pages per second.
+
+run from the "data code" folder: python benchmarks/bench_report.py [number of pages]
+"""
+
+import sys # import module to access the python path
+from os import path, remove, close, cpu_count # import module to deal with files
+from time import perf_counter # import module to measure time
+from tempfile import mkstemp # import module to create a temporary file
+from numpy import random # import module to generate synthetic load curves
+
+sys.path.insert(0,path.join(path.dirname(path.abspath(__file__)),'..')) # to import the modules of the "data code" folder
+from report import render_report
+
+
+def synthetic_pages(n,seed=0):
+
+    """Pages of a synthetic report: n days of random load curves, with sunrise and sunset"""
+
+    generator = random.RandomState(seed) # reproducible load curves
+    return [{'title':'Load curve of day '+str(day),'curves':[(generator.rand(96)*1000,'Observed','green')],'sunrise':28,'sunset':70} for day in range(n)]
+
+
+if __name__ == "__main__":
+
+    n = int(sys.argv[1]) if len(sys.argv)>1 else 128 # number of pages
+    pages = synthetic_pages(n)
+    handle, filename = mkstemp(suffix='.pdf')
+    close(handle)
+
+    for workers in sorted(set([1,2,cpu_count() or 1])):
+        start = perf_counter()
+        render_report(pages,filename,workers=workers,chunk_size=16)
+        duration = perf_counter()-start
+        print('%d pages - %d workers:\t%.2f s\t%.1f pages/s' % (n,workers,duration,n/duration))
+
+    remove(filename)
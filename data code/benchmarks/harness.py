@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark harness: registry of benchmarks and datasets, timing runner, JSON results and comparison between commits
+
+A benchmark is a function registered with @benchmark: it prepares its data (not timed) and returns the function to time.
+Each benchmark is run `repeat` times; each run calls the timed function `number` times, number being chosen so that one run
+lasts at least min_time seconds. The minimum and the median of the runs (per call) are kept.
+
+Datasets are registered with @dataset and loaded once (lazily) per process: synthetic datasets are seeded, bundled datasets
+are read from the data folder of the repository.
+
+The results are written as JSON (one file per commit in benchmarks/results), and two result files can be compared:
+a benchmark is a regression if its minimum time grew by more than the threshold.
+"""
+
+import json # import module to write the results
+import platform # import module to describe the machine
+import subprocess # import module to ask git for the current commit
+from os import path, makedirs # import module to deal with files
+from time import perf_counter # import module to measure time
+from datetime import datetime # import module to date the results
+from fnmatch import fnmatch # import module to select benchmarks by name
+from statistics import median # import module to summarize the runs
+
+BENCHMARKS = {} # name => (function, repeat)
+DATASETS = {} # name => loader
+_loaded = {} # name => loaded dataset
+RESULTS = path.join(path.dirname(path.abspath(__file__)),'results') # default folder of the result files
+
+def benchmark(name,repeat=5):
+
+    """Decorator registering a benchmark => the function prepares the data and returns the function to time"""
+
+    def register(function):
+        BENCHMARKS[name] = (function,repeat)
+        return function
+    return register
+
+def dataset(name):
+
+    """Decorator registering a dataset loader"""
+
+    def register(function):
+        DATASETS[name] = function
+        return function
+    return register
+
+def load(name):
+
+    """Dataset of a name, loaded at the first call only"""
+
+    if name not in _loaded:
+        _loaded[name] = DATASETS[name]()
+    return _loaded[name]
+
+def time_function(function,repeat=5,min_time=0.1):
+
+    """Time a function
+
+    - **Input**:
+        - :function: function without arguments
+        - :repeat: number of runs
+        - :min_time: minimum duration of one run, in seconds
+
+    - **Output**:
+        - :timing: dictionnary with 'min', 'median' (seconds per call), 'number' (calls per run) and 'repeat'"""
+
+    start = perf_counter()
+    function() # first call => warm up and calibration
+    first = perf_counter()-start
+    number = max(1,int(min_time/first)) if first>0 else 1000
+    runs = []
+    for n in range(repeat):
+        start = perf_counter()
+        for i in range(number):
+            function()
+        runs.append((perf_counter()-start)/number)
+    return {'min':min(runs), 'median':median(runs), 'number':number, 'repeat':repeat}
+
+def git_commit():
+
+    """Current commit of the repository (short hash, with '+' if there are uncommitted changes) => 'unknown' without git"""
+
+    try:
+        folder = path.dirname(path.abspath(__file__))
+        commit = subprocess.check_output(['git','rev-parse','--short','HEAD'],cwd=folder,stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.check_output(['git','status','--porcelain','--untracked-files=no'],cwd=folder,stderr=subprocess.DEVNULL).strip()
+        return commit+('+' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run(pattern='*',min_time=0.1,verbose=True):
+
+    """Run the registered benchmarks whose name matches a pattern
+
+    - **Output**:
+        - :report: dictionnary with the commit, the machine, the date and the timing of each benchmark"""
+
+    import numpy
+
+    report = {'commit':git_commit(), 'date':datetime.now().isoformat(timespec='seconds'), 'python':platform.python_version(),
+              'numpy':numpy.__version__, 'machine':platform.machine(), 'processor':platform.processor(), 'results':{}}
+    for name in sorted(BENCHMARKS):
+        if not fnmatch(name,pattern):
+            continue
+        function, repeat = BENCHMARKS[name]
+        timing = time_function(function(),repeat,min_time)
+        report['results'][name] = timing
+        if verbose:
+            print('%-45s %12.6f s  (median %.6f s, %d x %d)' % (name,timing['min'],timing['median'],timing['repeat'],timing['number']))
+    return report
+
+def write(report,filename=None):
+
+    """Write a report as JSON => benchmarks/results/<commit>.json if no file name is given"""
+
+    if filename is None:
+        if not path.isdir(RESULTS):
+            makedirs(RESULTS)
+        filename = path.join(RESULTS,report['commit']+'.json')
+    with open(filename,'w') as out:
+        json.dump(report,out,indent=1)
+    return filename
+
+def compare(old,new,threshold=0.1,verbose=True):
+
+    """Compare 2 reports (dictionnaries or JSON files) on their common benchmarks
+
+    - **Input**:
+        - :old, new: the reports
+        - :threshold: relative slowdown of the minimum time beyond which a benchmark is a regression
+
+    - **Output**:
+        - :regressions: names of the benchmarks that are slower than the threshold"""
+
+    reports = []
+    for report in (old,new):
+        if not isinstance(report,dict):
+            with open(report) as result:
+                report = json.load(result)
+        reports.append(report)
+    old, new = reports
+    regressions = []
+    if verbose:
+        print('%-45s %12s %12s %8s' % ('benchmark',old['commit'],new['commit'],'ratio'))
+    for name in sorted(set(old['results']) & set(new['results'])):
+        ratio = new['results'][name]['min']/old['results'][name]['min']
+        flag = ''
+        if ratio>1+threshold:
+            flag = 'SLOWER'
+            regressions.append(name)
+        elif ratio<1/(1+threshold):
+            flag = 'faster'
+        if verbose:
+            print('%-45s %12.6f %12.6f %8.2f %s' % (name,old['results'][name]['min'],new['results'][name]['min'],ratio,flag))
+    return regressions
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the analysis code: general functions, ingestion, sunrise/sunset, averaging and PDF rendering
+
+The datasets are the bundled files of the data folder (canton consumption 2017/2018, 4weeks_MD_T1_MHF1.csv) and seeded
+synthetic data, so the timings of 2 commits can be compared (cf: harness).
+
+run from the "data code" folder:
+    python benchmarks/suite.py                                  => runs everything, writes benchmarks/results/<commit>.json
+    python benchmarks/suite.py --filter 'sunset.*'              => only the benchmarks whose name matches
+    python benchmarks/suite.py --compare results/old.json       => runs, then compares with an older result file
+    python benchmarks/suite.py --compare old.json --against new.json  => only compares 2 result files
+"""
+
+import sys # import module to access the python path
+import atexit # import module to remove the temporary files at the end of the run
+from os import path, close, remove # import module to deal with files
+from shutil import rmtree # import module to remove the temporary folders
+from tempfile import mkstemp, mkdtemp # import module to create temporary files
+from datetime import date, timedelta # import module to deal with dates
+from numpy import random, arange, datetime64 # import module to work with arrays / matrices
+from pandas import read_csv # import module to load csv data
+
+sys.path.insert(0,path.join(path.dirname(path.abspath(__file__)),'..')) # to import the modules of the "data code" folder
+from harness import benchmark, dataset, load, run, write, compare
+import General_functions as gf
+import sunset
+from sunset import SunTimeCache
+from ingestion import read_canton, load_columns
+from baseline import same_weekday_baseline
+from aggregation import monthly_profiles, seasonal_profiles
+from report import render_report
+
+DATA = path.join(path.dirname(path.abspath(__file__)),'..','..','data') # bundled datasets
+lat, lng, utc_offset = 47.0982, 7.4405, 1 # St-Imier, like visualize_energy.py
+zone = 'Europe/Zurich'
+
+##############################################
+##                DATASETS                  ##
+##############################################
+
+@dataset('canton2017')
+def canton2017():
+    return read_csv(path.join(DATA,'Canton_Argau_Consumption_2017.csv'),sep=';').iloc[:,1].values.astype(float)
+
+@dataset('canton2018')
+def canton2018():
+    return read_csv(path.join(DATA,'Canton_Argau_Consumption_2018.csv'),sep=';').iloc[:,1].values.astype(float)
+
+@dataset('4weeks')
+def fourweeks():
+    data = read_csv(path.join(DATA,'4weeks_MD_T1_MHF1.csv'))
+    dates = datetime64(data['DateTime'].iloc[0][:10],'D')+arange(len(data)//96)
+    return {'loadcurve':data['power'].values.reshape(-1,96)*4*1000, 'dates':dates} # in Watt [W], like visualize_energy.py
+
+@dataset('synthetic_loadcurve')
+def synthetic_loadcurve():
+    generator = random.RandomState(0)
+    return generator.rand(396,96)*1000
+
+@dataset('time_list')
+def time_list():
+    return gf.createTimeList(96,15)
+
+##############################################
+##           GENERAL FUNCTIONS              ##
+##############################################
+
+@benchmark('general.FindPeakLocations.canton2017_2weeks',repeat=3)
+def bench_peaks_loop():
+    consumption = load('canton2017')[:96*14] # the loop is quadratic, 2 weeks only
+    return lambda: gf.FindPeakLocations(consumption,consumption,1000)
+
+@benchmark('general.FindPeakLocationsVectorized.canton2018')
+def bench_peaks_vectorized():
+    consumption = load('canton2018')
+    return lambda: gf.FindPeakLocationsVectorized(consumption,None,1000)
+
+@benchmark('general.meanSubseqVector.1440x4')
+def bench_mean_subseq():
+    vector = random.RandomState(1).rand(1440*4)
+    return lambda: gf.meanSubseqVector(vector,4)
+
+@benchmark('general.createTimeList.96')
+def bench_time_list_96():
+    return lambda: gf.createTimeList(96,15)
+
+@benchmark('general.createTimeList.1440')
+def bench_time_list_1440():
+    return lambda: gf.createTimeList(1440,1)
+
+@benchmark('general.FindHypotheticalIndex.1000')
+def bench_hypothetical_index():
+    times = list(load('time_list'))
+    values = ['%02d:%02d' % (h,m) for h, m in zip(random.RandomState(2).randint(0,24,1000),random.RandomState(3).randint(0,60,1000))]
+    return lambda: [gf.FindHypotheticalIndex(times,value) for value in values]
+
+##############################################
+##                INGESTION                 ##
+##############################################
+
+@benchmark('ingestion.read_canton.2018',repeat=3)
+def bench_read_canton():
+    return lambda: read_canton(path.join(DATA,'Canton_Argau_Consumption_2018.csv'))
+
+@benchmark('ingestion.load_columns.cached.2018')
+def bench_load_columns():
+    cache = mkdtemp(prefix='bench_cache_')
+    atexit.register(rmtree,cache,True)
+    filename = path.join(DATA,'Canton_Argau_Consumption_2018.csv')
+    load_columns(filename,cache,'canton') # fills the cache
+    return lambda: load_columns(filename,cache,'canton').values.sum()
+
+##############################################
+##             SUNRISE / SUNSET             ##
+##############################################
+
+def year_dates():
+    return [date(2018,1,1)+timedelta(days=n) for n in range(365)]
+
+@benchmark('sunset.afc1990.scalar.365',repeat=3)
+def bench_sunset_scalar():
+    dates = year_dates()
+    return lambda: [(sunset.get_sunrise(day,lat,lng,utc_offset),sunset.get_sunset(day,lat,lng,utc_offset)) for day in dates]
+
+@benchmark('sunset.noaa.scalar.365',repeat=3)
+def bench_sunset_noaa_scalar():
+    dates = year_dates()
+    return lambda: [(sunset.get_sunrise(day,lat,lng,utc_offset,'noaa'),sunset.get_sunset(day,lat,lng,utc_offset,'noaa')) for day in dates]
+
+@benchmark('sunset.afc1990.vectorized.365')
+def bench_sunset_vectorized():
+    dates = year_dates()
+    return lambda: sunset.get_sun_times(dates,lat,lng,utc_offset,slot_minutes=15)
+
+@benchmark('sunset.noaa.vectorized.365')
+def bench_sunset_noaa_vectorized():
+    dates = year_dates()
+    return lambda: sunset.get_sun_times(dates,lat,lng,utc_offset,'noaa',slot_minutes=15)
+
+@benchmark('sunset.afc1990.vectorized.zone.365')
+def bench_sunset_zone():
+    dates = year_dates()
+    return lambda: sunset.get_sun_times(dates,lat,lng,zone,slot_minutes=15)
+
+@benchmark('sunset.afc1990.vectorized.epoch.365')
+def bench_sunset_epoch():
+    dates = year_dates()
+    return lambda: sunset.get_sun_times(dates,lat,lng,zone,epoch=True)
+
+@benchmark('sunset.cache.hit.365')
+def bench_sunset_cache():
+    dates, cache = year_dates(), SunTimeCache()
+    cache.get_sun_times(dates,lat,lng,utc_offset)
+    return lambda: cache.get_sun_times(dates,lat,lng,utc_offset,slot_minutes=15)
+
+##############################################
+##                AVERAGING                 ##
+##############################################
+
+@benchmark('averaging.same_weekday_baseline.4weeks')
+def bench_baseline():
+    loadcurve = load('4weeks')['loadcurve']
+    return lambda: same_weekday_baseline(loadcurve,weeks=4)
+
+@benchmark('averaging.monthly_profiles.4weeks')
+def bench_monthly():
+    data = load('4weeks')
+    return lambda: monthly_profiles(data['loadcurve'],data['dates'])
+
+@benchmark('averaging.seasonal_profiles.4weeks')
+def bench_seasonal():
+    data = load('4weeks')
+    return lambda: seasonal_profiles(data['loadcurve'],data['dates'])
+
+@benchmark('averaging.monthly_profiles.median.synthetic')
+def bench_monthly_median():
+    loadcurve = load('synthetic_loadcurve')
+    dates = datetime64('2017-08-01')+arange(len(loadcurve))
+    return lambda: monthly_profiles(loadcurve,dates,median=True,quantiles=(0.1,0.9))
+
+##############################################
+##                RENDERING                 ##
+##############################################
+
+@benchmark('rendering.render_report.16pages',repeat=3)
+def bench_render():
+    loadcurve = load('synthetic_loadcurve')
+    pages = [{'title':'Load curve of day '+str(n),'curves':[(loadcurve[n],'Observed','green')],'sunrise':28,'sunset':70} for n in range(16)]
+    handle, filename = mkstemp(suffix='.pdf')
+    close(handle)
+    atexit.register(remove,filename)
+    return lambda: render_report(pages,filename,workers=1)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark suite of the analysis code')
+    parser.add_argument('--filter',default='*',help='only the benchmarks whose name matches this pattern')
+    parser.add_argument('--min-time',type=float,default=0.1,help='minimum duration of one run, in seconds')
+    parser.add_argument('--output',default=None,help='result file => benchmarks/results/<commit>.json if not given')
+    parser.add_argument('--compare',default=None,help='older result file to compare with')
+    parser.add_argument('--against',default=None,help='newer result file => no run, only the comparison')
+    parser.add_argument('--threshold',type=float,default=0.1,help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    if args.against:
+        report = args.against
+    else:
+        report = run(args.filter,args.min_time)
+        print('results written in',write(report,args.output))
+    if args.compare:
+        regressions = compare(args.compare,report,args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+COMPACT BINARY TIME SERIES
+###########################################
+###########################################
+
+This module writes and reads regular time series (a fixed step from a fixed start) in a compact binary format, instead of CSV
+files that repeat the full date string of every timepoint:
+
+    header (little-endian, 28 bytes):
+        - magic b'VSTS', version (uint8), dtype (uint8: 0 = float32, 1 = int16), number of channels (uint16)
+        - start (int64): timestamp of the first timepoint, in seconds since 1970-01-01 (end of the first interval, like the CSV files)
+        - step (uint32): seconds between 2 timepoints
+        - number of timepoints (uint64)
+    channel table, for each channel:
+        - length of the name (uint8), name (utf-8), scale (float64) => value = int16 * scale (1 for float32)
+    data:
+        - timepoint after timepoint, one value per channel (float32, or int16 with -32768 for NaN)
+
+The timestamps are start + n * step, so they are never stored: a series measured every 15 minutes whose labels jump at the
+summer/winter time changes (like the CSV of the front end) keeps all its values, with regular timestamps. read_series memory-maps the data; iter_series reads any stream
+(file, socket, HTTP response) chunk by chunk.
+"""
+
+import struct # import module to pack the header
+from io import BytesIO # import module to encode in memory
+from numpy import asarray, empty, column_stack, frombuffer, isnan, where, rint, nanmax, abs as npabs, nan, float32, memmap, arange, datetime64, timedelta64, dtype as npdtype # import module to work with arrays / matrices
+
+MAGIC = b'VSTS'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHqIQ') # magic, version, dtype, channels, start, step, timepoints
+DTYPES = {'float32':0, 'int16':1}
+NAN_INT16 = -32768 # int16 value of NaN
+
+##############################################
+##############################################
+##                 WRITING                  ##
+##############################################
+##############################################
+
+def encode_series(start,step,channels,dtype='float32',scales=None):
+
+    """Encode a regular time series in the binary format
+
+    - **Input**:
+        - :start: timestamp of the first timepoint (datetime64, string or datetime)
+        - :step: minutes between 2 timepoints
+        - :channels: list of (name, values) => all with the same length
+        - :dtype: 'float32' or 'int16'
+        - :scales: for int16, dictionnary of the scale of some channels => max(abs(values))/32767 for the others
+
+    - **Output**:
+        - :data: bytes"""
+
+    out = BytesIO()
+    write_series(out,start,step,channels,dtype,scales)
+    return out.getvalue()
+
+def write_series(filename,start,step,channels,dtype='float32',scales=None):
+
+    """Write a regular time series in the binary format => same inputs as encode_series, filename can be an open binary file"""
+
+    if dtype not in DTYPES:
+        raise ValueError("unknown dtype, must be 'float32' or 'int16'")
+    names = [name for name, values in channels]
+    values = column_stack([asarray(values,dtype=float) for name, values in channels]) if channels else empty((0,0))
+    scales = scales or {}
+
+    if dtype=='int16':
+        factors = []
+        for n, name in enumerate(names):
+            peak = nanmax(npabs(values[:,n])) if (~isnan(values[:,n])).any() else 0
+            factors.append(float(scales.get(name,peak/32767. if peak>0 else 1.)))
+        factors = asarray(factors)
+        data = where(isnan(values),NAN_INT16,rint(values/factors).clip(-32767,32767)).astype('<i2')
+    else:
+        factors = [1.]*len(names)
+        data = values.astype('<f4')
+
+    start = int(datetime64(start,'s').astype('int64'))
+    header = HEADER.pack(MAGIC,VERSION,DTYPES[dtype],len(names),start,int(step)*60,len(values))
+    table = b''.join(struct.pack('<B',len(name.encode()))+name.encode()+struct.pack('<d',factor) for name, factor in zip(names,factors))
+
+    out = open(filename,'wb') if isinstance(filename,str) else filename
+    try:
+        out.write(header+table)
+        out.write(data.tobytes())
+    finally:
+        if isinstance(filename,str):
+            out.close()
+
+##############################################
+##############################################
+##                 READING                  ##
+##############################################
+##############################################
+
+def _read_exactly(stream,n):
+    data = b''
+    while len(data)<n:
+        chunk = stream.read(n-len(data))
+        if not chunk:
+            raise ValueError('truncated time series')
+        data += chunk
+    return data
+
+def read_header(stream):
+
+    """Read the header and the channel table of a binary time series
+
+    - **Input**:
+        - :stream: binary file object, positioned at the beginning of the series
+
+    - **Output**:
+        - :header: dictionnary with 'start' (datetime64[s]), 'step' (minutes), 'timepoints', 'channels' (names), 'scales', 'dtype' and 'size' (bytes before the data)"""
+
+    magic, version, code, n_channels, start, step, timepoints = HEADER.unpack(_read_exactly(stream,HEADER.size))
+    if magic!=MAGIC:
+        raise ValueError('not a binary time series')
+    if version>VERSION:
+        raise ValueError('unsupported version '+str(version))
+    size = HEADER.size
+    channels, scales = [], []
+    for n in range(n_channels):
+        length = _read_exactly(stream,1)[0]
+        channels.append(_read_exactly(stream,length).decode())
+        scales.append(struct.unpack('<d',_read_exactly(stream,8))[0])
+        size += 1+length+8
+    dtype = 'int16' if code==DTYPES['int16'] else 'float32'
+    return {'start':datetime64(start,'s'), 'step':step//60, 'timepoints':timepoints, 'channels':channels, 'scales':asarray(scales),
+            'dtype':dtype, 'size':size}
+
+def _decode(raw,header):
+    values = raw.astype(float)
+    if header['dtype']=='int16':
+        values = where(raw==NAN_INT16,nan,values*header['scales'])
+    return values
+
+def timestamps_of(header,first=0,n=None):
+
+    """Timestamps (datetime64[m]) of the timepoints first to first+n of a series"""
+
+    n = header['timepoints']-first if n is None else n
+    return datetime64(header['start'],'m')+(first+arange(n))*timedelta64(header['step'],'m')
+
+def read_series(filename,mmap=True):
+
+    """Read a whole binary time series file
+
+    - **Input**:
+        - :filename: the file
+        - :mmap: if True, float32 data is memory-mapped (int16 data is decoded at once)
+
+    - **Output**:
+        - :timestamps: datetime64[m] array
+        - :values: dictionnary of the values of each channel"""
+
+    with open(filename,'rb') as stream:
+        header = read_header(stream)
+        raw_type = npdtype('<i2' if header['dtype']=='int16' else '<f4')
+        shape = (header['timepoints'],len(header['channels']))
+        if mmap and header['timepoints']:
+            raw = memmap(filename,dtype=raw_type,mode='r',offset=header['size'],shape=shape)
+        else:
+            raw = frombuffer(_read_exactly(stream,shape[0]*shape[1]*raw_type.itemsize),dtype=raw_type).reshape(shape)
+    values = raw if header['dtype']=='float32' else _decode(raw,header)
+    return timestamps_of(header), dict((name,values[:,n]) for n, name in enumerate(header['channels']))
+
+def iter_series(stream,chunk=4096):
+
+    """Read a binary time series from a stream, chunk by chunk (generator)
+
+    - **Input**:
+        - :stream: binary file object (file, socket file, HTTP response) or file name
+        - :chunk: number of timepoints per chunk
+
+    - **Output**: yields for each chunk
+        - :timestamps: datetime64[m] array
+        - :values: dictionnary of the values of each channel"""
+
+    if isinstance(stream,str):
+        with open(stream,'rb') as opened:
+            for item in iter_series(opened,chunk):
+                yield item
+        return
+
+    header = read_header(stream)
+    raw_type = npdtype('<i2' if header['dtype']=='int16' else '<f4')
+    width = len(header['channels'])
+    first = 0
+    while first<header['timepoints']:
+        n = min(chunk,header['timepoints']-first)
+        raw = frombuffer(_read_exactly(stream,n*width*raw_type.itemsize),dtype=raw_type).reshape(n,width)
+        values = _decode(raw,header).astype(float32) if header['dtype']=='int16' else raw
+        yield timestamps_of(header,first,n), dict((name,values[:,i]) for i, name in enumerate(header['channels']))
+        first += n
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+CANTON REFERENCE CURVES
+###########################################
+###########################################
+
+This module prepares the reference curve of the front end (the consumption of the canton, e.g. Canton_Argau_Consumption_2018.csv)
+once, server-side, instead of rescaling it in the browser (normalize in js/data.js):
+    - the canton files are parsed once into the columnar cache (cf: ingestion) and put on the day x 15 minutes grid of the store,
+      through the same regularization as the households (cf: regularize), so both grids line up on the days of the DST changes
+    - the scale factor of each household maps the canton consumption to the household consumption:
+        factor = sum of the household / sum of the canton, on the slots where both have a value
+      (the same as average / reference average in normalize, cf: recommendation.scale_reference), for the whole calendar and for
+      a rolling window of days (the window ends on the day), computed with cumulative sums over the days
+    - the reference of a club (the households of a LoadCurveStore) is written in a compact form: the canton grid (float32) and
+      the factors of each household, instead of one scaled copy of the canton consumption per household
+
+A reference folder (folder/name) contains reference.npy (days, slots), factors.npy (households,), rolling.npy (households, days)
+and meta.json (households, calendar, window, sources).
+"""
+
+import json # import module to read/write the metadata of the reference
+from os import path, makedirs # import module to deal with file paths
+from numpy import asarray, arange, zeros, full, concatenate, cumsum, isnan, where, nan, errstate, argsort, load, save, float32, datetime64 # import module to work with arrays / matrices
+from ingestion import load_columns # import module to load the canton files as typed columns, cached after the first run
+from regularize import local_grid, zone # import module to put the canton consumption on local days across the summer/winter time changes
+from instrumentation import timed # import module to time the pipeline
+
+CANTON_FILES = ('Canton_Argau_Consumption_2017.csv','Canton_Argau_Consumption_2018.csv')
+window = 28 # number of days of the rolling scale factors
+
+##############################################
+##############################################
+##              CANTON GRID                 ##
+##############################################
+##############################################
+
+def canton_columns(filenames=CANTON_FILES,cache='Results/cache'):
+
+    """Timestamps and consumption of the canton files, in time order
+
+    - **Input**:
+        - :filenames: the canton files (e.g. one per year)
+        - :cache: the ingestion cache folder
+
+    - **Output**:
+        - :timestamps: datetime64[m] array, end of each interval
+        - :values: float32 array of the consumption [kWh]"""
+
+    columns = [load_columns(filename,cache,'canton') for filename in filenames]
+    timestamps = concatenate([column.timestamps for column in columns])
+    values = concatenate([column.values for column in columns])
+    order = argsort(timestamps,kind='stable')
+    return timestamps[order], values[order]
+
+def reference_grid(dates,filenames=CANTON_FILES,cache='Results/cache',n_slots=96,zone=zone):
+
+    """Canton consumption on a (days, slots) grid, e.g. the calendar of a store => NaN where the canton files have no value
+    (and in the skipped hour of the spring DST change), the repeated hour of the autumn change averaged like the households"""
+
+    timestamps, values = canton_columns(filenames,cache)
+    return local_grid(timestamps,values,dates,zone,24*60//n_slots)
+
+##############################################
+##############################################
+##              SCALE FACTORS               ##
+##############################################
+##############################################
+
+def scale_factors(reference,cube,window=None):
+
+    """Scale factors of households: sum of the household / sum of the reference, on the slots where both have a value
+
+    - **Input**:
+        - :reference: (days, slots) array of the reference
+        - :cube: (households, days, slots) array of the households on the same grid (or (days, slots) for one household)
+        - :window: number of days of a rolling window ending on each day => one factor for the whole grid if None
+
+    - **Output**:
+        - :factors: (households,) array, or (households, days) with a window => NaN without common values"""
+
+    reference = asarray(reference,dtype=float)
+    cube = asarray(cube,dtype=float)
+    both = ~isnan(cube) & ~isnan(reference)
+    household = where(both,cube,0).sum(axis=-1) # daily sums on the common slots
+    canton = where(both,reference,0).sum(axis=-1)
+    if window is None:
+        household, canton = household.sum(axis=-1), canton.sum(axis=-1)
+    else: # rolling sums with cumulative sums => the cost does not depend on the window
+        zero = zeros(household.shape[:-1]+(1,))
+        household, canton = [concatenate((zero,cumsum(sums,axis=-1)),axis=-1) for sums in (household,canton)]
+        first = (arange(1,household.shape[-1])-window).clip(0) # first day of the window ending on each day
+        household, canton = [sums[...,1:]-sums[...,first] for sums in (household,canton)]
+    with errstate(invalid='ignore',divide='ignore'):
+        return where(canton>0,household/canton,nan)
+
+##############################################
+##############################################
+##            CLUB REFERENCE                ##
+##############################################
+##############################################
+
+@timed()
+def build_reference(store,folder='Results/reference',name='canton',filenames=CANTON_FILES,cache='Results/cache',window=window,chunk_size=256,reference=None):
+
+    """Compute and write the reference of the households of a LoadCurveStore (a club)
+
+    - **Input**:
+        - :store: the LoadCurveStore
+        - :folder: the folder of the references
+        - :name: name of the reference (e.g. the club) => sub-folder of folder
+        - :filenames: the canton files
+        - :cache: the ingestion cache folder
+        - :window: number of days of the rolling scale factors
+        - :chunk_size: number of households in memory at once
+        - :reference: the canton grid on the calendar of the store, if it was already computed (cf: reference_grid)
+
+    - **Output**:
+        - :folder: the folder of the reference"""
+
+    if reference is None:
+        reference = reference_grid(store.dates(),filenames,cache,store.n_slots)
+    factors, rolling = zeros(len(store)), zeros((len(store),store.n_days))
+    for start in range(0,len(store),chunk_size):
+        chunk = store.cube[start:start+chunk_size]
+        factors[start:start+chunk_size] = scale_factors(reference,chunk)
+        rolling[start:start+chunk_size] = scale_factors(reference,chunk,window)
+    return write_reference(folder,name,store.first_date,reference,factors,rolling,households=store.households,window=window,
+                           sources=[path.basename(filename) for filename in filenames])
+
+def write_reference(folder,name,first_date,reference,factors,rolling,**meta):
+
+    """Store a reference: reference.npy (float32), factors.npy, rolling.npy (float32) and meta.json in folder/name
+
+    - **Input**:
+        - :folder: the folder of the references
+        - :name: name of the reference
+        - :first_date: date of the first row of reference
+        - :reference: (days, slots) array
+        - :factors, rolling: cf: scale_factors
+        - :meta: other values kept in meta.json (e.g. households, window)"""
+
+    folder = path.join(folder,str(name))
+    if not path.isdir(folder):
+        makedirs(folder)
+    save(path.join(folder,'reference.npy'),asarray(reference,dtype=float32))
+    save(path.join(folder,'factors.npy'),asarray(factors,dtype=float))
+    save(path.join(folder,'rolling.npy'),asarray(rolling,dtype=float32))
+    meta.update({'first_date':str(datetime64(first_date,'D')), 'n_days':len(reference), 'n_slots':asarray(reference).shape[1]})
+    with open(path.join(folder,'meta.json'),'w') as out:
+        json.dump(meta,out)
+    return folder
+
+def read_reference(folder,name,mmap=True):
+
+    """Read a reference
+
+    - **Input**:
+        - :folder: the folder of the references
+        - :name: name of the reference
+        - :mmap: if True, the arrays are memory-mapped instead of read
+
+    - **Output**:
+        - :reference, factors, rolling: cf: write_reference
+        - :meta: the metadata (households, first_date, n_days, n_slots, window...)"""
+
+    folder = path.join(folder,str(name))
+    with open(path.join(folder,'meta.json')) as meta:
+        meta = json.load(meta)
+    mode = 'r' if mmap else None
+    return tuple(load(path.join(folder,part+'.npy'),mmap_mode=mode) for part in ('reference','factors','rolling'))+(meta,)
+
+def scaled_reference(folder,name,household,start=None,end=None,rolling=False):
+
+    """Reference of one household between 2 dates, in the units of the household
+
+    - **Input**:
+        - :folder, name: the reference
+        - :household: the ID of the household
+        - :start: first date (included) => first date of the reference if None
+        - :end: last date (not included) => end of the reference if None
+        - :rolling: if True, each day is scaled with the factor of its rolling window, otherwise with the factor of the household
+
+    - **Output**:
+        - :reference: (days, slots) array, NaN outside of the reference or without factor"""
+
+    reference, factors, rolls, meta = read_reference(folder,name)
+    n = meta['households'].index(household)
+    first_date = datetime64(meta['first_date'],'D')
+    first = 0 if start is None else int((datetime64(start,'D')-first_date).astype(int))
+    last = meta['n_days'] if end is None else int((datetime64(end,'D')-first_date).astype(int))
+    rows = full((max(last-first,0),meta['n_slots']),nan)
+    factor = full((len(rows),1),nan) if rolling else factors[n]
+    start, end = max(first,0), min(last,meta['n_days']) # only the part inside the calendar of the reference is read
+    if start<end:
+        rows[start-first:end-first] = reference[start:end]
+        if rolling:
+            factor[start-first:end-first,0] = rolls[n,start:end]
+    return rows*factor
+
+
+if __name__ == "__main__":
+
+    import sys
+    from loadcurve_store import LoadCurveStore
+
+    store = sys.argv[1] if len(sys.argv)>1 else 'Results/store' # python canton.py <store folder> [name of the reference]
+    name = sys.argv[2] if len(sys.argv)>2 else 'canton'
+    store = LoadCurveStore(store)
+    folder = build_reference(store,name=name)
+    reference, factors, rolling, meta = read_reference('Results/reference',name)
+    for household, factor in zip(meta['households'],factors):
+        print(household,': factor %.3g' % factor)
+    print('reference written in',folder)
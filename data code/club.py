@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+CLUB AGGREGATION - MANY HOUSEHOLDS
+###########################################
+###########################################
+
+This module aggregates the load curves of the households of a directory (a "club", or a given area) on a common
+day x 15 minutes grid, for the "Consumption for a given area" and "My Club" screens:
+    - the club total of each time slot and the number of members measured in it
+    - the share of each member in the energy of the club
+    - the contribution of each member to the club peak (its value at the peak slot / club total at the peak slot)
+      and its average share at the peak of every day
+
+The members are read with the ingestion cache (smart-meter Excel files) or the binary format (cf: binary_export), and processed
+in chunks by a pool of processes, so only one chunk of members per process is in memory at once:
+    - pass 1: calendar of each member (and the ingestion cache is filled, in parallel)
+    - pass 2: partial sums of each chunk on the common grid => club total, counts, energy per member
+    - pass 3: value of each member at the club peak slots
+
+The members of Excel files are put on the local days through the regularization (cf: regularize), like the household of
+visualize_energy.py, so the repeated and skipped hours of the DST changes are handled the same way; the binary files already
+have regular timestamps on the local day grid.
+
+The results are written like those of a household: the club total in the LoadCurveStore (in Watt [W], like the households),
+the 4 weeks average CSV and binary files of the front end, and a members.csv with the shares and peak contributions.
+"""
+
+from os import path, listdir, makedirs, cpu_count # import module to deal with files
+from concurrent.futures import ProcessPoolExecutor # import module to process the chunks in parallel
+from multiprocessing import get_context, get_all_start_methods # import module to choose how the processes are started
+from numpy import asarray, zeros, full, arange, isnan, where, nan, nansum, nanmean, nanargmax, errstate, datetime64, timedelta64, concatenate # import module to work with arrays / matrices
+from pandas import DataFrame # import module to write csv data
+from ingestion import load_columns, day_slot_matrix # import module to load the measurements as typed columns, cached after the first run
+from regularize import local_grid # import module to put the readings on local days, whatever the DST changes
+from binary_export import read_series, write_series # import module to read/write the compact binary time series
+from baseline import same_weekday_baseline # import module to compute the 4 previous weeks average of the club
+from loadcurve_store import LoadCurveStore # import module to keep the club total with the household load curves
+
+timeratio = 15 # number of minutes that separate 2 observed timepoints
+Ntmp = 96 # Number of measured timepoints for one day
+EXTENSIONS = ('.xlsx','.bin') # files of the members in a club directory
+
+##############################################
+##############################################
+##                 MEMBERS                  ##
+##############################################
+##############################################
+
+def member_files(directory):
+
+    """Files of the members of a club directory, in name order"""
+
+    return sorted(path.join(directory,name) for name in listdir(directory) if path.splitext(name)[1].lower() in EXTENSIONS)
+
+def member_name(filename):
+
+    """ID of a member => its file name without extension"""
+
+    return path.splitext(path.basename(filename))[0]
+
+def load_member(filename,cache='Results/cache'):
+
+    """Timestamps (end of each interval) and values of a member, from an Excel file (cf: ingestion) or a binary file (cf: binary_export)"""
+
+    if filename.lower().endswith('.bin'):
+        timestamps, values = read_series(filename)
+        return timestamps, values['power'] if 'power' in values else next(iter(values.values()))
+    columns = load_columns(filename,cache,'household')
+    return columns.timestamps, columns.values
+
+def member_matrix(filename,first_date,n_days,cache='Results/cache'):
+
+    """(days, slots) load curves of a member on the common grid, NaN where it has no value"""
+
+    timestamps, values = load_member(filename,cache)
+    if filename.lower().endswith('.bin'): # regular timestamps, already on the local day grid
+        return day_slot_matrix(timestamps,values,first_date+arange(n_days),Ntmp)
+    return local_grid(timestamps,values,first_date+arange(n_days),step=timeratio) # meter labels => regularized
+
+##############################################
+##############################################
+##            CHUNKED REDUCTION             ##
+##############################################
+##############################################
+
+def _calendar(filenames,cache):
+    days = []
+    for filename in filenames:
+        timestamps = load_member(filename,cache)[0]
+        begin = (asarray(timestamps[[0,-1]],dtype='datetime64[m]')-timedelta64(timeratio,'m')).astype('datetime64[D]') # first and last day
+        days.append((begin[0],begin[1]))
+    return days
+
+def _sums(filenames,first_date,n_days,cache):
+    total, count = zeros((n_days,Ntmp)), zeros((n_days,Ntmp),dtype=int)
+    energy = []
+    for filename in filenames:
+        matrix = member_matrix(filename,first_date,n_days,cache)
+        present = ~isnan(matrix)
+        total += where(present,matrix,0)
+        count += present
+        energy.append(nansum(matrix))
+    return total, count, energy
+
+def _at_peaks(filenames,first_date,n_days,rows,slots,cache):
+    return [member_matrix(filename,first_date,n_days,cache)[rows,slots] for filename in filenames]
+
+def _map_chunks(function,chunks,workers,*args):
+    if workers==1 or len(chunks)<=1:
+        return [function(chunk,*args) for chunk in chunks]
+    context = get_context('fork') if 'fork' in get_all_start_methods() else None # forked processes do not re-run the calling script
+    with ProcessPoolExecutor(min(workers,len(chunks)),mp_context=context) as pool:
+        return list(pool.map(function,chunks,*[[arg]*len(chunks) for arg in args]))
+
+def aggregate_club(directory,cache='Results/cache',workers=None,chunk_size=64):
+
+    """Aggregate the members of a club directory
+
+    - **Input**:
+        - :directory: the directory of the member files (cf: member_files)
+        - :cache: the ingestion cache folder
+        - :workers: number of processes => number of CPUs if None, 1 to compute everything in the current process
+        - :chunk_size: number of members processed by a process at once
+
+    - **Output**:
+        - :club: dictionnary with
+            - 'members': member IDs
+            - 'dates': dates of the grid (datetime64[D])
+            - 'total', 'count': (days, slots) club total and number of measured members
+            - 'energy', 'share': energy of each member and its share of the club energy
+            - 'peak': (day index, slot) of the club peak => None if no member has any value
+            - 'peak_contribution': value of each member at the club peak / club total at the peak
+            - 'peak_day_share': average share of each member at the peak of each day"""
+
+    files = member_files(directory)
+    if not files:
+        raise ValueError('no member file in '+directory)
+    workers = workers or cpu_count() or 1
+    chunks = [files[i:i+chunk_size] for i in range(0,len(files),chunk_size)]
+
+    days = concatenate(_map_chunks(_calendar,chunks,workers,cache))
+    first_date, last_date = days[:,0].min(), days[:,1].max()
+    n_days = int((last_date-first_date).astype(int))+1
+
+    total, count, energy = zeros((n_days,Ntmp)), zeros((n_days,Ntmp),dtype=int), []
+    for chunk_total, chunk_count, chunk_energy in _map_chunks(_sums,chunks,workers,first_date,n_days,cache): # reduction of the chunks
+        total += chunk_total
+        count += chunk_count
+        energy += chunk_energy
+    total = where(count>0,total,nan)
+    energy = asarray(energy)
+
+    daily = where(isnan(total),-1e300,total).argmax(axis=1) # peak slot of each day
+    measured = ~isnan(total).all(axis=1)
+    rows, slots = arange(n_days)[measured], daily[measured]
+    with errstate(invalid='ignore',divide='ignore'):
+        club = {'members':[member_name(filename) for filename in files], 'dates':first_date+arange(n_days), 'total':total, 'count':count,
+                'energy':energy, 'share':energy/energy.sum(), 'peak':None, 'peak_contribution':full(len(files),nan), 'peak_day_share':full(len(files),nan)}
+        if len(rows)==0: # no measured day => no peak
+            return club
+        peak = int(nanargmax(total[rows,slots])) # the club peak is the highest daily peak
+        values = concatenate([asarray(chunk).reshape(-1,len(rows)) for chunk in _map_chunks(_at_peaks,chunks,workers,first_date,n_days,rows,slots,cache)])
+        values = where(isnan(values),0,values)
+        club.update({'peak':(int(rows[peak]),int(slots[peak])), 'peak_contribution':values[:,peak]/total[rows[peak],slots[peak]],
+                     'peak_day_share':nanmean(values/total[rows,slots],axis=1)}) # days with a zero peak are left out
+    return club
+
+##############################################
+##############################################
+##                 OUTPUTS                  ##
+##############################################
+##############################################
+
+def write_club(club,folder='Results',name='club',store='Results/store',weeks=4):
+
+    """Write the results of a club like those of a household
+
+    - **Input**:
+        - :club: the dictionnary of aggregate_club
+        - :folder: the folder of the results
+        - :name: name of the club => ID of the club total in the store, and beginning of the file names
+        - :store: folder of the LoadCurveStore receiving the club total (None to skip it)
+        - :weeks: number of weeks of the average
+
+    - **Output**:
+        - :files: list of the written files"""
+
+    if not path.isdir(folder):
+        makedirs(folder)
+    total, dates = club['total'], club['dates']
+    if store is not None:
+        LoadCurveStore.open(store,dates[0],len(dates),Ntmp).put(name,total*4*1000,dates[0]) # kiloWatt hour per 15min [kWh] => Watt [W], the units of the store
+
+    average = same_weekday_baseline(total,weeks) # average of the same weekday over the previous weeks, like 4weeks_dataset1.csv
+    timestamps = (datetime64(dates[0],'m')+timedelta64(timeratio,'m'))+arange(total.size)*timedelta64(timeratio,'m') # end of each interval
+    csv, binary, members = [path.join(folder,name+suffix) for suffix in ('_4weeks.csv','_4weeks.bin','_members.csv')]
+    DataFrame({'DateTime':timestamps.astype('datetime64[s]'), 'average':average.reshape(-1), 'power':total.reshape(-1)}).to_csv(csv,index=False,float_format='%g')
+    write_series(binary,timestamps[0],timeratio,[('average',average.reshape(-1)), ('power',total.reshape(-1))])
+    DataFrame({'member':club['members'], 'energy':club['energy'], 'share':club['share'], 'peak_contribution':club['peak_contribution'],
+               'peak_day_share':club['peak_day_share']}).to_csv(members,index=False,float_format='%g')
+    return [csv,binary,members]
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    directory = sys.argv[1] if len(sys.argv)>1 else '.' # python club.py <directory of the members> [name of the club]
+    name = sys.argv[2] if len(sys.argv)>2 else path.basename(path.abspath(directory))
+    club = aggregate_club(directory)
+    print(len(club['members']),'members,',len(club['dates']),'days from',club['dates'][0],end=' ')
+    if club['peak'] is None:
+        print('- no measured value')
+    else:
+        day, slot = club['peak']
+        print('- club peak on',club['dates'][day],'slot',slot)
+    for filename in write_club(club,name=name):
+        print(' ',filename)
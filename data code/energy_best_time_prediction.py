@@ -6,75 +6,23 @@ Created on Sat Feb 16 08:51:36 2019
 @author: cuozzo
 """
 
-from numpy import array, zeros # import module to work with arrays / matrices
-from datetime import datetime, date # import module to deal with dates, time, etc.
-from pandas import read_csv # import module to load excel data
-import matplotlib.pyplot as plt # import module to make graphs
+from numpy import nanargmax, unravel_index # import module to work with arrays / matrices
+from ingestion import load_columns # import module to load the forecast as typed columns, cached after the first run
+from solar_forecast import week_hour_tensor # import module to build the weekday x hour tables of the forecast
 from pylab import imshow
 
 dico_weekday = {0:'Monday', 1:'Tuesday', 2:'Wednesday', 3:'Thursday', 4:'Friday', 5:'Saturday', 6:'Sunday'}
 
-data = read_csv('Solarenergie-6.csv')#,na_values="*)") # load excel file
-matrixdata = data.as_matrix() # convert data into a matrix
+forecast = load_columns('Solarenergie-6.csv','Results/cache','solar') # timestamps and the 4 TSO columns (MW)
 
-Datum = array(matrixdata[0:len(matrixdata),0:1])[list(range(len(matrixdata))),[0]*len(matrixdata)] # devCode is the list of devices' names =>  to correct the really annoying format of the original array loaded by the matlab file... => we move from array([array([0]),array([1])...]) to array([0,1]), which is way more suitable for the next parts !       
+tensor, monday = week_hour_tensor(forecast.timestamps,forecast.values) # (weeks, 7, 24) hourly means of the sum of the 4 TSO, for all the weeks from the first Monday
+table = tensor[0] # first week
 
-Dates = [] # empty list
-for day in Datum[1:]: # loop for each line/row of the file
-    Dates.append(str(day).split(' ')[0]) # saving the date
-Dates = list(zip(*[iter(Dates)]*Ntmp)) # changing the list into a list of sub-lists => each sublist corresponds to one day timepoints (96 x 15 minutes)
-Dates = [sorted(list(set(dates)))[0] for dates in Dates] # we want each date only onc
-
-select_days = []
-
-D = 0
-start = False
-for i in range(len(Dates)):
-    split = Dates[i].split('.') # splits the day string into a list separating the day, month and year
-    dateofday = date(int(split[2]),int(split[1]),int(split[0])) # uses the datetime module to give the exact date in a usable format
-    weekday = dateofday.weekday() # uses the datetime module: gives the week of the day for the given date in the form of an integer (0=monday, 1=tuesday, 2=wednesday, 3=thursday, 4=friday, 5=saturday, 6=sunday)
-    day = dico_weekday[weekday] # day of the week in string (monday, tuesday, wednesday, thursday, friday, saturday, sunday)
-    if day == 'Monday':
-        start = True
-    if start == True:
-        select_days.append([Dates[i],day])
-        D += 1
-    if D == 7:
-        start = False
-        break
-    
-    
-
-table = zeros((7,24))
-start = select_days[0][0]
-
-end = select_days[-1][0]
-
-go = False
-count = 0
-mean = 0
-hour = -1
-day_index = 0
-for line in matrixdata:
-    if line[0] == start:
-        go = True
-    
-    if go == True:
-        hour += 0.25
-        if int(hour)!=float(hour):
-            mean += sum(line[6:])
-        else:
-            mean /= 4
-            table[day_index,int(hour)] = mean
-            mean = 0
-            if hour == 23:
-                day_index += 1
-                hour = -1          
-        
-    if line[0] == end:
-        count += 1
-    if count == 96:
-        go = False
+print('Week of',monday)
+for day in range(7): # best hour of each day, between 8h and 18h
+    print(' ', dico_weekday[day], 8+nanargmax(table[day,8:18]), 'h')
+day, hour = unravel_index(nanargmax(table[:,8:18]),table[:,8:18].shape)
+print('Best moment of the week:', dico_weekday[day], 8+hour, 'h')
 
 #pcolor(table, edgecolors='k', linewidths=4)
 #plt.show()
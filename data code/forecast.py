@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+HOUSEHOLD CONSUMPTION FORECAST
+###########################################
+###########################################
+
+This module forecasts the load curve of a household for the next days (96 x 15 minutes timepoints per day), to replace
+the "last year" proxy of the front end. Each day is described by calendar features:
+    - the weekday class (cf: dico_weekday_index => working day, Saturday, Sunday)
+    - the month and the season (cf: aggregation)
+    - the sunrise and sunset slots and the daylight length (cf: sunset), if the site is given
+    - the recent level: average consumption of the week that ends lag days before the day, known for every day of the forecast
+
+The 96 slots of a day share the same features, so the model is one ridge regression with 96 right-hand sides:
+    coefficients = (X'X + alpha I)^-1 X'Y, X = (days, features), Y = (days, 96)
+solved with one Cholesky factorization for all the slots. The prediction intervals are the empirical quantiles of the
+training residuals of each slot, added to the forecast.
+
+fit_fleet trains the models of many households (e.g. all the households of a LoadCurveStore): the calendar features are built
+once, and the households are solved together, chunk by chunk, as the right-hand sides of the same system.
+"""
+
+from collections import namedtuple # import module to create simple record types
+from numpy import asarray, ones, zeros, full, arange, concatenate, column_stack, cumsum, isnan, isfinite, where, nan, errstate, quantile, nanmin, isin, einsum, unique, tile, maximum, ascontiguousarray, datetime64, timedelta64 # import module to work with arrays / matrices
+from scipy.linalg import cho_factor, cho_solve # import module to solve the normal equations once for all the slots
+from aggregation import weekday_class_labels, month_labels, season_labels # import module to give the calendar labels of the dates
+from instrumentation import timed # import module to time the training
+
+Ntmp = 96 # Number of timepoints for one day
+timeratio = 15 # number of minutes that separate 2 observed timepoints
+
+Model = namedtuple('Model',['coefficients','names','mean','std','alpha','quantiles','intervals','floor','settings']) # cf: fit
+# coefficients: (features, 96) ridge coefficients on the standardized features
+# names: name of each feature
+# mean, std: standardization of the features (training days)
+# quantiles, intervals: quantiles of the prediction intervals and (quantiles, 96) residual quantiles of each slot
+# floor: lowest training value => the forecast is never below it
+# settings: dictionnary of the feature settings (seasons, site, holidays, lag, window), reused by forecast
+
+##############################################
+##############################################
+##                 FEATURES                 ##
+##############################################
+##############################################
+
+def recent_level(loadcurve,lag=7,window=7):
+
+    """Average consumption of the window days ending lag days before each day (NaN days skipped, NaN if none)
+
+    - **Input**:
+        - :loadcurve: (days, 96) array, or (households, days, 96), NaN for the days without measurement (e.g. the days to forecast)
+        - :lag: number of days between the day and the last day of its window => a forecast up to lag days ahead knows its level
+        - :window: number of days of the window
+
+    - **Output**:
+        - :level: (days,) array, or (households, days)"""
+
+    loadcurve = asarray(loadcurve,dtype=float)
+    present = ~isnan(loadcurve)
+    zero = zeros(loadcurve.shape[:-2]+(1,))
+    total = concatenate((zero,cumsum(where(present,loadcurve,0).sum(axis=-1),axis=-1)),axis=-1) # cumulative sums => any window at once
+    count = concatenate((zero,cumsum(present.sum(axis=-1),axis=-1)),axis=-1)
+    last = arange(loadcurve.shape[-2])-lag+1 # end (not included) of the window of each day
+    first = (last-window).clip(0)
+    last = last.clip(0)
+    n = count[...,last]-count[...,first]
+    with errstate(invalid='ignore',divide='ignore'):
+        return where(n>0,(total[...,last]-total[...,first])/n,nan)
+
+def calendar_features(dates,seasons=None,site=None,holidays=None,level=None):
+
+    """Design matrix of the days: one row per day, one column per feature
+
+    - **Input**:
+        - :dates: the dates of the days (datetime64, strings, datetime.date...)
+        - :seasons: season start dates (cf: aggregation.season_labels) => astronomical seasons if None
+        - :site: (latitude, longitude, utc_offset or time zone, e.g. 'Europe/Zurich') for the sunrise/sunset features => none if None
+        - :holidays: dates of the public holidays => no holiday feature if None
+        - :level: recent level of each day (cf: recent_level) => none if None
+
+    - **Output**:
+        - :X: (days, features) array, without the intercept
+        - :names: name of each feature"""
+
+    dates = asarray(dates,dtype='datetime64[D]')
+    columns, names = [], []
+    classes = weekday_class_labels(dates)
+    for label, name in ((1,'saturday'),(2,'sunday')): # the working days are the reference
+        columns.append(classes==label)
+        names.append(name)
+    months = month_labels(dates)
+    for month in range(1,12): # January is the reference
+        columns.append(months==month)
+        names.append('month_'+str(month+1))
+    season = season_labels(dates,seasons)
+    for label, name in ((1,'summer'),(2,'autumn'),(3,'winter')): # spring is the reference
+        columns.append(season==label)
+        names.append(name)
+    if site is not None:
+        from sunset import get_sun_times
+        latitude, longitude, utc_offset = site
+        sun = get_sun_times(dates,latitude,longitude,utc_offset,slot_minutes=timeratio)
+        columns += [sun['sunrise'],sun['sunset'],sun['sunset']-sun['sunrise']]
+        names += ['sunrise','sunset','daylight']
+    if holidays is not None:
+        columns.append(isin(dates,asarray(holidays,dtype='datetime64[D]')))
+        names.append('holiday')
+    if level is not None:
+        columns.append(level)
+        names.append('level')
+    return column_stack(columns).astype(float), names
+
+##############################################
+##############################################
+##            TRAINING / FORECAST           ##
+##############################################
+##############################################
+
+def _standardize(X,mean,std):
+    return concatenate((ones((len(X),1)),(X-mean)/std),axis=1) # intercept first
+
+def _penalty(n_features,alpha):
+    penalty = full(n_features+1,float(alpha))
+    penalty[0] = 0 # the intercept is not penalized
+    return penalty
+
+@timed()
+def fit(loadcurve,dates,seasons=None,site=None,holidays=None,lag=7,window=7,alpha=1.,quantiles=(0.05,0.95)):
+
+    """Train the forecast model of a household
+
+    - **Input**:
+        - :loadcurve: (days, 96) array of the load curves, NaN where not measured => the incomplete days are left out
+        - :dates: the dates of the rows (consecutive days)
+        - :seasons: season start dates => astronomical seasons if None
+        - :site: (latitude, longitude, utc_offset or time zone, e.g. 'Europe/Zurich') for the sunrise/sunset features => none if None
+        - :holidays: dates of the public holidays (past and future) => no holiday feature if None
+        - :lag, window: the recent level feature (cf: recent_level) => lag is the longest horizon of the forecast, no level if None
+        - :alpha: ridge penalty of the standardized features
+        - :quantiles: quantiles of the prediction intervals
+
+    - **Output**:
+        - :model: Model"""
+
+    loadcurve = asarray(loadcurve,dtype=float)
+    level = None if lag is None else recent_level(loadcurve,lag,window)
+    X, names = calendar_features(dates,seasons,site,holidays,level)
+    keep = ~isnan(loadcurve).any(axis=1) & isfinite(X).all(axis=1) # complete days, with a level
+    if keep.sum()<2:
+        raise ValueError('not enough complete days to train the model')
+    X, Y = X[keep], loadcurve[keep]
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    std[std==0] = 1 # constant feature (e.g. no Sunday yet)
+    Xs = _standardize(X,mean,std)
+    A = Xs.T@Xs
+    A[arange(len(A)),arange(len(A))] += _penalty(len(names),alpha)
+    coefficients = cho_solve(cho_factor(A),Xs.T@Y) # the 96 slots at once
+    intervals = quantile(Y-Xs@coefficients,quantiles,axis=0)
+    settings = {'seasons':seasons, 'site':site, 'holidays':holidays, 'lag':lag, 'window':window}
+    return Model(coefficients,names,mean,std,alpha,tuple(quantiles),intervals,float(nanmin(Y)),settings)
+
+def predict(model,dates,level=None):
+
+    """Forecast of given days from their features
+
+    - **Input**:
+        - :model: the Model of the household
+        - :dates: the dates of the days
+        - :level: recent level of each day (cf: recent_level) => needed if the model uses it, NaN for the average level
+
+    - **Output**:
+        - :forecast: (days, 96) array"""
+
+    settings = model.settings
+    if settings['lag'] is not None:
+        level = where(isnan(level),model.mean[-1],level) # unknown level (no measurement in the window) => average level of the training days
+    X = calendar_features(dates,settings['seasons'],settings['site'],settings['holidays'],level if settings['lag'] is not None else None)[0]
+    return (_standardize(X,model.mean,model.std)@model.coefficients).clip(model.floor)
+
+def forecast(model,loadcurve,first_date,days=7):
+
+    """Forecast of the days that follow the measurements, with prediction intervals
+
+    - **Input**:
+        - :model: the Model of the household
+        - :loadcurve: (days, 96) measured load curves, up to the day before the forecast
+        - :first_date: date of the first row of loadcurve
+        - :days: number of days of the forecast => at most the lag of the model
+
+    - **Output**:
+        - :forecast: dictionnary with 'dates' (datetime64[D]), 'mean', 'low', 'high' ((days, 96) arrays, lowest and highest quantiles)
+          and 'timestamps' (end of each interval, datetime64[m])"""
+
+    lag = model.settings['lag']
+    if lag is not None and days>lag:
+        raise ValueError('the forecast cannot go beyond the lag of the model ('+str(lag)+' days)')
+    loadcurve = asarray(loadcurve,dtype=float)
+    dates = datetime64(first_date,'D')+len(loadcurve)+arange(days)
+    level = None
+    if lag is not None:
+        level = recent_level(concatenate((loadcurve,full((days,loadcurve.shape[1]),nan))),lag,model.settings['window'])[-days:]
+    mean = predict(model,dates,level)
+    low, high = [(mean+model.intervals[n]).clip(model.floor) for n in (0,-1)]
+    timestamps = (datetime64(dates[0],'m')+timedelta64(timeratio,'m'))+arange(mean.size)*timedelta64(timeratio,'m')
+    return {'dates':dates, 'timestamps':timestamps, 'mean':mean, 'low':low, 'high':high}
+
+
+##############################################
+##############################################
+##              FLEET TRAINING              ##
+##############################################
+##############################################
+
+Fleet = namedtuple('Fleet',['households','coefficients','names','mean','std','alpha','quantiles','intervals','floor','settings']) # the Models of many households, stacked => cf: fit_fleet
+# coefficients: (households, features+1, 96), mean, std: (households, features), intervals: (households, quantiles, 96), floor: (households,)
+# => NaN for the households without enough complete days
+
+def _fit_group(X,Y,level,alpha,quantiles):
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    std[std==0] = 1
+    Xs = _standardize(X,mean,std)
+    rows, n_households, n_slots = Y.shape
+    Y = Y.reshape(rows,-1) # one column per household and slot
+    G = Xs.T@Xs
+    G[arange(len(G)),arange(len(G))] += _penalty(X.shape[1],alpha)
+    factor = cho_factor(G) # one factorization for all the households of the group
+    B = cho_solve(factor,Xs.T@Y) # all the households and slots in one multi right-hand side solve
+    mean, std = tile(mean,(n_households,1)), tile(std,(n_households,1))
+    if level is not None: # the level is the only feature that differs between households => bordered system, solved with the same factorization
+        level_mean, level_std = level.mean(axis=1), level.std(axis=1)
+        level_std[level_std==0] = 1
+        L = (level-level_mean[:,None])/level_std[:,None] # (households, rows)
+        b = Xs.T@L.T
+        u = cho_solve(factor,b)
+        schur = (L**2).sum(axis=1)+alpha-(b*u).sum(axis=0)
+        LY = (Y.reshape(rows,n_households,n_slots)*L.T[:,:,None]).sum(axis=0)
+        beta = (LY-(b[:,:,None]*B.reshape(-1,n_households,n_slots)).sum(axis=0))/schur[:,None] # coefficients of the level
+        B = (B.reshape(-1,n_households,n_slots)-u[:,:,None]*beta[None]).reshape(len(G),-1)
+        residuals = Y-Xs@B-(L.T[:,:,None]*beta[None]).reshape(rows,-1)
+        B = concatenate((B,beta.reshape(1,-1)))
+        mean, std = column_stack((mean,level_mean)), column_stack((std,level_std))
+    else:
+        residuals = Y-Xs@B
+    intervals = quantile(residuals.T,quantiles,axis=1).reshape(len(quantiles),n_households,n_slots) # along the rows of each column
+    return B.reshape(-1,n_households,n_slots).transpose(1,0,2), mean, std, intervals.transpose(1,0,2), nanmin(Y.reshape(rows,n_households,n_slots),axis=(0,2))
+
+@timed()
+def fit_fleet(cube,dates,households=None,seasons=None,site=None,holidays=None,lag=7,window=7,alpha=1.,quantiles=(0.05,0.95),chunk_size=256):
+
+    """Train the forecast models of many households at once (e.g. a LoadCurveStore) => the same models as fit, household by household
+
+    The calendar features are built once for the whole fleet. The households are read by chunks, and the households of a chunk
+    that have the same training days (complete days with a level) share one factorization and one multi right-hand side solve.
+
+    - **Input**:
+        - :cube: (households, days, 96) array or memmap, e.g. store.days()
+        - :dates: the dates of the days of the cube (consecutive days)
+        - :households: the IDs of the households => 0, 1, 2... if None
+        - :seasons, site, holidays, lag, window, alpha, quantiles: cf: fit
+        - :chunk_size: number of households in memory at once
+
+    - **Output**:
+        - :fleet: Fleet (cf: fleet_model for the Model of one household)"""
+
+    n_households, n_days, n_slots = cube.shape
+    X, names = calendar_features(dates,seasons,site,holidays) # the same for every household
+    names = names+(['level'] if lag is not None else [])
+    coefficients = full((n_households,len(names)+1,n_slots),nan)
+    mean, std = full((n_households,len(names)),nan), full((n_households,len(names)),nan)
+    intervals, floor = full((n_households,len(quantiles),n_slots),nan), full(n_households,nan)
+    for start in range(0,n_households,chunk_size):
+        Y = asarray(cube[start:start+chunk_size],dtype=float) # one chunk in memory
+        level = None if lag is None else recent_level(Y,lag,window)
+        keep = ~isnan(Y).any(axis=2) & isfinite(X).all(axis=1)
+        if level is not None:
+            keep &= isfinite(level)
+        masks, group = unique(keep,axis=0,return_inverse=True) # households with the same training days
+        for n, rows in enumerate(masks):
+            if rows.sum()<2: # not enough complete days => no model
+                continue
+            members = (group.reshape(-1)==n).nonzero()[0]
+            result = _fit_group(X[rows],ascontiguousarray(Y[members][:,rows].transpose(1,0,2)),None if level is None else level[members][:,rows],alpha,quantiles)
+            index = start+members
+            coefficients[index], mean[index], std[index], intervals[index], floor[index] = result
+    settings = {'seasons':seasons, 'site':site, 'holidays':holidays, 'lag':lag, 'window':window}
+    households = list(range(n_households)) if households is None else list(households)
+    return Fleet(households,coefficients,names,mean,std,alpha,tuple(quantiles),intervals,floor,settings)
+
+def fleet_model(fleet,household):
+
+    """Model of one household of a Fleet (cf: forecast)"""
+
+    n = fleet.households.index(household)
+    return Model(fleet.coefficients[n],fleet.names,fleet.mean[n],fleet.std[n],fleet.alpha,fleet.quantiles,fleet.intervals[n],float(fleet.floor[n]),fleet.settings)
+
+@timed()
+def forecast_fleet(fleet,cube,first_date,days=7,chunk_size=256):
+
+    """Forecast of the days that follow the measurements, for all the households of a Fleet
+
+    - **Input**:
+        - :fleet: the Fleet
+        - :cube: (households, days, 96) measured load curves, up to the day before the forecast (only the last days are read)
+        - :first_date: date of the first day of the cube
+        - :days: number of days of the forecast => at most the lag of the models
+
+    - **Output**:
+        - :forecast: dictionnary with 'dates', 'timestamps' and (households, days, 96) 'mean', 'low', 'high' (cf: forecast)"""
+
+    settings = fleet.settings
+    lag = settings['lag']
+    if lag is not None and days>lag:
+        raise ValueError('the forecast cannot go beyond the lag of the models ('+str(lag)+' days)')
+    n_households, n_days, n_slots = cube.shape
+    dates = datetime64(first_date,'D')+n_days+arange(days)
+    X = calendar_features(dates,settings['seasons'],settings['site'],settings['holidays'])[0] # the same for every household
+    mean = full((n_households,days,n_slots),nan)
+    for start in range(0,n_households,chunk_size):
+        index = arange(start,min(start+chunk_size,n_households))
+        features = tile(X,(len(index),1,1))
+        if lag is not None:
+            recent = asarray(cube[start:start+chunk_size,max(0,n_days-lag-settings['window']):],dtype=float) # the days of the level windows
+            level = recent_level(concatenate((recent,full((len(index),days,n_slots),nan)),axis=1),lag,settings['window'])[:,-days:]
+            level = where(isnan(level),fleet.mean[index,-1:],level) # unknown level => average level of the training days
+            features = concatenate((features,level[:,:,None]),axis=2)
+        Xs = (features-fleet.mean[index,None,:])/fleet.std[index,None,:]
+        mean[index] = fleet.coefficients[index,None,0,:]+einsum('mdp,mps->mds',Xs,fleet.coefficients[index,1:])
+    floor = fleet.floor[:,None,None]
+    mean = maximum(mean,floor)
+    low, high = [maximum(mean+fleet.intervals[:,None,n],floor) for n in (0,-1)]
+    timestamps = (datetime64(dates[0],'m')+timedelta64(timeratio,'m'))+arange(days*n_slots)*timedelta64(timeratio,'m')
+    return {'dates':dates, 'timestamps':timestamps, 'mean':mean, 'low':low, 'high':high}
+
+
+if __name__ == "__main__":
+
+    import sys
+    from os import path
+    from time import perf_counter
+    from pandas import DataFrame
+    from ingestion import load_columns
+    from regularize import regularize, day_grid
+    from baseline import same_weekday_baseline
+
+    filename = sys.argv[1] if len(sys.argv)>1 else 'MD_T1_MFH1.xlsx' # python forecast.py <smart-meter file> [number of days]
+    days = int(sys.argv[2]) if len(sys.argv)>2 else 7
+    site = (47.0982,7.4405,'Europe/Zurich') # St-Imier, like visualize_energy.py
+    meter = load_columns(filename,'Results/cache','household')
+    grid = day_grid(regularize(meter.timestamps,meter.values,site[2],timeratio),site[2],timeratio) # local days of 96 slots, whatever the DST changes => cf: regularize
+    loadcurve = grid.values*4*1000 # in Watt [W]
+    loadcurve[((loadcurve==0)|isnan(loadcurve)).all(axis=1)] = nan # days at 0 all day long => the meter did not measure
+    first_date, dates = grid.dates[0], grid.dates
+
+    end = int((~isnan(loadcurve).any(axis=1)).nonzero()[0][-1])+1 # after the last measured day
+    test = loadcurve[end-days:end] # the last measured days are left out to check the forecast against the naive "same weekday" forecast
+    start = perf_counter()
+    model = fit(loadcurve[:end-days],dates[:end-days],site=site)
+    result = forecast(model,loadcurve[:end-days],first_date,days)
+    print('training and forecast: %.3f s' % (perf_counter()-start))
+    naive = same_weekday_baseline(loadcurve[:end-days],4)[-7:][arange(days)%7] # average of the same weekday over the 4 previous weeks
+    inside = ((test>=result['low'])&(test<=result['high']))[~isnan(test)].mean()
+    print('%s to %s - mean absolute error: forecast %.1f W, same weekday average %.1f W - %.0f%% of the values in the %g-%g interval'
+          % (dates[end-days],dates[end-1],abs(result['mean']-test)[~isnan(test)].mean(),abs(naive-test)[~isnan(test)].mean(),100*inside,model.quantiles[0],model.quantiles[-1]))
+
+    model = fit(loadcurve,dates,site=site)
+    result = forecast(model,loadcurve,first_date,days)
+    output = path.join('Results','forecast_'+path.splitext(path.basename(filename))[0]+'.csv')
+    DataFrame({'DateTime':result['timestamps'].astype('datetime64[s]'), 'forecast':result['mean'].reshape(-1), 'low':result['low'].reshape(-1),
+               'high':result['high'].reshape(-1)}).to_csv(output,index=False,float_format='%g')
+    print('forecast of',result['dates'][0],'to',result['dates'][-1],'written in',output)
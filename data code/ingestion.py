@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+DATA INGESTION - TYPED COLUMNAR CACHE
+###########################################
+###########################################
+
+This module converts the measurement sources (smart-meter Excel file, canton consumption CSV files, solar forecast CSV file) into typed columns:
+    - timestamps: datetime64[m] array, time at the END of each 15 minutes interval (00:15 is the first timepoint of a day)
+    - values: float32 array, one column per channel
+
+The columns are stored once as .npy files in a cache folder, and memory-mapped by the next runs instead of parsing the sources again.
+"""
+
+import json # import module to read/write the metadata of the cache
+from os import path, makedirs # import module to deal with file paths
+from collections import namedtuple # import module to create simple record types
+from numpy import array, asarray, load, save, timedelta64, full, nan # import module to work with arrays / matrices
+from pandas import read_csv, read_excel, to_datetime, to_timedelta # import module to load excel/csv data
+from instrumentation import timed, count # import module to time the loading and count the parsed rows
+
+Columns = namedtuple('Columns',['timestamps','values','channels']) # typed columns of a source => timestamps (datetime64[m]), values (float32, one column per channel), channel names
+
+timeratio = 15 # number of minutes that separate 2 observed timepoints
+
+##############################################
+##############################################
+##          READERS OF THE SOURCES          ##
+##############################################
+##############################################
+
+def read_household(filename):
+
+    """Read the smart-meter Excel file of a household (e.g. MD_T1_MFH1.xlsx): columns Datum, Zeit, Wirkleistung [kW] of the first block (Summe)
+
+    - **Input**:
+        - :filename: the Excel file
+
+    - **Output**:
+        - :columns: Columns with the timestamps and the Wirkleistung"""
+
+    data = read_excel(filename,header=1,usecols=[0,1,2]) # the first line is the block title, the second one the column names
+    data = data.dropna() # empty rows at the end of the sheet
+    timestamps = to_datetime(data.iloc[:,0]) + to_timedelta(data.iloc[:,1].astype(str)) # Datum + Zeit, in one vectorized operation
+    values = data.iloc[:,2].values.astype('float32') # Wirkleistung
+    return Columns(timestamps.values.astype('datetime64[m]'),values,['Wirkleistung'])
+
+def read_canton(filename):
+
+    """Read a semicolon separated canton consumption file (e.g. Canton_Argau_Consumption_2018.csv) with M/D/YYYY H:MM timestamps
+
+    - **Input**:
+        - :filename: the CSV file
+
+    - **Output**:
+        - :columns: Columns with the timestamps and the consumption [kWh]"""
+
+    data = read_csv(filename,sep=';') # load csv file
+    timestamps = to_datetime(data.iloc[:,0],format='%m/%d/%Y %H:%M') # Zeitstempel
+    values = data.iloc[:,1].values.astype('float32') # Verbrauch Kanton AG (kWh)
+    return Columns(timestamps.values.astype('datetime64[m]'),values,['Verbrauch'])
+
+def read_solar(filename):
+
+    """Read the solar energy forecast file (e.g. Solarenergie-6.csv): Datum (DD.MM.YYYY), von, bis, and one column per TSO in MW with decimal commas
+
+    - **Input**:
+        - :filename: the CSV file
+
+    - **Output**:
+        - :columns: Columns with the timestamps (end of each interval) and the 4 TSO columns"""
+
+    data = read_csv(filename,decimal=',') # load csv file
+    timestamps = to_datetime(data['Datum']+' '+data['von'],format='%d.%m.%Y %H:%M') + to_timedelta(timeratio,unit='m') # start of the interval + 15 minutes => end of the interval, like the other sources
+    channels = list(data.columns[3:]) # 50Hertz (MW), Amprion (MW), TenneT TSO (MW), Transnet BW (MW)
+    values = data[channels].values.astype('float32')
+    return Columns(timestamps.values.astype('datetime64[m]'),values,channels)
+
+READERS = {'household':read_household, 'canton':read_canton, 'solar':read_solar}
+
+def guess_kind(filename):
+
+    """Guess the kind of a source from its file name
+
+    - **Input**:
+        - :filename: the source file
+
+    - **Output**:
+        - :kind: 'household', 'canton' or 'solar'"""
+
+    name = path.basename(filename).lower()
+    if name.endswith('.xlsx') or name.endswith('.xls'):
+        return 'household'
+    elif 'canton' in name:
+        return 'canton'
+    elif 'solar' in name:
+        return 'solar'
+    raise ValueError('unknown kind of source: '+filename)
+
+##############################################
+##############################################
+##              COLUMNAR CACHE              ##
+##############################################
+##############################################
+
+def cache_folder(filename,cache):
+
+    """Folder of the cache of a source"""
+
+    return path.join(cache,path.splitext(path.basename(filename))[0])
+
+def write_cache(filename,columns,cache):
+
+    """Store the columns of a source in the cache folder
+
+    - **Input**:
+        - :filename: the source file
+        - :columns: the Columns read from the source
+        - :cache: the cache folder"""
+
+    folder = cache_folder(filename,cache)
+    if not path.isdir(folder):
+        makedirs(folder)
+    save(path.join(folder,'timestamps.npy'),asarray(columns.timestamps,dtype='datetime64[m]'))
+    save(path.join(folder,'values.npy'),asarray(columns.values,dtype='float32'))
+    with open(path.join(folder,'meta.json'),'w') as meta:
+        json.dump({'source':path.abspath(filename),'mtime':path.getmtime(filename),'channels':list(columns.channels)},meta)
+
+def read_cache(filename,cache,mmap=True):
+
+    """Read the columns of a source from the cache folder => None if there is no cache or if the source changed since
+
+    - **Input**:
+        - :filename: the source file
+        - :cache: the cache folder
+        - :mmap: if True, the columns are memory-mapped instead of read
+
+    - **Output**:
+        - :columns: the Columns or None"""
+
+    folder = cache_folder(filename,cache)
+    try:
+        with open(path.join(folder,'meta.json')) as meta:
+            meta = json.load(meta)
+    except (IOError, ValueError): # no (valid) cache
+        return None
+    if meta['mtime'] != path.getmtime(filename): # the source changed => the cache is outdated
+        return None
+    mode = 'r' if mmap else None
+    return Columns(load(path.join(folder,'timestamps.npy'),mmap_mode=mode),load(path.join(folder,'values.npy'),mmap_mode=mode),meta['channels'])
+
+@timed()
+def load_columns(filename,cache='cache',kind=None,mmap=True):
+
+    """Load a source as typed columns: from the cache if it is up to date, otherwise from the source (the cache is then written)
+
+    - **Input**:
+        - :filename: the source file
+        - :cache: the cache folder
+        - :kind: 'household', 'canton' or 'solar' => guessed from the file name if None
+        - :mmap: if True, the cached columns are memory-mapped
+
+    - **Output**:
+        - :columns: the Columns of the source"""
+
+    columns = read_cache(filename,cache,mmap)
+    if columns is None: # first run, or the source changed
+        columns = READERS[kind or guess_kind(filename)](filename) # parse the source
+        count('rows parsed',len(columns.timestamps))
+        write_cache(filename,columns,cache) # the next runs will use the cache
+        columns = read_cache(filename,cache,mmap)
+    else:
+        count('cache hits')
+    return columns
+
+def days_of(timestamps):
+
+    """Day of each timepoint => the timepoints are the end of their interval, so 00:00 belongs to the previous day
+
+    - **Input**:
+        - :timestamps: datetime64 array
+
+    - **Output**:
+        - :days: datetime64[D] array"""
+
+    return (asarray(timestamps,dtype='datetime64[m]') - timedelta64(timeratio,'m')).astype('datetime64[D]')
+
+def day_slot_matrix(timestamps,values,dates,n_slots=96):
+
+    """Put a series on a (days, slots) grid, e.g. the canton consumption or the solar forecast on the days of a household
+
+    - **Input**:
+        - :timestamps: datetime64 array, end of each interval
+        - :values: array of the values, (timepoints,) or (timepoints, channels) => the channels are summed
+        - :dates: dates of the rows of the grid (consecutive days)
+        - :n_slots: number of slots per day
+
+    - **Output**:
+        - :matrix: (days, slots) float array, NaN where the series has no value"""
+
+    dates = asarray(dates,dtype='datetime64[D]')
+    values = asarray(values,dtype=float)
+    if values.ndim==2:
+        values = values.sum(axis=1)
+    minutes = 24*60//n_slots # minutes per slot
+    begin = asarray(timestamps,dtype='datetime64[m]') - timedelta64(minutes,'m') # start of each interval
+    row = (begin.astype('datetime64[D]')-dates[0]).astype(int) # position of the day in the grid
+    slot = (begin-begin.astype('datetime64[D]')).astype(int)//minutes # position of the interval in the day
+    keep = (row>=0) & (row<len(dates))
+    matrix = full((len(dates),n_slots),nan)
+    matrix[row[keep],slot[keep]] = values[keep] # a duplicated timepoint keeps its last value
+    return matrix
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    for filename in sys.argv[1:]: # python ingestion.py file1 file2 ... => fills the cache folder
+        columns = load_columns(filename)
+        print(filename,':',len(columns.timestamps),'timepoints from',columns.timestamps[0],'to',columns.timestamps[-1],'-',columns.channels)
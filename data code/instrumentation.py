@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+INSTRUMENTATION - STAGE TIMING AND COUNTERS
+###########################################
+###########################################
+
+This module tells where the time of a run goes (parsing, averaging, sun computation, rendering...):
+    - span(name): context manager timing a stage => number of calls, total and longest time; the spans opened inside
+      another one are named after it ('rendering/render_report_incremental')
+    - timed(name): the same as a decorator of a function
+    - count(name,n): counters such as the rows parsed or the pages rendered
+    - configure(profile,memory): the stages whose spans are also profiled with cProfile (top functions by cumulative time)
+      and/or traced with tracemalloc (peak of the memory allocated during the span)
+    - write_report(folder): the spans, counters and profiles of the run as JSON, next to the other results
+
+The state is global to the process: the spans run by the processes of a pool (e.g. the PDF rendering) are not seen, only the
+span around the pool. A span costs about a microsecond, so the hot functions can stay instrumented.
+"""
+
+import io # import module to capture the profile statistics as text
+import json # import module to write the run report
+import cProfile # import module to profile a stage
+import pstats # import module to sort the profile statistics
+import tracemalloc # import module to measure the memory allocated by a stage
+from os import path, makedirs, getpid # import module to deal with files
+from time import perf_counter # import module to measure time
+from datetime import datetime # import module to date the run report
+from functools import wraps # import module to keep the name of the decorated functions
+from contextlib import contextmanager # import module to write the spans as context managers
+
+spans = {} # name => {'calls', 'total', 'max'} (and 'memory_peak') in seconds and bytes
+counters = {} # name => value
+profiles = {} # name => text of the top functions of the last profiled span
+_settings = {'enabled':True, 'profile':set(), 'memory':set(), 'top':20}
+_stack = [] # names of the open spans
+_started = {'time':perf_counter(), 'date':datetime.now()}
+_profiling = [] # the cProfile of the outermost profiled span => one profiler at a time
+_peaks = [] # peak memory seen so far by each open traced span => kept across the peak resets of the spans traced inside it
+
+def configure(enabled=True,profile=(),memory=(),top=20):
+
+    """Settings of the instrumentation
+
+    - **Input**:
+        - :enabled: if False, the spans and counters do nothing
+        - :profile: names of the stages profiled with cProfile (True for all) => name of the span, without its parents
+        - :memory: names of the stages traced with tracemalloc (True for all)
+        - :top: number of functions kept in each profile"""
+
+    _settings.update(enabled=enabled,profile=profile if profile is True else set(profile),memory=memory if memory is True else set(memory),top=top)
+
+def reset():
+
+    """Forget the spans, counters and profiles => start of a new run"""
+
+    spans.clear()
+    counters.clear()
+    profiles.clear()
+    _started.update(time=perf_counter(),date=datetime.now())
+
+def _selected(setting,name):
+    return setting is True or name in setting
+
+@contextmanager
+def span(name):
+
+    """Time a stage: with span('ephemeris'): ...
+
+    - **Input**:
+        - :name: name of the stage => the names of the open spans are prepended ('report/rendering')"""
+
+    if not _settings['enabled']:
+        yield
+        return
+    _stack.append(name)
+    key = '/'.join(_stack)
+    profiler = cProfile.Profile() if _selected(_settings['profile'],name) and not _profiling else None
+    memory = _selected(_settings['memory'],name)
+    if memory:
+        owner = not tracemalloc.is_tracing() # the outermost traced span starts and stops tracemalloc
+        if owner:
+            tracemalloc.start()
+        else:
+            if _peaks: # the outer traced span keeps its peak before it is reset
+                _peaks[-1] = max(_peaks[-1],tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        _peaks.append(0)
+    if profiler is not None:
+        _profiling.append(profiler)
+        profiler.enable()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter()-start
+        if profiler is not None:
+            profiler.disable()
+            _profiling.pop()
+            text = io.StringIO()
+            pstats.Stats(profiler,stream=text).sort_stats('cumulative').print_stats(_settings['top'])
+            profiles[key] = text.getvalue()
+        record = spans.setdefault(key,{'calls':0, 'total':0., 'max':0.})
+        record['calls'] += 1
+        record['total'] += elapsed
+        record['max'] = max(record['max'],elapsed)
+        if memory:
+            peak = max(_peaks.pop(),tracemalloc.get_traced_memory()[1])
+            record['memory_peak'] = max(record.get('memory_peak',0),peak-before)
+            if _peaks: # the peak of the inner span is also a peak of the outer one
+                _peaks[-1] = max(_peaks[-1],peak)
+            if owner:
+                tracemalloc.stop()
+        _stack.pop()
+
+def timed(name=None):
+
+    """Decorator timing each call of a function in a span => named after the function if name is None"""
+
+    def decorate(function):
+        label = name or function.__name__
+        @wraps(function)
+        def wrapper(*args,**kwargs):
+            with span(label):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorate
+
+def count(name,n=1):
+
+    """Add n to a counter, e.g. count('rows parsed',len(columns.timestamps))"""
+
+    if _settings['enabled']:
+        counters[name] = counters.get(name,0)+n
+
+def report(**meta):
+
+    """Run report: the spans, counters and profiles since the start (or the last reset), and any metadata given
+
+    - **Output**:
+        - :report: dictionnary ready to be written as JSON"""
+
+    return {'date':_started['date'].isoformat(timespec='seconds'), 'elapsed':perf_counter()-_started['time'], 'pid':getpid(), 'meta':meta,
+            'spans':{key:dict(record) for key, record in spans.items()}, 'counters':dict(counters), 'profiles':dict(profiles)}
+
+def write_report(folder='Results',name=None,**meta):
+
+    """Write the run report as JSON
+
+    - **Input**:
+        - :folder: the folder of the results
+        - :name: the file name => run_<date of the run>.json if None
+        - :meta: metadata added to the report (e.g. the household, the number of days)
+
+    - **Output**:
+        - :filename: the written file"""
+
+    if not path.isdir(folder):
+        makedirs(folder)
+    filename = path.join(folder,name or 'run_'+_started['date'].strftime('%Y-%m-%d_%H-%M-%S')+'.json')
+    with open(filename,'w') as out:
+        json.dump(report(**meta),out,indent=1,default=str)
+    return filename
+
+def summary():
+
+    """Text table of the spans (longest total first) and counters"""
+
+    lines = ['%-50s %6s %10s %10s' % ('span','calls','total [s]','max [s]')]
+    for key, record in sorted(spans.items(),key=lambda item: -item[1]['total']):
+        lines.append('%-50s %6d %10.3f %10.3f' % (key,record['calls'],record['total'],record['max']))
+    for key, value in sorted(counters.items()):
+        lines.append('%-50s %6s' % (key,value))
+    return '\n'.join(lines)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+LOAD CURVE STORE - HOUSEHOLD x DAY x SLOT
+###########################################
+###########################################
+
+This module stores the daily load curves of many households (apartment blocks) in one float32 cube of shape (households, days, slots),
+backed by numpy.memmap so that analyses can slice days or households without loading the whole fleet in memory.
+
+A store folder contains:
+    - cube.dat: the raw float32 cube (C order), NaN where a household has no data
+    - index.json: the calendar of the cube (first date, number of days, slots per day) and, for each household, its ID, first and last dates with data
+"""
+
+import json # import module to read/write the index of the store
+from os import path, makedirs # import module to deal with file paths
+from numpy import memmap, full, asarray, arange, datetime64, float32, nan # import module to work with arrays / matrices
+
+class LoadCurveStore(object):
+
+    """Store of (household, day, slot) float32 load curves backed by numpy.memmap
+
+    - **Input**:
+        - :folder: the folder of the store (created with LoadCurveStore.create)
+        - :mode: 'r' to read only, 'r+' to add or modify households"""
+
+    def __init__(self,folder,mode='r'):
+        self.folder = folder
+        self.mode = mode
+        with open(path.join(folder,'index.json')) as index:
+            self.index = json.load(index) # calendar and households of the store
+        self.rows = dict((entry['id'],n) for n, entry in enumerate(self.index['households'])) # household ID => position in the cube
+        self.first_date = datetime64(self.index['first_date'],'D') # date of the first day of the cube
+        self.n_days = self.index['n_days'] # number of days of the cube
+        self.n_slots = self.index['n_slots'] # number of time slots per day
+        self.cube = self._map() # the memory-mapped cube
+
+    @classmethod
+    def create(cls,folder,first_date,n_days,n_slots=96):
+
+        """Create an empty store
+
+        - **Input**:
+            - :folder: the folder of the store
+            - :first_date: date of the first day of the calendar (datetime.date, string or datetime64)
+            - :n_days: number of days of the calendar
+            - :n_slots: number of time slots per day
+
+        - **Output**:
+            - :store: the store, opened in 'r+' mode"""
+
+        if not path.isdir(folder):
+            makedirs(folder)
+        open(path.join(folder,'cube.dat'),'wb').close() # no household yet
+        index = {'first_date':str(datetime64(first_date,'D')), 'n_days':int(n_days), 'n_slots':int(n_slots), 'households':[]}
+        with open(path.join(folder,'index.json'),'w') as out:
+            json.dump(index,out,indent=1)
+        return cls(folder,'r+')
+
+    @classmethod
+    def open(cls,folder,first_date,n_days,n_slots=96,mode='r+'):
+
+        """Open a store, or create it if it does not exist yet (same inputs as create)"""
+
+        if path.exists(path.join(folder,'index.json')):
+            return cls(folder,mode)
+        return cls.create(folder,first_date,n_days,n_slots)
+
+    def _map(self):
+        if len(self.index['households'])==0: # an empty file cannot be mapped
+            return None
+        return memmap(path.join(self.folder,'cube.dat'),dtype=float32,mode=self.mode,shape=(len(self.index['households']),self.n_days,self.n_slots))
+
+    def _append(self,household):
+        if household not in self: # new household => the cube grows by one household of NaN
+            with open(path.join(self.folder,'cube.dat'),'ab') as cube:
+                full((self.n_days,self.n_slots),nan,dtype=float32).tofile(cube)
+            self.rows[household] = len(self.index['households'])
+            self.index['households'].append({'id':household})
+            self.cube = self._map()
+
+    def _write_index(self):
+        with open(path.join(self.folder,'index.json'),'w') as out:
+            json.dump(self.index,out,indent=1)
+
+    def __len__(self):
+        return len(self.index['households'])
+
+    def __contains__(self,household):
+        return household in self.rows
+
+    @property
+    def households(self):
+        """IDs of the households, in the order of the cube"""
+        return [entry['id'] for entry in self.index['households']]
+
+    def position(self,household):
+        """Position of a household in the cube"""
+        if household not in self.rows:
+            raise ValueError(str(household)+' is not in the store')
+        return self.rows[household]
+
+    def day_index(self,day):
+        """Position of a date in the calendar of the cube"""
+        return int((datetime64(day,'D')-self.first_date).astype(int))
+
+    def dates(self):
+        """Dates of the calendar of the cube (datetime64[D] array)"""
+        return self.first_date + arange(self.n_days)
+
+    def put(self,household,loadcurve,first_date):
+
+        """Add a household to the store, or replace its load curves
+
+        - **Input**:
+            - :household: the ID of the household
+            - :loadcurve: (days, slots) array of the household load curves
+            - :first_date: date of the first row of loadcurve"""
+
+        loadcurve = asarray(loadcurve,dtype=float32)
+        start = self.day_index(first_date) # position of the first row in the calendar
+        end = start+len(loadcurve)
+        if start<0 or end>self.n_days or loadcurve.shape[1]!=self.n_slots:
+            raise ValueError('the load curves of '+str(household)+' do not fit in the calendar of the store')
+
+        self._append(household)
+        n = self.position(household)
+        self.cube[n] = nan
+        self.cube[n,start:end] = loadcurve
+        self.cube.flush()
+        self.index['households'][n].update({'first_date':str(datetime64(first_date,'D')),'last_date':str(self.first_date+end-1)})
+        self._write_index()
+
+    def put_value(self,household,day,slot,value):
+
+        """Write a single reading of a household (a new household is added first) => O(1), the index is only written by flush
+
+        - **Input**:
+            - :household: the ID of the household
+            - :day: the date of the reading
+            - :slot: the slot of the reading in the day
+            - :value: the value of the reading
+
+        - **Output**:
+            - :old: the previous value of this day and slot (NaN if there was none)"""
+
+        index = self.day_index(day)
+        if index<0 or index>=self.n_days:
+            raise ValueError(str(day)+' is not in the calendar of the store')
+        self._append(household)
+        n = self.position(household)
+        old = float(self.cube[n,index,slot])
+        self.cube[n,index,slot] = value
+        entry = self.index['households'][n]
+        day = str(datetime64(day,'D'))
+        if 'first_date' not in entry or day<entry['first_date']:
+            entry['first_date'] = day
+        if 'last_date' not in entry or day>entry['last_date']:
+            entry['last_date'] = day
+        return old
+
+    def flush(self):
+
+        """Write the changes of put_value (cube and index) to the disk"""
+
+        if self.cube is not None:
+            self.cube.flush()
+        self._write_index()
+
+    def household(self,household):
+
+        """Load curves of one household => (days, slots) memmap view, NaN for the days without data"""
+
+        return self.cube[self.position(household)]
+
+    def days(self,start=None,end=None,households=None):
+
+        """Load curves of all (or some) households between 2 dates => (households, days, slots) view, without reading the rest of the cube
+
+        - **Input**:
+            - :start: first date (included) => first date of the calendar if None
+            - :end: last date (not included) => end of the calendar if None
+            - :households: list of household IDs => all households if None
+
+        - **Output**:
+            - :cube: the selected part of the cube"""
+
+        first = 0 if start is None else self.day_index(start)
+        last = self.n_days if end is None else self.day_index(end)
+        if households is None:
+            return self.cube[:,first:last]
+        return self.cube[[self.position(household) for household in households],first:last]
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+RECOMMENDATION ENGINE - LIGHT-BULB STATES
+###########################################
+###########################################
+
+This module precomputes, for every 15 minutes slot of every day and household, the recommendation shown by the light bulbs of the
+front end (js/data.js, recommendation_for) together with the score behind it:
+    - reference: the canton consumption, scaled to the average consumption of the household (like normalize in js/data.js)
+    - baseline: the expected consumption of the household (same weekday average of the previous weeks, cf: baseline)
+    - solar: the solar energy forecast => the share of the daily maximum adds solar_weight to the score
+
+    score = (reference - baseline) + solar_weight * solar / max(solar of the day)
+
+    score > threshold => 'use' (light bulb on), score < -threshold => 'save' (light bulb off), otherwise 'ok' (half on)
+
+The codes are int8 (96 bytes per household and day) and the scores float32, stored as .npy files per household, so a client
+only fetches the few hundred bytes of the days it shows.
+"""
+
+import json # import module to read/write the metadata of the recommendations
+from os import path, makedirs # import module to deal with file paths
+from numpy import asarray, full, isnan, where, nan, errstate, int8, float32, datetime64, save, load # import module to work with arrays / matrices
+from baseline import same_weekday_baseline # import module to compute the expected consumption of the households
+
+USE, OK, SAVE, NO_DATA = 1, 0, -1, -128 # recommendation codes
+dico_code = {USE:'use', OK:'ok', SAVE:'save', NO_DATA:None} # for each code returns the name used by the front end
+
+threshold = 0.2 # threshold of the front end on reference - data, in the units of the household values (kWh per 15 minutes)
+solar_weight = 0.2 # score added at the solar maximum of the day
+
+##############################################
+##############################################
+##                 SCORES                   ##
+##############################################
+##############################################
+
+def scale_reference(reference,household):
+
+    """Scale the reference (e.g. canton consumption) to the average of the household, on the slots where both have values
+
+    - **Input**:
+        - :reference: (days, slots) array of the reference
+        - :household: (days, slots) array of the household
+
+    - **Output**:
+        - :reference: the scaled reference"""
+
+    reference = asarray(reference,dtype=float)
+    household = asarray(household,dtype=float)
+    both = ~isnan(reference) & ~isnan(household)
+    if not both.any(): # nothing in common => no scale
+        return full(reference.shape,nan)
+    return reference*household[both].mean()/reference[both].mean()
+
+def solar_share(solar):
+
+    """Share of the daily maximum of the solar forecast => (days, slots) array between 0 and 1, 0 where there is no forecast"""
+
+    solar = asarray(solar,dtype=float)
+    with errstate(invalid='ignore',divide='ignore'):
+        peak = where(isnan(solar),-1,solar).max(axis=1,keepdims=True) # -1 for the days without forecast
+        share = where(peak>0,solar/peak,0)
+    return where(isnan(share),0,share)
+
+def recommendation_scores(baseline,reference,solar=None,threshold=threshold,solar_weight=solar_weight):
+
+    """Recommendation codes and scores of (days, slots) matrices
+
+    - **Input**:
+        - :baseline: (days, slots) array of the expected consumption of the household
+        - :reference: (days, slots) array of the reference, already scaled to the household (cf: scale_reference)
+        - :solar: (days, slots) array of the solar forecast, or None
+        - :threshold: score above which the recommendation is 'use' (below -threshold 'save')
+        - :solar_weight: score added at the solar maximum of each day
+
+    - **Output**:
+        - :codes: (days, slots) int8 array of USE, OK, SAVE or NO_DATA
+        - :scores: (days, slots) float32 array, NaN where there is no data"""
+
+    scores = asarray(reference,dtype=float)-asarray(baseline,dtype=float)
+    if solar is not None:
+        scores = scores+solar_weight*solar_share(solar)
+    codes = where(scores>threshold,USE,where(scores<-threshold,SAVE,OK))
+    codes = where(isnan(scores),NO_DATA,codes)
+    return codes.astype(int8), scores.astype(float32)
+
+def recommend_household(household,reference,solar=None,weeks=4,threshold=threshold,solar_weight=solar_weight):
+
+    """Recommendations of one household from its load curves
+
+    - **Input**:
+        - :household: (days, slots) array of the household load curves
+        - :reference: (days, slots) array of the reference on the same days, not scaled
+        - :solar: (days, slots) array of the solar forecast on the same days, or None
+        - :weeks: number of weeks of the baseline (cf: baseline, same_weekday_baseline)
+        - :threshold, solar_weight: cf: recommendation_scores
+
+    - **Output**:
+        - :codes, scores: cf: recommendation_scores"""
+
+    expected = same_weekday_baseline(household,weeks=weeks)
+    return recommendation_scores(expected,scale_reference(reference,household),solar,threshold,solar_weight)
+
+def recommend_store(store,reference,solar=None,**kwargs):
+
+    """Recommendations of all the households of a LoadCurveStore (cf: loadcurve_store)
+
+    - **Input**:
+        - :store: the LoadCurveStore
+        - :reference: (days, slots) array of the reference on the days of the store
+        - :solar: (days, slots) array of the solar forecast on the days of the store, or None
+        - :kwargs: cf: recommend_household
+
+    - **Output**:
+        - :recommendations: dictionnary of (codes, scores) per household ID"""
+
+    return dict((household,recommend_household(store.household(household),reference,solar,**kwargs)) for household in store.households)
+
+##############################################
+##############################################
+##                 STORAGE                  ##
+##############################################
+##############################################
+
+def write_recommendations(folder,household,first_date,codes,scores,**meta):
+
+    """Store the recommendations of a household: codes.npy (int8), scores.npy (float32) and meta.json in folder/household
+
+    - **Input**:
+        - :folder: the folder of the recommendations
+        - :household: the ID of the household
+        - :first_date: date of the first row of codes and scores
+        - :codes, scores: cf: recommendation_scores
+        - :meta: other values kept in meta.json (e.g. threshold, solar_weight)"""
+
+    folder = path.join(folder,str(household))
+    if not path.isdir(folder):
+        makedirs(folder)
+    save(path.join(folder,'codes.npy'),asarray(codes,dtype=int8))
+    save(path.join(folder,'scores.npy'),asarray(scores,dtype=float32))
+    meta.update({'first_date':str(datetime64(first_date,'D')), 'n_days':len(codes), 'n_slots':asarray(codes).shape[1]})
+    with open(path.join(folder,'meta.json'),'w') as out:
+        json.dump(meta,out)
+
+def read_recommendations(folder,household,mmap=True):
+
+    """Read the recommendations of a household
+
+    - **Input**:
+        - :folder: the folder of the recommendations
+        - :household: the ID of the household
+        - :mmap: if True, the arrays are memory-mapped instead of read
+
+    - **Output**:
+        - :codes, scores: (days, slots) arrays
+        - :meta: the metadata (first_date, n_days, n_slots...)"""
+
+    folder = path.join(folder,str(household))
+    with open(path.join(folder,'meta.json')) as meta:
+        meta = json.load(meta)
+    mode = 'r' if mmap else None
+    return load(path.join(folder,'codes.npy'),mmap_mode=mode), load(path.join(folder,'scores.npy'),mmap_mode=mode), meta
+
+def day_recommendations(folder,household,day):
+
+    """Codes and scores of one household and day (96 + 384 bytes) => None, None if the day is not stored"""
+
+    codes, scores, meta = read_recommendations(folder,household)
+    index = int((datetime64(day,'D')-datetime64(meta['first_date'],'D')).astype(int))
+    if index<0 or index>=meta['n_days']:
+        return None, None
+    return asarray(codes[index]), asarray(scores[index])
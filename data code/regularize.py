@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+REGULARIZATION OF METER SERIES - UTC SLOTS
+###########################################
+###########################################
+
+The meter files are labelled with the local wall-clock time at the END of each 15 minutes interval, so a day does not always
+have 96 readings: the day of the spring DST change has 92, the day of the autumn change 100 (the repeated hour), and a missing
+or duplicated reading shifts every later reading if the series is cut in rows of 96 (zip(*[iter(...)]*Ntmp), reshape(-1,96)).
+
+This module regularizes a series in 3 vectorized steps, linear in the number of readings:
+    - to_utc: local labels => UTC. On the days of the autumn change, the readings before the backward jump of the labels are
+      in summer time and the following ones in winter time, whatever the labelling of the repeated hour (02:00-02:45 twice for
+      the smart-meter files, 02:00-03:00 then 02:15-03:00 for the canton files)
+    - regularize: UTC => one slot per 15 minutes from the first to the last reading. The duplicates are combined (first, last,
+      mean, sum), the gaps filled or not (nan, zero, previous, linear, weekly) and a validity mask tells which slots were measured.
+      The report gives the duplicates, gaps, misaligned and unsorted readings
+    - day_grid: UTC slots => (days, 96) local day grid of the other modules (92/100 slot days have 4 empty/merged slots)
+"""
+
+from collections import namedtuple # import module to create simple record types
+from numpy import asarray, arange, zeros, ones, full, bincount, isnan, where, nan, errstate, flatnonzero, diff, concatenate, maximum, interp, unique, datetime64, timedelta64, int64 # import module to work with arrays / matrices
+from pandas import DatetimeIndex, Timedelta # import module to convert between local and UTC times
+from instrumentation import timed, count # import module to time the regularization and count the anomalies
+
+timeratio = 15 # number of minutes that separate 2 observed timepoints
+zone = 'Europe/Zurich' # time zone of the meter labels
+DUPLICATES = ('first','last','mean','sum')
+FILLS = ('nan','zero','previous','linear','weekly')
+
+Regular = namedtuple('Regular',['start','values','valid','report']) # cf: regularize
+# start: UTC start of the first slot (datetime64[m])
+# values: (slots,) or (slots, channels) array of the regular series
+# valid: boolean array of the same shape => True where the value was measured (not filled, not NaN)
+# report: dictionnary of the anomalies of the series
+Grid = namedtuple('Grid',['dates','values','valid','slots']) # cf: day_grid
+# dates: local dates of the rows (datetime64[D], consecutive days)
+# values, valid: (days, 96) (or (days, 96, channels)) arrays
+# slots: number of UTC slots of each local day => 92 and 100 on the days of the DST changes
+
+##############################################
+##############################################
+##              LOCAL <=> UTC               ##
+##############################################
+##############################################
+
+def _fixed(zone):
+    return zone is None or isinstance(zone,(int,float))
+
+def _midnight_offsets(days,zone):
+    index = DatetimeIndex(asarray(days,dtype='datetime64[ns]'))
+    return asarray(index-index.tz_localize(zone).tz_convert(None),dtype='timedelta64[m]') # UTC offset at the start of each day
+
+def to_utc(timestamps,zone=zone,step=timeratio):
+
+    """UTC time of local wall-clock labels (end of each interval)
+
+    - **Input**:
+        - :timestamps: datetime64 array of the local labels, in the order of the file
+        - :zone: time zone name (e.g. 'Europe/Zurich'), or a fixed UTC offset in hours (e.g. 1 for a meter that ignores DST)
+        - :step: minutes of an interval
+
+    - **Output**:
+        - :utc: datetime64[m] array"""
+
+    local = asarray(timestamps,dtype='datetime64[m]')
+    if _fixed(zone):
+        return local-timedelta64(int(round(60*(zone or 0))),'m')
+    index = DatetimeIndex(asarray(local,dtype='datetime64[ns]'))
+    utc = index.tz_localize(zone,ambiguous=ones(len(local),dtype=bool),nonexistent=Timedelta(hours=1)).tz_convert(None) # repeated hour => summer time, skipped hour => winter time
+    offset = local-asarray(utc.values,dtype='datetime64[m]')
+    days = (local-timedelta64(step,'m')).astype('datetime64[D]')
+    dates = unique(days)
+    before, after = _midnight_offsets(dates,zone), _midnight_offsets(dates+1,zone)
+    for day, summer, winter in zip(dates[after<before],before[after<before],after[after<before]): # days of the autumn change (2 per year at most)
+        rows = flatnonzero(days==day)
+        back = rows[1:][diff(local[rows]).astype(int)<0] # backward jump of the labels => the repeated hour starts
+        if len(back):
+            offset[rows] = where(rows<back[0],summer,winter)
+    return local-offset
+
+def to_local(utc,zone=zone):
+
+    """Local wall-clock time of UTC times (datetime64[m])"""
+
+    utc = asarray(utc,dtype='datetime64[m]')
+    if _fixed(zone):
+        return utc+timedelta64(int(round(60*(zone or 0))),'m')
+    index = DatetimeIndex(asarray(utc,dtype='datetime64[ns]')).tz_localize('UTC').tz_convert(zone).tz_localize(None)
+    return asarray(index.values,dtype='datetime64[m]')
+
+##############################################
+##############################################
+##             REGULAR UTC SLOTS            ##
+##############################################
+##############################################
+
+def _winners(keys,last=True):
+
+    """Distinct keys and the position of their first (or last) occurrence => the rows kept by an assignment with unique indexes,
+    instead of relying on the order of the writes of repeated indexes"""
+
+    keys = asarray(keys)
+    if last:
+        distinct, position = unique(keys[::-1],return_index=True)
+        return distinct, len(keys)-1-position
+    return unique(keys,return_index=True)
+
+def runs(mask):
+
+    """Runs of True values of a boolean array => (first index, length) arrays"""
+
+    edges = diff(concatenate(([0],asarray(mask,dtype=int),[0])))
+    first = flatnonzero(edges==1)
+    return first, flatnonzero(edges==-1)-first
+
+def fill_gaps(values,valid,method='nan',max_gap=None,period=7*24*60//timeratio):
+
+    """Fill the slots that are not valid
+
+    - **Input**:
+        - :values: (slots,) or (slots, channels) array
+        - :valid: boolean array of the same shape
+        - :method: 'nan' (no fill), 'zero', 'previous' (last valid value), 'linear' (interpolation between the valid values around)
+                   or 'weekly' (value of the same slot one period earlier, or the period before...)
+        - :max_gap: longest run of slots filled (in slots) => the longer gaps stay NaN, no limit if None
+        - :period: number of slots of a period for 'weekly' (one week of 15 minutes)
+
+    - **Output**:
+        - :values: the filled copy of values
+        - :filled: number of filled values"""
+
+    if method not in FILLS:
+        raise ValueError('unknown fill method, must be one of '+', '.join(FILLS))
+    values = asarray(values,dtype=float).copy()
+    flat = values.reshape(len(values),-1)
+    valid = asarray(valid).reshape(len(values),-1)
+    if method=='nan':
+        flat[~valid] = nan
+        return values, 0
+    filled = 0
+    n = len(flat)
+    for channel in range(flat.shape[1]): # a few channels, each one vectorized
+        good = valid[:,channel]
+        target = ~good
+        if max_gap is not None: # only the short gaps
+            first, length = runs(target)
+            long_gap = zeros(n+1,dtype=int)
+            long_gap[first[length>max_gap]] += 1
+            long_gap[(first+length)[length>max_gap]] -= 1
+            target &= long_gap.cumsum()[:n]==0
+        column = flat[:,channel]
+        if method=='zero':
+            source = zeros(n)
+        elif method=='previous':
+            last = maximum.accumulate(where(good,arange(n),-1)) # index of the last valid slot
+            source = where(last>=0,column[last.clip(0)],nan)
+        elif method=='linear':
+            source = interp(arange(n),flatnonzero(good),column[good]) if good.any() else full(n,nan)
+        else: # weekly => forward fill along the weeks, slot by slot
+            weeks = -(-n//period)
+            index = full(weeks*period,-1)
+            index[:n] = where(good,arange(n),-1)
+            last = maximum.accumulate(index.reshape(weeks,period),axis=0).reshape(-1)[:n]
+            source = where(last>=0,column[last.clip(0)],nan)
+        column[target] = source[target]
+        column[~good & ~target] = nan
+        filled += int((target & ~isnan(source)).sum())
+    return values, filled
+
+@timed()
+def regularize(timestamps,values,zone=zone,step=timeratio,duplicates='last',fill='nan',max_gap=None):
+
+    """Regular UTC series of a meter: one slot per step minutes from the first to the last reading
+
+    - **Input**:
+        - :timestamps: local labels of the readings (end of each interval), cf: to_utc
+        - :values: (readings,) or (readings, channels) array
+        - :zone: time zone of the labels, or a fixed UTC offset in hours
+        - :step: minutes of a slot
+        - :duplicates: value kept when several readings fall in the same slot => 'first', 'last', 'mean' or 'sum' (NaN skipped)
+        - :fill: how the missing slots are filled (cf: fill_gaps)
+        - :max_gap: longest gap filled, in slots
+
+    - **Output**:
+        - :regular: Regular, with the report:
+            - 'readings', 'slots': number of readings and of slots
+            - 'duplicates': number of extra readings, 'duplicate_slots': UTC start of the slots with several readings
+            - 'gaps', 'gap_starts', 'gap_lengths': number of missing slots, UTC start and length of each run of missing slots
+            - 'misaligned': readings not on a slot boundary (put in the slot that contains them)
+            - 'unsorted': readings earlier than the previous one
+            - 'filled': number of filled values"""
+
+    if duplicates not in DUPLICATES:
+        raise ValueError('unknown duplicates policy, must be one of '+', '.join(DUPLICATES))
+    begin = (to_utc(timestamps,zone,step)-timedelta64(step,'m')).astype(int64) # UTC start of each interval, in minutes
+    position = begin//step
+    first = int(position.min())
+    slot = position-first
+    n = int(slot.max())+1
+    values = asarray(values,dtype=float)
+    flat = values.reshape(len(values),-1)
+
+    readings = bincount(slot,minlength=n) # readings per slot
+    if duplicates in ('first','last'):
+        regular = full((n,flat.shape[1]),nan)
+        slots, rows = _winners(slot,duplicates=='last') # a repeated slot keeps its first or last reading
+        regular[slots] = flat[rows]
+    else:
+        regular = zeros((n,flat.shape[1]))
+        present = zeros((n,flat.shape[1]))
+        for channel in range(flat.shape[1]):
+            regular[:,channel] = bincount(slot,weights=where(isnan(flat[:,channel]),0,flat[:,channel]),minlength=n)
+            present[:,channel] = bincount(slot,weights=~isnan(flat[:,channel]),minlength=n)
+        with errstate(invalid='ignore',divide='ignore'):
+            regular = where(present>0,regular/present if duplicates=='mean' else regular,nan)
+    valid = ~isnan(regular)
+    regular, filled = fill_gaps(regular,valid,fill,max_gap)
+
+    start = datetime64(first*step,'m')
+    gap_starts, gap_lengths = runs(readings==0)
+    report = {'readings':len(slot), 'slots':n, 'duplicates':int((readings-1).clip(0).sum()), 'duplicate_slots':start+flatnonzero(readings>1)*timedelta64(step,'m'),
+              'gaps':int(gap_lengths.sum()), 'gap_starts':start+gap_starts*timedelta64(step,'m'), 'gap_lengths':gap_lengths,
+              'misaligned':int((begin%step!=0).sum()), 'unsorted':int((diff(begin)<0).sum()), 'filled':filled}
+    count('duplicate readings',report['duplicates'])
+    count('missing slots',report['gaps'])
+    shape = (n,)+values.shape[1:]
+    return Regular(start,regular.reshape(shape),valid.reshape(shape),report)
+
+##############################################
+##############################################
+##              LOCAL DAY GRID              ##
+##############################################
+##############################################
+
+def day_grid(regular,zone=zone,step=timeratio,repeated='mean'):
+
+    """(days, slots) local day grid of a Regular series, e.g. the loadcurve of visualize_energy.py
+
+    - **Input**:
+        - :regular: the Regular series
+        - :zone: time zone of the grid, or a fixed UTC offset in hours
+        - :step: minutes of a slot
+        - :repeated: value of a local slot that happens twice (repeated hour of the autumn DST change) => 'first', 'last', 'mean' or 'sum'
+
+    - **Output**:
+        - :grid: Grid => the 4 slots of the skipped hour of the spring DST change are NaN and not valid"""
+
+    if repeated not in DUPLICATES:
+        raise ValueError('unknown repeated policy, must be one of '+', '.join(DUPLICATES))
+    n_slots = 24*60//step
+    values = asarray(regular.values,dtype=float)
+    flat = where(regular.valid,values,nan).reshape(len(values),-1)
+    local = to_local(regular.start+arange(len(values))*timedelta64(step,'m'),zone) # local start of each slot
+    day = local.astype('datetime64[D]')
+    dates = day[0]+arange(int((day[-1]-day[0]).astype(int))+1)
+    row = (day-dates[0]).astype(int)
+    cell = row*n_slots+(local-day).astype(int)//step
+    size = len(dates)*n_slots
+
+    if repeated in ('first','last'):
+        grid = full((size,flat.shape[1]),nan)
+        known = flatnonzero(~isnan(flat).all(axis=1)) # a measured slot wins over an empty one
+        cells, rows = _winners(cell[known],repeated=='last')
+        grid[cells] = flat[known[rows]]
+    else:
+        grid, present = zeros((size,flat.shape[1])), zeros((size,flat.shape[1]))
+        for channel in range(flat.shape[1]):
+            grid[:,channel] = bincount(cell,weights=where(isnan(flat[:,channel]),0,flat[:,channel]),minlength=size)
+            present[:,channel] = bincount(cell,weights=~isnan(flat[:,channel]),minlength=size)
+        with errstate(invalid='ignore',divide='ignore'):
+            grid = where(present>0,grid/present if repeated=='mean' else grid,nan)
+    shape = (len(dates),n_slots)+values.shape[1:]
+    grid = grid.reshape(shape)
+    return Grid(dates,grid,~isnan(grid),bincount(row,minlength=len(dates)))
+
+def on_dates(grid,dates):
+
+    """Values of a Grid on other consecutive dates (e.g. the calendar of a store) => NaN on the dates that the grid does not cover"""
+
+    dates = asarray(dates,dtype='datetime64[D]')
+    values = full((len(dates),)+grid.values.shape[1:],nan)
+    offset = int((grid.dates[0]-dates[0]).astype(int)) # row of the first date of the grid
+    first, last = max(offset,0), min(offset+len(grid.dates),len(dates))
+    if first<last:
+        values[first:last] = grid.values[first-offset:last-offset]
+    return values
+
+def local_grid(timestamps,values,dates,zone=zone,step=timeratio,duplicates='last',repeated='mean'):
+
+    """(days, slots) grid of a series labelled in local wall-clock time (end of each interval) on given dates, e.g. the canton
+    consumption on the calendar of a store => regularize, day_grid and on_dates in one call, instead of cutting the labels in
+    fixed days of 96 slots
+
+    - **Input**:
+        - :timestamps, values: the series, cf: regularize
+        - :dates: dates of the rows of the grid (consecutive days)
+        - :zone, step, duplicates: cf: regularize
+        - :repeated: cf: day_grid
+
+    - **Output**:
+        - :values: (days, slots) array (or (days, slots, channels)), NaN where the series has no value"""
+
+    return on_dates(day_grid(regularize(timestamps,values,zone,step,duplicates),zone,step,repeated),dates)
+
+def local_timestamps(dates,n_slots=96,step=timeratio):
+
+    """Local labels (end of each interval) of the cells of a day grid, e.g. the DateTime column of 4weeks_dataset1.csv"""
+
+    return (datetime64(asarray(dates,dtype='datetime64[D]')[0],'m')+timedelta64(step,'m'))+arange(len(dates)*n_slots)*timedelta64(step,'m')
+
+
+if __name__ == "__main__":
+
+    import sys
+    from ingestion import load_columns
+
+    for filename in sys.argv[1:]: # python regularize.py file1 file2 ... => report of each file
+        columns = load_columns(filename,'Results/cache')
+        regular = regularize(columns.timestamps,columns.values)
+        grid = day_grid(regular)
+        report = regular.report
+        print(filename,':',report['readings'],'readings,',report['slots'],'slots from',regular.start,'UTC')
+        print('  duplicates:',report['duplicates'],'- missing slots:',report['gaps'],'in',len(report['gap_lengths']),'gaps - misaligned:',report['misaligned'],'- unsorted:',report['unsorted'])
+        for n in (92,100):
+            print('  %d slot days:' % n,[str(day) for day in grid.dates[grid.slots==n]])
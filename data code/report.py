@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+PDF REPORTS OF LOAD CURVES
+###########################################
+###########################################
+
+This module renders the PDF reports of visualize_energy.py (one page per day, per month, per season) with the object-oriented
+Matplotlib API: each page is a Figure of its own (no pyplot global state), drawn by the Agg/PDF backends.
+
+The pages of a report are split in chunks rendered in parallel by a pool of processes, each chunk in a PDF file of its own,
+and the chunks are then merged (in order) in the final PDF file. Merging needs the pypdf package.
+
+render_report_incremental keeps each page in a PDF file of its own, named after a hash of its content (data, sunrise/sunset,
+title, style), so a new run only renders the pages that changed (e.g. the last day) and merges the others from the cache.
+
+A page is described by a dictionnary:
+    - 'title': the title of the page
+    - 'curves': list of (values, label, color), one line per curve
+    - 'sunrise', 'sunset': indexes of the sunrise and sunset time points (optional) => shown as arrows under the curves
+"""
+
+import json # import module to read/write the manifest of the page cache
+from hashlib import sha1 # import module to compute the content hash of the pages
+from os import path, cpu_count, makedirs, listdir, remove # import module to deal with files
+from tempfile import mkdtemp # import module to create a temporary folder for the chunks
+from shutil import rmtree # import module to remove the temporary folder
+from concurrent.futures import ProcessPoolExecutor # import module to render the chunks in parallel
+from multiprocessing import get_context, get_all_start_methods # import module to choose how the processes are started
+from numpy import nanmin, isnan, asarray, ascontiguousarray # import module to work with arrays / matrices
+from matplotlib import __version__ as matplotlib_version # the rendering can change with the version
+from matplotlib.figure import Figure # import module to make graphs (object-oriented API)
+from matplotlib.backends.backend_pdf import PdfPages # import module to write multi-page PDF files
+from instrumentation import timed, count # import module to time the rendering and count the rendered pages
+
+Ntmp = 96 # Number of measured timepoints for one day
+style = {'xticks':[0,16,32,48,64,80,95], # which x locations have ticks
+         'xticklabels':['00:15','04:15','08:15','12:15','16:15','20:15','24:00'], # the labels displayed at those ticks
+         'xlabel':"Time [15 minutes timepoints]", # title for X axis
+         'ylabel':"Energy in Watt [W]", # title for Y axis
+         'sunrise':'darkorange', 'sunset':'turquoise'} # colors of the sunrise and sunset arrows
+
+##############################################
+##############################################
+##                  PAGES                   ##
+##############################################
+##############################################
+
+def draw_page(page):
+
+    """Draw one page of a report
+
+    - **Input**:
+        - :page: the dictionnary describing the page
+
+    - **Output**:
+        - :fig: the Figure of the page"""
+
+    fig = Figure() # initialize a figure, independent from pyplot
+    ax = fig.add_subplot(111)
+
+    lines = []
+    for values, label, color in page['curves']:
+        lines += ax.plot(range(len(values)),values,linestyle="-",marker="",label=label,color=color) # make the graph
+    ax.grid(True)
+    ax.set_xticks(style['xticks']) # choose which x locations to have ticks
+    ax.set_xticklabels(style['xticklabels']) # set the labels to display at those ticks
+
+    measured = [values for values, label, color in page['curves'] if not isnan(asarray(values,dtype=float)).all()] # a day without any value (e.g. a gap of the meter) has only NaN
+    bottom = min(nanmin(values) for values in measured) if measured else 0 # arrows are drawn under the lowest point
+    for key in ('sunrise','sunset'):
+        index, color = page.get(key), style[key]
+        if index is not None and 0 <= index < Ntmp: # no arrow if there is no sunrise/sunset this day
+            ax.annotate('', xy=(index, bottom-0.003), xytext=(index, bottom-0.006),arrowprops=dict(facecolor=color, shrink=0.05,headwidth=7))
+
+    fig.suptitle(page['title'])
+    ax.set_xlabel(style['xlabel']) # title for X axis
+    ax.set_ylabel(style['ylabel']) # title for Y axis
+    ax.legend(handles=lines,fontsize='small')
+    return fig
+
+def render_pages(pages,filename):
+
+    """Render a list of pages in a PDF file
+
+    - **Input**:
+        - :pages: list of page dictionnaries
+        - :filename: the PDF file
+
+    - **Output**:
+        - :n: number of rendered pages"""
+
+    with PdfPages(filename) as pdf:
+        for page in pages:
+            pdf.savefig(draw_page(page),bbox_inches='tight')
+    return len(pages)
+
+def render_page_files(pages,filenames):
+
+    """Render pages in PDF files of their own
+
+    - **Input**:
+        - :pages: list of page dictionnaries
+        - :filenames: list of PDF files, one per page
+
+    - **Output**:
+        - :n: number of rendered pages"""
+
+    for page, filename in zip(pages,filenames):
+        render_pages([page],filename)
+    return len(pages)
+
+def merge_pdfs(parts,filename):
+
+    """Merge PDF files (in order) in one PDF file
+
+    - **Input**:
+        - :parts: list of PDF files
+        - :filename: the merged PDF file"""
+
+    from pypdf import PdfWriter # import module to merge PDF files
+
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(part)
+    writer.compress_identical_objects() # the fonts are shared by the pages
+    with open(filename,'wb') as out:
+        writer.write(out)
+    writer.close()
+
+##############################################
+##############################################
+##            PARALLEL RENDERING            ##
+##############################################
+##############################################
+
+@timed()
+def render_report(pages,filename,workers=None,chunk_size=32):
+
+    """Render the pages of a report in parallel, in one PDF file
+
+    - **Input**:
+        - :pages: list of page dictionnaries, in the order of the report
+        - :filename: the PDF file
+        - :workers: number of processes => number of CPUs if None, 1 to render everything in the current process
+        - :chunk_size: number of pages rendered by a process at once
+
+    - **Output**:
+        - :n: number of rendered pages"""
+
+    workers = workers or cpu_count() or 1
+    chunks = [pages[i:i+chunk_size] for i in range(0,len(pages),chunk_size)] # consecutive pages of the report
+    if workers==1 or len(chunks)<=1: # nothing to share
+        n = render_pages(pages,filename)
+        count('pages rendered',n)
+        return n
+
+    folder = mkdtemp(prefix='report_',dir=path.dirname(path.abspath(filename)))
+    try:
+        parts = [path.join(folder,'%06d.pdf' % n) for n in range(len(chunks))] # one PDF file per chunk
+        n = _parallel(render_pages,chunks,parts,workers)
+        merge_pdfs(parts,filename)
+    finally:
+        rmtree(folder)
+    count('pages rendered',n)
+    return n
+
+def _parallel(function,chunks,filenames,workers):
+    if workers==1 or len(chunks)<=1:
+        return sum(map(function,chunks,filenames))
+    context = get_context('fork') if 'fork' in get_all_start_methods() else None # forked processes do not re-run the calling script
+    with ProcessPoolExecutor(min(workers,len(chunks)),mp_context=context) as pool:
+        return sum(pool.map(function,chunks,filenames))
+
+##############################################
+##############################################
+##          INCREMENTAL RENDERING           ##
+##############################################
+##############################################
+
+def page_key(page):
+
+    """Content hash of a page: its data, sunrise/sunset, title and the style of the graphs
+
+    - **Input**:
+        - :page: the dictionnary describing the page
+
+    - **Output**:
+        - :key: hexadecimal hash"""
+
+    digest = sha1()
+    digest.update(json.dumps([page['title'],page.get('sunrise'),page.get('sunset'),style,matplotlib_version],default=int).encode())
+    for values, label, color in page['curves']:
+        digest.update(json.dumps([label,color]).encode())
+        digest.update(ascontiguousarray(values,dtype=float).tobytes())
+    return digest.hexdigest()
+
+@timed()
+def render_report_incremental(pages,filename,cache,workers=None,chunk_size=32,name=None):
+
+    """Render a report from a cache of pages: only the pages that are not in the cache yet (new or changed) are rendered
+
+    The cache folder contains one PDF file per page (named after page_key) and a manifest.json giving the keys of the pages
+    of each report: the pages that no report uses any more are removed.
+
+    - **Input**:
+        - :pages: list of page dictionnaries, in the order of the report
+        - :filename: the PDF file
+        - :cache: the cache folder
+        - :workers: number of processes => number of CPUs if None
+        - :chunk_size: number of pages rendered by a process at once
+        - :name: name of the report in the manifest => beginning of the file name (before the first '_') if None
+
+    - **Output**:
+        - :rendered: number of rendered pages (the others come from the cache)"""
+
+    if not path.isdir(cache):
+        makedirs(cache)
+    keys = [page_key(page) for page in pages]
+    files = [path.join(cache,key+'.pdf') for key in keys]
+
+    dirty = {} # pages to render, once per key
+    for page, key, part in zip(pages,keys,files):
+        if key not in dirty and not path.exists(part):
+            dirty[key] = (page,part)
+    dirty = list(dirty.values())
+    chunks = [dirty[i:i+chunk_size] for i in range(0,len(dirty),chunk_size)]
+    rendered = _parallel(render_page_files,[[page for page, part in chunk] for chunk in chunks],[[part for page, part in chunk] for chunk in chunks],workers or cpu_count() or 1)
+
+    count('pages rendered',rendered)
+    count('pages from cache',len(pages)-rendered)
+    merge_pdfs(files,filename)
+
+    manifest_file = path.join(cache,'manifest.json') # keys of the pages of each report
+    manifest = {}
+    if path.exists(manifest_file):
+        with open(manifest_file) as manifest_in:
+            manifest = json.load(manifest_in)
+    manifest[name or path.basename(filename).split('_')[0]] = keys # the report name, without the run time
+    with open(manifest_file,'w') as manifest_out:
+        json.dump(manifest,manifest_out)
+    used = set(key+'.pdf' for report in manifest.values() for key in report)
+    for part in listdir(cache): # pages that no report uses any more
+        if part.endswith('.pdf') and part not in used:
+            remove(path.join(cache,part))
+
+    return rendered
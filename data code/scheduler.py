@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+SCHEDULING OF SHIFTABLE APPLIANCES
+###########################################
+###########################################
+
+This module tells when to run the shiftable appliances of a club (laundry, dish washer, EV charging...): given the forecast
+load curve of the club, the solar forecast and a set of jobs, it assigns a start slot to each job so as to minimize
+    - 'peak': the highest point of the club load curve (jobs included)
+    - 'dirty': the energy not covered by the solar forecast => sum over the slots of max(load - solar, 0)
+
+A job runs at constant power (energy / duration) during duration consecutive slots, starting at or after earliest and
+ending at or before deadline (slots of the load curve, deadline not included).
+
+Two solvers:
+    - greedy: the jobs are taken from a heap (highest power first, then least slack), each one placed at the start slot
+      of lowest cost, all start slots being evaluated at once with sliding windows => a few thousand jobs in well under a second
+    - exact: depth-first branch and bound over the start slots, from the greedy solution => optimal, for small cases only
+"""
+
+import heapq # import module to take the jobs by priority
+from collections import namedtuple # import module to create simple record types
+from numpy import asarray, zeros, maximum, cumsum, concatenate, lexsort, arange # import module to work with arrays / matrices
+from numpy.lib.stride_tricks import sliding_window_view # import module to look at all the windows of a curve at once
+
+Job = namedtuple('Job',['name','duration','energy','earliest','deadline']) # a shiftable job => duration in slots, earliest and deadline in slots of the load curve
+Schedule = namedtuple('Schedule',['starts','curve','cost']) # start slot of each job (in the order of the jobs), load curve with the jobs, value of the objective
+OBJECTIVES = ('peak','dirty')
+
+def jobs_from_arrays(durations,energies,earliest,deadlines,names=None):
+
+    """List of Jobs from arrays of durations, energies, earliest starts and deadlines"""
+
+    names = names if names is not None else range(len(durations))
+    return [Job(name,int(d),float(e),int(s),int(f)) for name, d, e, s, f in zip(names,durations,energies,earliest,deadlines)]
+
+def objective_value(curve,solar=None,objective='peak'):
+
+    """Value of the objective for a load curve => the peak, or the energy not covered by the solar forecast"""
+
+    curve = asarray(curve,dtype=float)
+    if objective=='peak':
+        return float(curve.max())
+    return float(maximum(curve-(0 if solar is None else asarray(solar,dtype=float)),0).sum())
+
+def _check(load,jobs,objective):
+    if objective not in OBJECTIVES:
+        raise ValueError("unknown objective, must be 'peak' or 'dirty'")
+    for job in jobs:
+        if job.duration<1 or job.earliest<0 or job.deadline>len(load) or job.earliest+job.duration>job.deadline:
+            raise ValueError('job '+str(job.name)+' does not fit between its earliest start and its deadline')
+
+def _costs(curve,solar,job,objective):
+    power = job.energy/job.duration
+    window = curve[job.earliest:job.deadline]
+    if objective=='peak': # new peak of each window, then the load already in the window (to fill the valleys when the peak does not change)
+        peak = sliding_window_view(window,job.duration).max(axis=1)+power
+        load = cumsum(concatenate(([0.],window)))
+        return lexsort((load[job.duration:]-load[:-job.duration],peak)), peak
+    free = solar[job.earliest:job.deadline]-window # solar energy not used yet in each slot
+    extra = maximum(power-maximum(free,0),0) # dirty energy added in each slot
+    added = cumsum(concatenate(([0.],extra)))
+    added = added[job.duration:]-added[:-job.duration]
+    return lexsort((arange(len(added)),added)), added
+
+##############################################
+##############################################
+##              GREEDY SOLVER               ##
+##############################################
+##############################################
+
+def schedule_greedy(load,jobs,solar=None,objective='peak'):
+
+    """Greedy schedule: each job, by priority, at its best start slot given the jobs already placed
+
+    - **Input**:
+        - :load: forecast load curve of the club (one value per slot)
+        - :jobs: list of Jobs
+        - :solar: solar forecast on the same slots (needed for 'dirty'), in the same units as load
+        - :objective: 'peak' or 'dirty'
+
+    - **Output**:
+        - :schedule: Schedule"""
+
+    curve = asarray(load,dtype=float).copy()
+    _check(curve,jobs,objective)
+    solar = zeros(len(curve)) if solar is None else asarray(solar,dtype=float)
+    heap = [(-job.energy/job.duration,job.deadline-job.earliest-job.duration,n) for n, job in enumerate(jobs)] # highest power, then least slack first
+    heapq.heapify(heap)
+    starts = zeros(len(jobs),dtype=int)
+    while heap:
+        n = heapq.heappop(heap)[2]
+        job = jobs[n]
+        order, cost = _costs(curve,solar,job,objective)
+        start = job.earliest+int(order[0]) # lowest cost, earliest start on ties
+        curve[start:start+job.duration] += job.energy/job.duration
+        starts[n] = start
+    return Schedule(starts,curve,objective_value(curve,solar,objective))
+
+##############################################
+##############################################
+##               EXACT SOLVER               ##
+##############################################
+##############################################
+
+def schedule_exact(load,jobs,solar=None,objective='peak',max_nodes=1000000):
+
+    """Optimal schedule by branch and bound, for small cases (a few jobs with short windows)
+
+    The jobs are placed one by one (least start slots first); the candidate start slots of a job are tried from the cheapest,
+    and a branch is cut as soon as its objective (which can only grow with the next jobs) reaches the best complete schedule
+    found so far, starting from the greedy schedule.
+
+    - **Input**:
+        - :load, jobs, solar, objective: cf: schedule_greedy
+        - :max_nodes: maximum number of partial schedules explored => ValueError beyond, the case is too big for this solver
+
+    - **Output**:
+        - :schedule: Schedule"""
+
+    load = asarray(load,dtype=float)
+    best = schedule_greedy(load,jobs,solar,objective)
+    solar = zeros(len(load)) if solar is None else asarray(solar,dtype=float)
+    order = sorted(range(len(jobs)),key=lambda n: jobs[n].deadline-jobs[n].earliest-jobs[n].duration) # least choice first
+    state = {'cost':best.cost-1e-9, 'starts':None, 'nodes':0}
+    starts = zeros(len(jobs),dtype=int)
+
+    def branch(depth,curve,cost):
+        state['nodes'] += 1
+        if state['nodes']>max_nodes:
+            raise ValueError('too many jobs for the exact solver, use schedule_greedy')
+        if depth==len(order): # complete schedule, better than the best one
+            state['cost'], state['starts'] = cost, starts.copy()
+            return
+        n = order[depth]
+        job = jobs[n]
+        candidates, costs = _costs(curve,solar,job,objective)
+        for candidate in candidates:
+            new = max(cost,costs[candidate]) if objective=='peak' else cost+costs[candidate]
+            if new>=state['cost']: # the next candidates cost at least as much
+                break
+            start = job.earliest+int(candidate)
+            curve[start:start+job.duration] += job.energy/job.duration
+            starts[n] = start
+            branch(depth+1,curve,new)
+            curve[start:start+job.duration] -= job.energy/job.duration
+
+    branch(0,load.copy(),objective_value(load,solar,objective))
+    if state['starts'] is None: # nothing better than the greedy schedule
+        return best
+    curve = load.copy()
+    for job, start in zip(jobs,state['starts']):
+        curve[start:start+job.duration] += job.energy/job.duration
+    return Schedule(state['starts'],curve,objective_value(curve,solar,objective))
+
+def schedule(load,jobs,solar=None,objective='peak',method='auto',max_options=100000):
+
+    """Schedule of shiftable jobs => exact solver for small cases, greedy solver otherwise
+
+    - **Input**:
+        - :load, jobs, solar, objective: cf: schedule_greedy
+        - :method: 'greedy', 'exact' or 'auto'
+        - :max_options: with 'auto', the exact solver is used when the number of possible schedules is at most max_options
+
+    - **Output**:
+        - :schedule: Schedule"""
+
+    if method=='auto':
+        options = 1
+        for job in jobs:
+            options *= job.deadline-job.earliest-job.duration+1
+            if options>max_options:
+                break
+        method = 'exact' if options<=max_options else 'greedy'
+    if method=='exact':
+        return schedule_exact(load,jobs,solar,objective)
+    return schedule_greedy(load,jobs,solar,objective)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+LOCAL HTTP API - FORECAST TILES
+###########################################
+###########################################
+
+This module serves the load curves of the LoadCurveStore (cf: loadcurve_store) to the front end as small tiles, instead of the
+whole CSV files: a tile is one day (or one week) of one household with the channels
+    - power: the observed consumption (NaN/null where there is no measure, e.g. in the future)
+    - average: the same weekday baseline of the previous weeks (cf: baseline), which is also the forecast of the coming days
+    - recommendation: the light-bulb codes (cf: recommendation), if they were precomputed for the household
+    - reference: the canton consumption scaled to the household (cf: canton), if a reference was built for the household
+
+Routes (GET, household=<ID> optional if the store has only one household, format=json or bin => cf: binary_export):
+    - /now: tile of the current day, with the current slot and recommendation
+    - /forecast?hours=24: the next hours from now
+    - /history?from=YYYY-MM-DD&to=YYYY-MM-DD: the days between 2 dates (to not included), tile=day or week
+
+Each tile only reads the few rows it needs from the memory-mapped store, so the cost of a request does not depend on the length
+of the dataset. The tiles and the encoded responses are kept in an in-process LRU cache, cleared when the files of the store change
+(e.g. readings flushed by streaming); the responses carry an ETag (a request with a matching If-None-Match gets a 304) and are
+gzipped when the client accepts it.
+
+The "now" of the server is the current date and time moved by whole years into the calendar of the store (like pseudo_now in
+js/data.js), or a fixed time given with --now.
+
+    python server.py --store Results/store --recommendations Results/recommendations --reference Results/reference/canton --port 8080
+"""
+
+import json # import module to encode the JSON tiles
+import gzip # import module to compress the responses
+import asyncio # import module to serve the requests
+from hashlib import sha1 # import module to compute the ETags
+from datetime import datetime # import module to deal with dates, time, etc.
+from collections import OrderedDict # import module to keep the LRU cache in access order
+from urllib.parse import urlsplit, parse_qs # import module to parse the requests
+from os import path, stat # import module to deal with file paths
+from numpy import asarray, full, nan, datetime64, timedelta64, concatenate # import module to work with arrays / matrices
+from loadcurve_store import LoadCurveStore # import module to read the load curves of the households
+from baseline import same_weekday_baseline # import module to compute the expected consumption of the households
+from recommendation import read_recommendations, NO_DATA # import module to read the precomputed light-bulb recommendations
+from binary_export import encode_series # import module to encode the binary tiles
+from canton import read_reference # import module to read the canton reference and the scale factors of the households
+
+timeratio = 15 # number of minutes that separate 2 timepoints
+scale = 1/4./1000 # the store is in Watt [W] => served in kiloWatt hour per 15min [kWh], the units of the front end
+max_days = 366 # longest history served at once
+
+def _scalar(value):
+    value = value.item() # numpy => python number
+    return None if value!=value else value # NaN => null
+
+class HttpError(Exception):
+
+    """Error of a request => HTTP status and message"""
+
+    def __init__(self,status,message):
+        Exception.__init__(self,message)
+        self.status = status
+
+class TileServer(object):
+
+    """Tiles of the households of a LoadCurveStore, with an LRU cache of the tiles and of the encoded responses
+
+    - **Input**:
+        - :store: the LoadCurveStore
+        - :recommendations: folder of the precomputed recommendations (cf: recommendation.write_recommendations), or None
+        - :weeks: number of weeks of the baseline
+        - :now: fixed "now" of the server (datetime), or None to replay the current time in the calendar of the store
+        - :maxsize: number of tiles and of responses kept in the LRU cache
+        - :scale: factor applied to the load curves of the store
+        - :reference: (folder, name) of the canton reference (cf: canton.build_reference), or None"""
+
+    def __init__(self,store,recommendations=None,weeks=4,now=None,maxsize=1024,scale=scale,reference=None):
+        self.store = store
+        self.recommendations = recommendations
+        self.reference = reference
+        self.weeks = weeks
+        self.now = now
+        self.maxsize = maxsize
+        self.scale = scale
+        self.tiles = OrderedDict() # (household, day) => dictionnary of the channels of the day
+        self.responses = OrderedDict() # (route, query, format, time) => (body, content type, etag, X-Tile header)
+        self.hits = self.misses = 0
+        self.stamp = self._stamp()
+
+    def _stamp(self):
+        return tuple(stat(path.join(self.store.folder,name)).st_mtime_ns for name in ('index.json','cube.dat'))
+
+    def refresh(self):
+
+        """Clear the caches if the store was changed on disk since the last request => the store is opened again if its index changed
+        (e.g. a new household)"""
+
+        stamp = self._stamp()
+        if stamp!=self.stamp:
+            if stamp[0]!=self.stamp[0]:
+                self.store = LoadCurveStore(self.store.folder,self.store.mode)
+            self.tiles.clear()
+            self.responses.clear()
+            self.stamp = stamp
+
+    def _lru(self,cache,key,compute):
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+        value = cache[key] = compute()
+        if len(cache)>self.maxsize:
+            cache.popitem(last=False) # least recently used
+        return value
+
+    def clock(self):
+
+        """Current time of the server => datetime64[m] inside the calendar of the store, rounded down to the 15 minutes"""
+
+        now = self.now or datetime.now()
+        while datetime64(now.date())>=self.store.first_date+self.store.n_days: # replay the same day of an earlier year
+            now = now.replace(year=now.year-1,day=28 if (now.month,now.day)==(2,29) else now.day)
+        if datetime64(now.date())<self.store.first_date:
+            raise HttpError(404,'no data for the current time')
+        now = datetime64(now,'m')
+        return now-(now.astype(int)%timeratio).astype('timedelta64[m]')
+
+    def household(self,query):
+
+        """Household of a request => the only household of the store if there is no 'household' parameter"""
+
+        if 'household' in query:
+            household = query['household'][0]
+            if household not in self.store:
+                raise HttpError(404,'unknown household '+household)
+            return household
+        if len(self.store)!=1:
+            raise HttpError(400,'household parameter needed')
+        return self.store.households[0]
+
+    ##############################################
+    ##                  TILES                   ##
+    ##############################################
+
+    def _rows(self,household,first,last):
+        n = self.store.position(household)
+        rows = full((last-first,self.store.n_slots),nan)
+        start, end = max(first,0), min(last,self.store.n_days) # only the part inside the calendar is read
+        if start<end:
+            rows[start-first:end-first] = self.store.cube[n,start:end]
+        return rows
+
+    def day_tile(self,household,day):
+
+        """Channels of one household and day => dictionnary of arrays 'power', 'average', 'recommendation' and 'reference' (if precomputed)
+
+        The reference of a day is scaled with the factor of the rolling window that ends on the day, or with the factor of the
+        whole calendar if the window has no common values with the household."""
+
+        def compute():
+            index = self.store.day_index(day)
+            lookback = 7*(self.weeks-1)
+            rows = self._rows(household,index-lookback,index+1) # the same weekdays of the previous weeks, and the day
+            power = rows[-1]*self.scale
+            average = same_weekday_baseline(rows,self.weeks)[-1]*self.scale
+            tile = {'power':power, 'average':average}
+            if self.recommendations and path.exists(path.join(self.recommendations,str(household),'meta.json')):
+                codes, scores, meta = read_recommendations(self.recommendations,household)
+                position = index-self.store.day_index(meta['first_date'])
+                tile['recommendation'] = asarray(codes[position]) if 0<=position<len(codes) else full(self.store.n_slots,NO_DATA)
+            if self.reference and path.exists(path.join(self.reference[0],str(self.reference[1]),'meta.json')):
+                reference, factors, rolling, meta = read_reference(*self.reference)
+                if household in meta['households']:
+                    n = meta['households'].index(household)
+                    position = index-self.store.day_index(meta['first_date'])
+                    inside = 0<=position<meta['n_days']
+                    factor = rolling[n,position] if inside and rolling[n,position]==rolling[n,position] else factors[n]
+                    tile['reference'] = asarray(reference[position],dtype=float)*factor*self.scale if inside else full(self.store.n_slots,nan)
+            return tile
+        return self._lru(self.tiles,(household,str(datetime64(day,'D'))),compute)
+
+    def series(self,household,start,slots):
+
+        """Channels of a household from a time slot (datetime64[m], start of the first slot), over a number of slots"""
+
+        day = start.astype('datetime64[D]')
+        first = int((start-day).astype(int))//timeratio
+        days = (first+slots+self.store.n_slots-1)//self.store.n_slots
+        tiles = [self.day_tile(household,day+n) for n in range(days)]
+        return dict((channel,concatenate([tile[channel] for tile in tiles])[first:first+slots]) for channel in tiles[0])
+
+    ##############################################
+    ##                 ROUTES                   ##
+    ##############################################
+
+    def route_now(self,query):
+        household, now = self.household(query), self.clock()
+        day = now.astype('datetime64[D]')
+        slot = int((now-day).astype(int))//timeratio # the current 15 minutes interval
+        tile = self.day_tile(household,day)
+        current = dict((channel,_scalar(values[slot])) for channel, values in tile.items())
+        return {'household':household, 'date':str(day), 'time':str(now), 'slot':slot, 'current':current}, tile, day+timedelta64(timeratio,'m')
+
+    def route_forecast(self,query):
+        household, now = self.household(query), self.clock()
+        try:
+            hours = int(query.get('hours',['24'])[0])
+        except ValueError:
+            raise HttpError(400,'hours must be a whole number')
+        if not 0<hours<=24*7:
+            raise HttpError(400,'hours must be between 1 and 168')
+        channels = self.series(household,now,hours*60//timeratio)
+        return {'household':household, 'time':str(now), 'hours':hours}, channels, now+timedelta64(timeratio,'m')
+
+    def route_history(self,query):
+        household = self.household(query)
+        try:
+            first = datetime64(query['from'][0],'D')
+            last = datetime64(query['to'][0],'D') if 'to' in query else first+1
+        except (KeyError, ValueError):
+            raise HttpError(400,'from (and to) must be dates YYYY-MM-DD')
+        if query.get('tile',['day'])[0]=='week': # whole weeks, from Monday
+            first = first-(first.astype(int)+3)%7
+            last = last+(7-(last.astype(int)+3)%7)%7
+        n = int((last-first).astype(int))
+        if not 0<n<=max_days:
+            raise HttpError(400,'from must be before to, at most '+str(max_days)+' days')
+        channels = self.series(household,datetime64(first,'m'),n*self.store.n_slots)
+        return {'household':household, 'from':str(first), 'to':str(last)}, channels, datetime64(first,'m')+timedelta64(timeratio,'m')
+
+    routes = {'/now':route_now, '/forecast':route_forecast, '/history':route_history}
+
+    def respond(self,target):
+
+        """Response of a request target (path and query) => (body, content type, etag)"""
+
+        self.refresh()
+        url = urlsplit(target)
+        if url.path not in self.routes:
+            raise HttpError(404,'unknown route '+url.path)
+        query = parse_qs(url.query)
+        fmt = query.get('format',['json'])[0]
+        if fmt not in ('json','bin'):
+            raise HttpError(400,"format must be 'json' or 'bin'")
+        key = (url.path,tuple(sorted((name, tuple(values)) for name, values in query.items())),fmt,str(self.clock()) if url.path!='/history' else None) # now and forecast change every 15 minutes
+        def compute():
+            info, channels, start = self.routes[url.path](self,query)
+            info.update({'start':str(start), 'step':timeratio, 'channels':list(channels)})
+            if fmt=='json':
+                info.update((channel,[_scalar(value) for value in values.round(6)]) for channel, values in channels.items())
+                body, content_type = json.dumps(info).encode(), 'application/json'
+            else: # compact binary time series (cf: binary_export), the description stays in the X-Tile header
+                body = encode_series(start,timeratio,list(channels.items()))
+                content_type = 'application/octet-stream'
+                info = json.dumps(dict((name, value) for name, value in info.items() if name!='current'),default=str)
+                return body, content_type, sha1(body).hexdigest(), info
+            return body, content_type, sha1(body).hexdigest(), None
+        return self._lru(self.responses,key,compute)
+
+##############################################
+##############################################
+##                  HTTP                    ##
+##############################################
+##############################################
+
+reasons = {200:'OK', 304:'Not Modified', 400:'Bad Request', 404:'Not Found', 405:'Method Not Allowed', 500:'Internal Server Error'}
+
+async def handle(server,reader,writer):
+
+    """Answer one HTTP/1.1 request, then close the connection"""
+
+    try:
+        request = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        extra, tile = {}, None
+        try:
+            if len(request)<2 or request[0]!='GET':
+                raise HttpError(405,'only GET is supported')
+            body, content_type, etag, tile = server.respond(request[1])
+            status = 200
+            extra['ETag'] = '"'+etag+'"'
+            if headers.get('if-none-match')==extra['ETag']:
+                status, body = 304, b''
+            elif 'gzip' in headers.get('accept-encoding',''):
+                body = gzip.compress(body,6)
+                extra['Content-Encoding'] = 'gzip'
+        except HttpError as error:
+            status, body, content_type = error.status, json.dumps({'error':str(error)}).encode(), 'application/json'
+        except Exception as error: # a bug must not leave the client without answer
+            status, body, content_type = 500, json.dumps({'error':repr(error)}).encode(), 'application/json'
+            extra = {}
+
+        lines = ['HTTP/1.1 %d %s' % (status,reasons[status]), 'Content-Type: '+content_type, 'Content-Length: '+str(len(body)),
+                 'Access-Control-Allow-Origin: *', 'Access-Control-Expose-Headers: ETag, X-Tile', 'Vary: Accept-Encoding', 'Connection: close']
+        lines += [name+': '+value for name, value in extra.items()]
+        if tile:
+            lines.append('X-Tile: '+tile)
+        writer.write(('\r\n'.join(lines)+'\r\n\r\n').encode('latin-1')+body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(server,host='127.0.0.1',port=8080):
+
+    """Serve the tiles of a TileServer until interrupted"""
+
+    listener = await asyncio.start_server(lambda reader, writer: handle(server,reader,writer),host,port)
+    print('Serving',len(server.store),'household(s) on http://%s:%d' % (host,port))
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local HTTP API serving the load curve tiles of a LoadCurveStore')
+    parser.add_argument('--store',default='Results/store',help='folder of the LoadCurveStore')
+    parser.add_argument('--recommendations',default='Results/recommendations',help='folder of the precomputed recommendations')
+    parser.add_argument('--reference',default=None,help='folder of the canton reference, e.g. Results/reference/canton')
+    parser.add_argument('--weeks',type=int,default=4,help='number of weeks of the baseline')
+    parser.add_argument('--now',default=None,help='fixed current time, e.g. 2018-01-10T12:00')
+    parser.add_argument('--host',default='127.0.0.1')
+    parser.add_argument('--port',type=int,default=8080)
+    args = parser.parse_args()
+
+    now = datetime.strptime(args.now,'%Y-%m-%dT%H:%M') if args.now else None
+    server = TileServer(LoadCurveStore(args.store),args.recommendations,args.weeks,now,reference=path.split(path.normpath(args.reference)) if args.reference else None)
+    try:
+        asyncio.run(serve(server,args.host,args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+MONTE CARLO APPLIANCE-USAGE SIMULATOR
+###########################################
+###########################################
+
+This module generates synthetic household day profiles (96 x 15 minutes timepoints), thousands at once, to stress-test the
+baseline, aggregation and recommendation code on large synthetic fleets. For every profile and device:
+    - the number of runs of the day is drawn from the runs distribution of the device (per weekday class if given)
+    - the start slot of each run is drawn from the start distribution of the device (per weekday class if given)
+    - the duration and the power of each run are drawn together from a 2D Gaussian
+    - the runs are placed in the profiles, on top of a Gaussian base load
+
+All the draws of a device are done in one batch with the samplers of General_functions (alias tables for the categorical
+draws, batched multivariate Gaussians, vectorized activity placement) and one seeded numpy.random.Generator, so a simulation
+is reproducible from its seed.
+"""
+
+from collections import namedtuple # import module to create simple record types
+from numpy import arange, repeat, tile, rint, exp, random # import module to work with arrays / matrices
+from General_functions import DiscreteSampler, randGaussianBatch, randindexBatch # import module to draw the random values in batches
+from aggregation import weekday_class_labels # import module to give the weekday class of each date (0 = working day, 1 = Saturday, 2 = Sunday)
+
+Ntmp = 96 # Number of timepoints for one day
+
+Device = namedtuple('Device',['name','runs','start','duration','power','correlation']) # cf: simulate
+# runs: probabilities of 0, 1, 2... runs per day => (k,) or (3, k) one row per weekday class
+# start: probabilities of the start slot of a run => (96,) or (3, 96) one row per weekday class
+# duration: (mean, standard deviation) of the duration of a run, in slots
+# power: (mean, standard deviation) of the power of a run, in Watt [W]
+# correlation: correlation between the duration and the power of a run
+
+def start_probabilities(hours,widths,weights=None):
+
+    """Start probabilities (96,) as a mixture of Gaussian bumps, e.g. start_probabilities([7,19],[1,2]) for a morning and an evening use
+
+    - **Input**:
+        - :hours: center of each bump, in hours
+        - :widths: standard deviation of each bump, in hours
+        - :weights: weight of each bump => the same for all if None
+
+    - **Output**:
+        - :P: the (not normalized) probability of each slot"""
+
+    slots = (arange(Ntmp)+0.5)/4. # middle of each slot, in hours
+    weights = [1.]*len(hours) if weights is None else weights
+    return sum(weight*exp(-0.5*((slots-hour)/width)**2) for hour, width, weight in zip(hours,widths,weights))
+
+def example_devices():
+
+    """A few typical shiftable and non-shiftable devices of a household"""
+
+    return [Device('washing machine',[[0.7,0.3],[0.4,0.6],[0.6,0.4]],start_probabilities([9,18],[2,2]),(8,2),(500,100),0.3),
+            Device('dish washer',[0.3,0.7],start_probabilities([13,20.5],[1,1.5],[1,2]),(6,1),(1200,200),0.),
+            Device('cooking',[0.1,0.5,0.4],start_probabilities([7,12,19],[0.5,0.7,0.8],[1,2,3]),(3,1),(2000,500),0.),
+            Device('EV charging',[[0.6,0.4],[0.8,0.2],[0.8,0.2]],start_probabilities([19],[2]),(16,6),(3700,300),0.)]
+
+def _draw(sampler,classes):
+    if sampler.single:
+        return sampler.sample(len(classes))
+    return sampler.sample(rows=classes)
+
+def simulate(devices,dates,households=1,base=(150.,50.),seed=None,events=False):
+
+    """Simulate day profiles of synthetic households
+
+    - **Input**:
+        - :devices: list of Devices (cf: example_devices)
+        - :dates: dates of the days (the weekday classes select the rows of the per weekday class distributions)
+        - :households: number of households
+        - :base: (mean, standard deviation) of the base load in Watt [W], scalars or (96,) profiles
+        - :seed: seed of the numpy.random.Generator => the same seed gives the same profiles
+        - :events: if True, also returns the runs of each device
+
+    - **Output**:
+        - :profiles: (households, days, 96) array of the load curves in Watt [W]
+        - :runs: (if events) dictionnary per device name of (profile index, start slot, duration, power) arrays, profile index = household*days+day"""
+
+    generator = random.default_rng(seed)
+    classes = tile(weekday_class_labels(dates),households) # weekday class of each profile, household after household
+    n = len(classes)
+
+    mean, stdev = base
+    profiles = (generator.standard_normal((n,Ntmp))*stdev+mean).clip(0) # base load
+    runs = {}
+    for device in devices:
+        runs_sampler, start_sampler = [DiscreteSampler(P,generator=generator) for P in (device.runs,device.start)] # alias tables, built once for all the profiles
+        counts = _draw(runs_sampler,classes) # number of runs of each profile
+        profile = repeat(arange(n),counts) # profile of each run
+        starts = _draw(start_sampler,classes[profile])
+        (d, sd), (p, sp) = device.duration, device.power
+        cov = [[sd**2,device.correlation*sd*sp],[device.correlation*sd*sp,sp**2]]
+        duration, power = randGaussianBatch([d,p],cov,len(profile),generator).T
+        duration, power = rint(duration).clip(1).astype(int), power.clip(0)
+        profiles += randindexBatch(starts,duration,power,profile,(n,Ntmp)) # runs that go beyond midnight are cut
+        if events:
+            runs[device.name] = (profile,starts,duration,power)
+
+    profiles = profiles.reshape(households,len(classes)//households,Ntmp)
+    return (profiles, runs) if events else profiles
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+SOLAR FORECAST - WEEKDAY x HOUR TABLES
+###########################################
+###########################################
+
+This module turns a 15 minutes solar energy forecast (e.g. the 4 TSO columns of Solarenergie-6.csv, loaded with the ingestion module)
+into hourly tables of shape (weeks, 7, 24): one row per weekday (Monday first) and one column per hour, for as many weeks as wanted.
+
+The hour of each value comes from its timestamp (not from counting rows), so days with missing values or with 92/100 values
+(summer/winter time change) stay aligned: each cell is the mean of the values that fall in that hour.
+"""
+
+from numpy import asarray, bincount, where, nan, errstate, timedelta64, datetime64, isnan # import module to work with arrays / matrices
+
+timeratio = 15 # number of minutes that separate 2 forecast timepoints
+
+def week_hour_tensor(timestamps,values,start=None,end=None,channels=None):
+
+    """Hourly (weeks, 7, 24) tables of a 15 minutes forecast, weeks starting on Mondays
+
+    - **Input**:
+        - :timestamps: datetime64 array, end of each 15 minutes interval
+        - :values: array of the forecast, (timepoints,) or (timepoints, channels)
+        - :start: first date taken into account => the tables start on the first Monday from this date (first date of the forecast if None)
+        - :end: last date taken into account, not included (end of the forecast if None)
+        - :channels: list of the channels (columns) summed in the tables => all of them if None
+
+    - **Output**:
+        - :tensor: (weeks, 7, 24) array of hourly means, NaN where there is no value
+        - :monday: date of the first Monday (datetime64[D])"""
+
+    begin = asarray(timestamps,dtype='datetime64[m]')-timedelta64(timeratio,'m') # start of each interval
+    values = asarray(values,dtype=float)
+    if values.ndim==2: # several channels => summed
+        values = (values if channels is None else values[:,channels]).sum(axis=1)
+
+    days = begin.astype('datetime64[D]')
+    first = days[0] if start is None else datetime64(start,'D')
+    monday = first+(7-(first.astype(int)+3)%7)%7 # first Monday from the first date (1970-01-01 was a Thursday)
+    offset = (days-monday).astype(int) # day of each value, from the first Monday
+    hour = ((begin-days).astype('timedelta64[m]').astype(int))//60 # hour of each value in its day
+
+    keep = (offset>=0) & (hour<24) & ~isnan(values)
+    if end is not None:
+        keep &= days<datetime64(end,'D')
+    offset, hour, values = offset[keep], hour[keep], values[keep]
+    weeks = int(offset.max())//7+1 if len(offset) else 0
+
+    cell = offset*24+hour # one bin per (week, weekday, hour) => the day offset already counts week*7+weekday
+    total = bincount(cell,weights=values,minlength=weeks*7*24)
+    count = bincount(cell,minlength=weeks*7*24)
+    with errstate(invalid='ignore',divide='ignore'):
+        tensor = where(count>0,total/count,nan)
+    return tensor.reshape(weeks,7,24), monday
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+###########################################
+###########################################
+STREAMING INGESTION OF LIVE READINGS
+###########################################
+###########################################
+
+This module consumes live 15 minutes meter readings (one line per reading) from stdin, a file followed like "tail -f", or a
+local socket, and updates for each household, with O(1) work per reading:
+    - the day x 96 load curves (a LoadCurveStore, cf: loadcurve_store, or a dictionnary when there is no store)
+    - the rolling same-weekday baseline (cf: baseline, RollingBaseline)
+    - the monthly and seasonal sums and counts (the profiles of aggregation, kept up to date)
+    - the recommendation of the slot of the reading (cf: recommendation), from the reference and solar matrices if given
+
+A line is "timestamp,value" or "household,timestamp,value" (',' ';' or tab separated), the timestamp being the END of the
+15 minutes interval, like the measurement files (e.g. "MD_T1_MFH1,2018-01-10 12:15,0.8"). Readings can arrive out of order or
+twice: a new value of a (day, slot) replaces the previous one in every aggregate. Readings without value (NaN) are rejected.
+
+    python streaming.py --source stdin --store Results/store < readings.csv
+    python streaming.py --source tail:readings.csv
+    python streaming.py --source socket:127.0.0.1:8081
+"""
+
+import sys # import module to read stdin
+import time # import module to wait for new lines of a followed file
+import asyncio # import module to read the readings of a socket
+from collections import namedtuple # import module to create simple record types
+from numpy import zeros, datetime64, timedelta64, nan, isnan, where, errstate # import module to work with arrays / matrices
+from baseline import RollingBaseline # import module to update the same weekday baseline reading by reading
+from aggregation import season_labels # import module to give the season of a day
+from recommendation import solar_share, USE, OK, SAVE, NO_DATA, threshold, solar_weight # import module to give the light-bulb recommendations
+
+timeratio = 15 # number of minutes that separate 2 readings
+Ntmp = 96 # Number of readings for one day
+
+Reading = namedtuple('Reading',['household','timestamp','value']) # one parsed line => timestamp is a datetime64[m], END of the interval
+Update = namedtuple('Update',['household','day','slot','value','baseline','code','score']) # what a reading changed
+
+##############################################
+##############################################
+##                 SOURCES                  ##
+##############################################
+##############################################
+
+def parse_reading(line,household=None):
+
+    """Parse one line "timestamp,value" or "household,timestamp,value" => Reading, or None for an empty, header or invalid line"""
+
+    fields = line.strip().replace(';',',').replace('\t',',').split(',')
+    if len(fields)==2:
+        fields = [household]+fields
+    if len(fields)!=3:
+        return None
+    try:
+        return Reading(fields[0],datetime64(fields[1].strip().replace(' ','T'),'m'),float(fields[2]))
+    except ValueError: # e.g. the header line
+        return None
+
+def read_lines(stream):
+
+    """Lines of a file object (e.g. sys.stdin) until its end (generator)"""
+
+    for line in stream:
+        yield line
+
+def tail(filename,interval=1.,from_start=True):
+
+    """Lines of a file, followed like "tail -f": waits for the new lines written at its end (generator, never ends)
+
+    - **Input**:
+        - :filename: the file
+        - :interval: seconds between 2 checks for new lines
+        - :from_start: if True, the lines already in the file are read first"""
+
+    with open(filename) as stream:
+        if not from_start:
+            stream.seek(0,2) # end of the file
+        pending = ''
+        while True:
+            line = stream.readline()
+            if not line:
+                time.sleep(interval)
+                continue
+            pending += line
+            if pending.endswith('\n'): # only complete lines
+                yield pending
+                pending = ''
+
+async def socket_lines(host='127.0.0.1',port=8081):
+
+    """Lines sent to a local socket by any number of clients (async generator, never ends)"""
+
+    queue = asyncio.Queue()
+    async def client(reader,writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            await queue.put(line.decode())
+        writer.close()
+    server = await asyncio.start_server(client,host,port)
+    async with server:
+        while True:
+            yield await queue.get()
+
+##############################################
+##############################################
+##           LIVE HOUSEHOLD STATE           ##
+##############################################
+##############################################
+
+class LiveHousehold(object):
+
+    """Live state of one household, updated reading by reading
+
+    - **Input**:
+        - :household: the ID of the household
+        - :store: the LoadCurveStore (opened in 'r+' mode) receiving the readings, or None to keep them in memory
+        - :weeks, weighting, decay: cf: baseline, RollingBaseline
+        - :seasons: first day of each season per year, cf: aggregation, season_labels (astronomical seasons if None)
+        - :reference: (days, slots) array of the reference (e.g. canton consumption) from first_date, not scaled, or None for no recommendation
+        - :solar: (days, slots) array of the solar forecast from first_date, or None
+        - :first_date: date of the first row of reference and solar => first date of the store if None
+        - :threshold, solar_weight: cf: recommendation"""
+
+    def __init__(self,household,store=None,weeks=4,weighting='flat',decay=0.5,seasons=None,reference=None,solar=None,first_date=None,
+                 threshold=threshold,solar_weight=solar_weight):
+        self.household = household
+        self.store = store
+        self.values = {} # (day, slot) => value, when there is no store
+        self.baseline = RollingBaseline(weeks,weighting,decay,n_slots=Ntmp)
+        self.seasons = seasons
+        self.labels = {} # day => (month, season)
+        self.month_total, self.month_count = zeros((12,Ntmp)), zeros((12,Ntmp),dtype=int)
+        self.season_total, self.season_count = zeros((4,Ntmp)), zeros((4,Ntmp),dtype=int)
+        self.reference, self.solar = reference, solar
+        self.first_date = None # no recommendation without reference
+        if reference is not None:
+            self.first_date = datetime64(first_date if first_date is not None else store.first_date,'D')
+        self.shares = {} # row => solar share of the day
+        self.household_sum = self.reference_sum = 0. # sums on the slots with both a reading and a reference => scale of the reference
+        self.threshold, self.solar_weight = threshold, solar_weight
+        self.readings = self.duplicates = self.rejected = 0
+
+    def _labels(self,day):
+        if day not in self.labels:
+            self.labels[day] = (int(datetime64(day,'M').astype(int))%12, int(season_labels([day],self.seasons)[0]))
+        return self.labels[day]
+
+    def _store(self,day,slot,value):
+        if self.store is None:
+            old = self.values.get((day,slot),nan)
+            self.values[(day,slot)] = value
+            return old
+        return self.store.put_value(self.household,day,slot,value)
+
+    def _grid(self,matrix,day,slot):
+        row = int((day-self.first_date).astype(int))
+        if matrix is None or row<0 or row>=len(matrix):
+            return nan, row
+        return float(matrix[row,slot]), row
+
+    def add(self,timestamp,value):
+
+        """Add one reading
+
+        - **Input**:
+            - :timestamp: end of the 15 minutes interval (datetime64, string or datetime)
+            - :value: the reading
+
+        - **Output**:
+            - :update: Update with the day, slot, baseline, recommendation code and score of the reading (None if it was rejected)"""
+
+        if isnan(value): # e.g. "nan" in the line => it would poison the running sums
+            self.rejected += 1
+            return None
+        begin = datetime64(timestamp,'m')-timedelta64(timeratio,'m') # start of the interval
+        day = begin.astype('datetime64[D]')
+        slot = int((begin-day).astype(int))//timeratio
+        try:
+            old = self._store(day,slot,value)
+        except ValueError: # not in the calendar of the store
+            self.rejected += 1
+            return None
+        self.readings += 1
+        new = isnan(old) # otherwise a duplicate, or a correction: the previous value is replaced everywhere
+        if not new:
+            self.duplicates += 1
+
+        month, season = self._labels(day)
+        change = value-(0 if new else old)
+        self.month_total[month,slot] += change
+        self.season_total[season,slot] += change
+        self.month_count[month,slot] += new
+        self.season_count[season,slot] += new
+        expected = self.baseline.update_value(day,slot,value)
+
+        code, score = NO_DATA, nan
+        if self.first_date is not None:
+            reference, row = self._grid(self.reference,day,slot)
+            if not isnan(reference):
+                self.household_sum += change
+                self.reference_sum += reference if new else 0
+            if not isnan(reference) and self.reference_sum>0 and not isnan(expected):
+                score = reference*self.household_sum/self.reference_sum-expected
+                if self.solar is not None and 0<=row<len(self.solar):
+                    if row not in self.shares: # O(96) once per day
+                        self.shares[row] = solar_share(self.solar[row:row+1])[0]
+                    score += self.solar_weight*self.shares[row][slot]
+                code = USE if score>self.threshold else SAVE if score<-self.threshold else OK
+        return Update(self.household,day,slot,value,expected,code,score)
+
+    def monthly(self):
+
+        """Average day of each month (12, slots), from the readings so far => same as aggregation.monthly_profiles"""
+
+        with errstate(invalid='ignore',divide='ignore'):
+            return where(self.month_count>0,self.month_total/self.month_count,nan)
+
+    def seasonal(self):
+
+        """Average day of each season (4, slots), from the readings so far => same as aggregation.seasonal_profiles"""
+
+        with errstate(invalid='ignore',divide='ignore'):
+            return where(self.season_count>0,self.season_total/self.season_count,nan)
+
+##############################################
+##############################################
+##                CONSUMERS                 ##
+##############################################
+##############################################
+
+def consume(lines,households,factory=None,household=None):
+
+    """Feed parsed lines to the live households (generator of the updates)
+
+    - **Input**:
+        - :lines: iterable of lines (cf: read_lines, tail)
+        - :households: dictionnary of LiveHousehold per household ID, completed with factory
+        - :factory: function creating the LiveHousehold of a new household ID => new households are skipped if None
+        - :household: household ID of the lines without one
+
+    - **Output**: yields an Update per accepted reading"""
+
+    for line in lines:
+        update = _feed(parse_reading(line,household),households,factory)
+        if update is not None:
+            yield update
+
+async def consume_async(lines,households,factory=None,household=None):
+
+    """Same as consume, for an async iterable of lines (cf: socket_lines)"""
+
+    async for line in lines:
+        update = _feed(parse_reading(line,household),households,factory)
+        if update is not None:
+            yield update
+
+def _feed(reading,households,factory):
+    if reading is None:
+        return None
+    if reading.household not in households:
+        if factory is None:
+            return None
+        households[reading.household] = factory(reading.household)
+    return households[reading.household].add(reading.timestamp,reading.value)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from loadcurve_store import LoadCurveStore
+
+    parser = argparse.ArgumentParser(description='Streaming ingestion of live 15 minutes meter readings')
+    parser.add_argument('--source',default='stdin',help="stdin, tail:<file> or socket:<host>:<port>")
+    parser.add_argument('--store',default=None,help='folder of the LoadCurveStore receiving the readings (in memory if not given)')
+    parser.add_argument('--household',default='MD_T1_MFH1',help='household of the lines without one')
+    parser.add_argument('--flush',type=int,default=96,help='number of readings between 2 writes of the store index')
+    args = parser.parse_args()
+
+    store = LoadCurveStore(args.store,'r+') if args.store else None
+    households = {}
+    factory = lambda household: LiveHousehold(household,store)
+
+    def report(update,n):
+        print(update.household,update.day,update.slot,update.value,'baseline %.3f' % update.baseline,dict(((USE,'use'),(OK,'ok'),(SAVE,'save'))).get(update.code,'-'))
+        if store is not None and n%args.flush==0:
+            store.flush()
+
+    if args.source.startswith('socket:'):
+        host, port = args.source.split(':')[1:]
+        async def run():
+            n = 0
+            async for update in consume_async(socket_lines(host,int(port)),households,factory,args.household):
+                n += 1
+                report(update,n)
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    else:
+        lines = tail(args.source[5:]) if args.source.startswith('tail:') else read_lines(sys.stdin)
+        try:
+            for n, update in enumerate(consume(lines,households,factory,args.household),1):
+                report(update,n)
+        except KeyboardInterrupt:
+            pass
+    if store is not None:
+        store.flush()
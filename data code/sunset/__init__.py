@@ -1,8 +1,11 @@
 import datetime
 
+import numpy
+
 import sunset.afc1990 as afc1990
 import sunset.noaa as noaa
-from sunset.utils import DMS_to_decimal
+from sunset.utils import (DMS_to_decimal, hours_to_slots, get_zone,
+                          solar_day_hours, epoch_seconds, zone_offsets)
 
 
 ALGORITHMS = {
@@ -18,9 +21,15 @@ def get_sunrise(date, latitude, longitude, utc_offset, algorithm="afc1990", **kw
     date: `datetime.date` object representing the desired date
     latitude: latitude in decimal degrees (N is positive)
     longitude: longitude in decimal degrees (E is positive)
-    utc_offset: offset from UTC in hours (e.g. -5 is CDT)
+    utc_offset: offset from UTC in hours (e.g. -5 is CDT), or a time zone
+                (e.g. 'Europe/Zurich') => timezone-aware `datetime`
     algorithm: which algorithm to use
     """
+    zone = get_zone(utc_offset)
+    if zone is not None:
+        return _get_zone_datetime('sunrise', date, latitude, longitude, zone,
+                                  algorithm, **kwargs)
+
     _get_sunrise = ALGORITHMS[algorithm].get_sunrise
 
     return _get_sunrise(date, latitude, longitude, utc_offset, **kwargs)
@@ -33,14 +42,99 @@ def get_sunset(date, latitude, longitude, utc_offset, algorithm="afc1990", **kwa
     date: `datetime.date` object representing the desired date
     latitude: latitude in decimal degrees (N is positive)
     longitude: longitude in decimal degrees (E is positive)
-    utc_offset: offset from UTC in hours (e.g. -5 is CDT)
+    utc_offset: offset from UTC in hours (e.g. -5 is CDT), or a time zone
+                (e.g. 'Europe/Zurich') => timezone-aware `datetime`
     algorithm: which algorithm to use
     """
+    zone = get_zone(utc_offset)
+    if zone is not None:
+        return _get_zone_datetime('sunset', date, latitude, longitude, zone,
+                                  algorithm, **kwargs)
+
     _get_sunset = ALGORITHMS[algorithm].get_sunset
 
     return _get_sunset(date, latitude, longitude, utc_offset, **kwargs)
 
 
+def get_sun_times(dates, latitude, longitude, utc_offset, algorithm="afc1990",
+                  slot_minutes=None, epoch=False, **kwargs):
+    """Returns sunrise, sunset and solar noon for many dates in one pass, as a
+    `dict` of numpy arrays ('sunrise', 'sunset', 'noon').
+
+    The values are local fractional hours (`nan` if there is no sunrise or
+    sunset), time slot indexes if `slot_minutes` is given (-1 if there is
+    no sunrise or sunset), or seconds since 1970-01-01 00:00 UTC if `epoch`
+    is set (`nan` if there is no sunrise or sunset).
+
+    With a time zone, the local hours are wall-clock hours: the offset of the
+    zone at each sunrise, sunset and noon is used, so the summer dates get
+    the summer time.
+
+    dates: sequence of `datetime.date`, numpy `datetime64` array or pandas
+           `DatetimeIndex`
+    latitude: latitude in decimal degrees (N is positive)
+    longitude: longitude in decimal degrees (E is positive)
+    utc_offset: offset from UTC in hours (e.g. -5 is CDT), or a time zone
+                (IANA name such as 'Europe/Zurich' or `tzinfo` object)
+    algorithm: which algorithm to use
+    slot_minutes: length of a time slot in minutes (e.g. 15)
+    epoch: if True, returns epoch seconds instead of local hours
+    """
+    _get_sun_times = ALGORITHMS[algorithm].get_sun_times
+
+    zone = get_zone(utc_offset)
+    if zone is None and not epoch:
+        times = _get_sun_times(dates, latitude, longitude, utc_offset, **kwargs)
+    else:
+        dates = numpy.asarray(dates, dtype='datetime64[D]').reshape(-1)
+        times = _get_sun_times(dates, latitude, longitude, 0, **kwargs)
+        times = from_utc_hours(times, dates, longitude, utc_offset, algorithm,
+                               epoch)
+        if epoch:
+            return times
+
+    if slot_minutes is not None:
+        times = {name: hours_to_slots(hours, slot_minutes)
+                 for name, hours in times.items()}
+
+    return times
+
+
+def from_utc_hours(times, dates, longitude, utc_offset, algorithm="afc1990",
+                   epoch=False):
+    """Converts the UTC fractional hours given by `get_sun_times` with a zero
+    `utc_offset` into local hours of a fixed offset or a time zone, or into
+    epoch seconds if `epoch` is set.
+    """
+    to_local_hours = ALGORITHMS[algorithm].to_local_hours
+    zone = get_zone(utc_offset)
+    if zone is None and not epoch:
+        return {name: to_local_hours(hours, utc_offset)
+                for name, hours in times.items()}
+
+    seconds = {name: epoch_seconds(dates, solar_day_hours(hours, longitude))
+               for name, hours in times.items()}
+    if epoch:
+        return seconds
+
+    offsets = zone_offsets(numpy.stack(list(seconds.values())), zone)  # the zone is asked once for all the names
+    return {name: to_local_hours(hours, offsets[j])
+            for j, (name, hours) in enumerate(times.items())}
+
+
+def _get_zone_datetime(name, date, latitude, longitude, zone, algorithm,
+                       **kwargs):
+    seconds = get_sun_times([date], latitude, longitude, zone, algorithm,
+                            epoch=True, **kwargs)[name][0]
+    if numpy.isnan(seconds):
+        return None
+
+    return datetime.datetime.fromtimestamp(float(seconds), zone)
+
+
+from sunset.cache import SunTimeCache
+
+
 if __name__ == "__main__":
     today = datetime.date.today()
 
@@ -12,8 +12,12 @@ from __future__ import print_function
 import datetime
 from math import floor
 
+import numpy
+
 from sunset.trig import sin, cos, tan, asin, acos, atan
-from sunset.utils import DMS_to_decimal
+from sunset.trig import (array_sin, array_cos, array_tan, array_asin,
+                         array_acos, array_atan)
+from sunset.utils import DMS_to_decimal, dates_to_arrays
 
 
 DEBUG = False
@@ -322,6 +326,66 @@ def _get_sunset_or_sunrise_datetime(mode, date, latitude, longitude, utc_offset,
             datetime.timedelta(hours=local_time_hours))
 
 
+"""
+Vectorized algorithm
+
+The same steps applied to numpy arrays of dates. Steps 2, 3, 5c, 8, 9 and 10
+are plain arithmetic and are reused as is; the others are restated with numpy
+functions. Dates without sunrise or sunset (step 7a) give `nan` instead of
+raising.
+"""
+def _get_day_of_year_array(day, month, year):
+    """1. (vectorized) day of the year"""
+    N1 = numpy.floor(275 * month / 9)
+    N2 = numpy.floor((month + 9) / 12)
+    N3 = (1 + numpy.floor((year - 4 * numpy.floor(year / 4) + 2) / 3))
+    return N1 - (N2 * N3) + day - 30  # days
+
+
+def _get_suns_right_ascension_array(t):
+    """3. - 5c. (vectorized) Sun's true longitude and right ascension"""
+    M = _get_suns_mean_anomaly_step_3(t)
+    L = (M + (1.916 * array_sin(M)) + (0.020 * array_sin(2 * M)) + 282.634) % 360
+    RA = array_atan(0.91764 * array_tan(L)) % 360
+    RA = RA + (numpy.floor(L / 90) - numpy.floor(RA / 90)) * 90
+    RA = _get_suns_right_ascension_step_5c(RA)
+    return L, RA  # degrees, hours
+
+
+def _get_sunset_or_sunrise_array(mode, N, latitude, longitude, localOffset,
+                                 zenith):
+    """2. - 10. (vectorized) local time of rising or setting"""
+    zenith = ZENITHS[zenith]
+
+    t = _get_rising_or_setting_time_step_2(N, longitude, mode)
+    L, RA = _get_suns_right_ascension_array(t)
+
+    sinDec = 0.39782 * array_sin(L)
+    cosDec = array_cos(array_asin(sinDec))
+
+    cosH = (array_cos(zenith) - (sinDec * array_sin(latitude))) / (cosDec * array_cos(latitude))
+    cosH = numpy.where(numpy.abs(cosH) > 1, numpy.nan, cosH)
+
+    H = array_acos(cosH)
+    if mode == 'rising':
+        H = 360 - H
+    H = H / 15
+
+    T = _get_local_mean_time_rising_or_setting_step_8(H, RA, t)
+    UT = _get_local_mean_time_rising_or_setting_as_UTC_step_9(T, longitude)
+    return _get_local_mean_time_rising_or_setting_as_local_time_step_10(UT, localOffset)
+
+
+def _get_solar_noon_array(N, longitude, localOffset):
+    """(vectorized) local time of solar noon, steps 8 - 10 with H = 0"""
+    t = N + ((12 - longitude / 15) / 24)
+    L, RA = _get_suns_right_ascension_array(t)
+
+    T = _get_local_mean_time_rising_or_setting_step_8(0, RA, t)
+    UT = _get_local_mean_time_rising_or_setting_as_UTC_step_9(T, longitude)
+    return _get_local_mean_time_rising_or_setting_as_local_time_step_10(UT, localOffset)
+
+
 # Public functions
 
 def get_sunrise(date, latitude, longitude, utc_offset, zenith='official',
@@ -356,6 +420,39 @@ def get_sunset(date, latitude, longitude, utc_offset, zenith='official',
             'setting', date, latitude, longitude, utc_offset, zenith)
 
 
+def get_sun_times(dates, latitude, longitude, utc_offset, zenith='official',
+                  **kwargs):
+    """Returns sunrise, sunset and solar noon for many dates at once, as a
+    `dict` of numpy arrays of local fractional hours ('sunrise', 'sunset',
+    'noon'), `nan` where there is no sunrise or sunset.
+
+    dates: sequence of `datetime.date`, numpy `datetime64` array or pandas
+           `DatetimeIndex`
+    latitude: latitude in decimal degrees
+    longitude: longitude in decimal degrees
+    utc_offset: offset from UTC in hours (e.g. -5 is CDT)
+    zenith: standard definition of sunrise/sunset ('official, 'civil',
+            'nautical', 'astronomical')
+    """
+    N = _get_day_of_year_array(*dates_to_arrays(dates))
+
+    with numpy.errstate(invalid='ignore'):
+        return {
+            'sunrise': _get_sunset_or_sunrise_array(
+                'rising', N, latitude, longitude, utc_offset, zenith),
+            'sunset': _get_sunset_or_sunrise_array(
+                'setting', N, latitude, longitude, utc_offset, zenith),
+            'noon': _get_solar_noon_array(N, longitude, utc_offset)
+        }
+
+
+
+def to_local_hours(hours, utc_offset):
+    """Converts UTC fractional hours given by `get_sun_times` with a zero
+    `utc_offset` into local hours (step 10).
+    """
+    return _get_local_mean_time_rising_or_setting_as_local_time_step_10(hours, utc_offset)
+
 
 if __name__ == "__main__":
     today = datetime.date.today()
@@ -0,0 +1,173 @@
+"""
+Cache of sunrise and sunset times
+
+Sites close to each other (e.g. the households of one club) share the same
+sunrise and sunset times, so the values are computed once per distinct key
+and kept in a bounded LRU cache. The key is the year, the coordinates rounded
+to `precision` decimals (0.01 degree is about 1 km, a few seconds of sun
+time), the zenith and the algorithm, and the value is the table of all the
+days of the year, computed in one vectorized pass on the first miss. A hit
+reads the table with one day-of-year index, without a loop over the dates.
+
+Values are stored in UTC and converted to the requested `utc_offset` or time
+zone (with its summer time) when they are read. The tables can be kept on
+disk, so later runs do not compute anything.
+"""
+import collections
+import datetime
+import os
+
+import numpy
+
+import sunset
+from sunset.utils import hours_to_slots, get_zone
+
+
+class SunTimeCache(object):
+    """LRU cache of sunrise, sunset and solar noon times
+
+    maxsize: maximum number of (year, site, zenith, algorithm) tables
+    precision: number of decimals kept from the latitude and longitude
+    """
+    NAMES = ('sunrise', 'sunset', 'noon')
+
+    def __init__(self, maxsize=64, precision=2):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def info(self):
+        """Returns the hit/miss counters and the size of the cache"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        """Empties the cache and resets the counters"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _site(self, latitude, longitude):
+        return (round(latitude, self.precision),
+                round(longitude, self.precision))
+
+    def _store(self, key, values):
+        self._entries[key] = values
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _compute(self, dates, site, algorithm, zenith):
+        times = sunset.ALGORITHMS[algorithm].get_sun_times(
+            dates, site[0], site[1], 0, zenith=zenith)
+        return numpy.column_stack([times[name] for name in self.NAMES])
+
+    def _table(self, year, site, algorithm, zenith, directory=None):
+        key = (year, site, zenith, algorithm)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        path = None
+        if directory is not None:
+            path = self.table_path(directory, year, site[0], site[1],
+                                   algorithm, zenith)
+        if path is not None and os.path.exists(path):
+            with numpy.load(path) as table:
+                values = numpy.column_stack([table[name] for name in self.NAMES])
+        else:
+            dates = numpy.arange('{0}-01-01'.format(year),
+                                 '{0}-01-01'.format(year + 1),
+                                 dtype='datetime64[D]')
+            values = self._compute(dates, site, algorithm, zenith)
+            if path is not None:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                numpy.savez(path, dates=dates,
+                            **{name: values[:, j] for j, name in enumerate(self.NAMES)})
+        self._store(key, values)
+        return values
+
+    def get_sun_times(self, dates, latitude, longitude, utc_offset,
+                      algorithm="afc1990", zenith='official',
+                      slot_minutes=None, epoch=False):
+        """Same as `sunset.get_sun_times`, reading the table of each year of
+        the dates (computed in one vectorized pass if it is not in the cache
+        yet).
+        """
+        dates = numpy.asarray(dates, dtype='datetime64[D]').reshape(-1)
+        site = self._site(latitude, longitude)
+
+        years = dates.astype('datetime64[Y]')
+        day = (dates - years).astype(int)  # day of the year
+        values = numpy.empty((len(dates), len(self.NAMES)))
+        for year in numpy.unique(years):  # one table per year, usually 1 or 2
+            rows = years == year
+            values[rows] = self._table(int(year.astype(int)) + 1970, site,
+                                       algorithm, zenith)[day[rows]]
+
+        times = sunset.from_utc_hours(
+            {name: values[:, j] for j, name in enumerate(self.NAMES)},
+            dates, site[1], utc_offset, algorithm, epoch)
+        if slot_minutes is not None and not epoch:
+            times = {name: hours_to_slots(hours, slot_minutes)
+                     for name, hours in times.items()}
+
+        return times
+
+    def _get_datetime(self, name, date, latitude, longitude, utc_offset,
+                      algorithm, zenith):
+        zone = get_zone(utc_offset)
+        if zone is not None:
+            seconds = self.get_sun_times([date], latitude, longitude, zone,
+                                         algorithm=algorithm, zenith=zenith,
+                                         epoch=True)[name][0]
+            if numpy.isnan(seconds):
+                return None
+
+            return datetime.datetime.fromtimestamp(float(seconds), zone)
+
+        hours = self.get_sun_times([date], latitude, longitude, utc_offset,
+                                   algorithm=algorithm, zenith=zenith)[name][0]
+        if numpy.isnan(hours):
+            return None
+
+        return (datetime.datetime(date.year, date.month, date.day) +
+                datetime.timedelta(hours=float(hours)))
+
+    def get_sunrise(self, date, latitude, longitude, utc_offset,
+                    algorithm="afc1990", zenith='official'):
+        """Same as `sunset.get_sunrise`, through the cache"""
+        return self._get_datetime('sunrise', date, latitude, longitude,
+                                  utc_offset, algorithm, zenith)
+
+    def get_sunset(self, date, latitude, longitude, utc_offset,
+                   algorithm="afc1990", zenith='official'):
+        """Same as `sunset.get_sunset`, through the cache"""
+        return self._get_datetime('sunset', date, latitude, longitude,
+                                  utc_offset, algorithm, zenith)
+
+    def table_path(self, directory, year, latitude, longitude,
+                   algorithm="afc1990", zenith='official'):
+        """Returns the file name of the table of a site and a year"""
+        site = self._site(latitude, longitude)
+        return os.path.join(directory, 'sun_{0}_{1}_{2}_{3}_{4}.npz'.format(
+            year, site[0], site[1], algorithm, zenith))
+
+    def precompute(self, year, latitude, longitude, algorithm="afc1990",
+                   zenith='official', directory=None):
+        """Fills the cache with the table of all the days of a year for one
+        site.
+
+        If a `directory` is given, the table is read from it when it exists,
+        otherwise it is computed and written there for the next runs.
+        """
+        self._table(year, self._site(latitude, longitude), algorithm, zenith,
+                    directory)
@@ -11,7 +11,9 @@ import datetime
 
 import math
 
-from sunset.utils import DMS_to_decimal
+import numpy
+
+from sunset.utils import DMS_to_decimal, dates_to_arrays
 
 # Convert radian angle to degrees
 def radToDeg(angleRad):
@@ -397,6 +399,106 @@ def calcSunsetUTC(JD, latitude, longitude):
 
     return timeUTC
 
+# Vectorized functions
+#
+# The same computations for numpy arrays of dates, gathered in a few
+# functions. Dates without sunrise or sunset give `nan`.
+
+def calcJDArray(year, month, day):
+    """Julian day from calendar day, for arrays (see calcJD)"""
+    early = month <= 2
+    year = numpy.where(early, year - 1, year)
+    month = numpy.where(early, month + 12, month)
+
+    A = numpy.floor(year / 100)
+    B = 2 - A + numpy.floor(A / 4)
+
+    return numpy.floor(365.25 * (year + 4716)) + numpy.floor(30.6001 * (month + 1)) + day + B - 1524.5
+
+
+def calcSunApparentLongArray(t):
+    """Apparent longitude of the sun (degrees), for arrays of Julian centuries
+    since J2000.0 (see calcSunApparentLong)
+    """
+    l0 = (280.46646 + t * (36000.76983 + 0.0003032 * t)) % 360.0
+    mrad = numpy.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    C = (numpy.sin(mrad) * (1.914602 - t * (0.004817 + 0.000014 * t))
+         + numpy.sin(2 * mrad) * (0.019993 - 0.000101 * t)
+         + numpy.sin(3 * mrad) * 0.000289)
+
+    omega = numpy.radians(125.04 - 1934.136 * t)
+    return l0 + C - 0.00569 - 0.00478 * numpy.sin(omega)
+
+
+def calcEquationOfTimeAndDeclinationArray(t):
+    """Equation of time (minutes of time) and sun's declination (degrees), for
+    arrays of Julian centuries since J2000.0 (see calcEquationOfTime and
+    calcSunDeclination)
+    """
+    l0 = (280.46646 + t * (36000.76983 + 0.0003032 * t)) % 360.0
+    mrad = numpy.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    omega = numpy.radians(125.04 - 1934.136 * t)
+    lambda_ = calcSunApparentLongArray(t)
+
+    seconds = 21.448 - t * (46.8150 + t * (0.00059 - t * 0.001813))
+    epsilon = 23.0 + (26.0 + (seconds / 60.0)) / 60.0 + 0.00256 * numpy.cos(omega)
+
+    solarDec = numpy.degrees(numpy.arcsin(
+        numpy.sin(numpy.radians(epsilon)) * numpy.sin(numpy.radians(lambda_))))
+
+    y = numpy.tan(numpy.radians(epsilon) / 2.0) ** 2
+    l0rad = numpy.radians(l0)
+
+    Etime = (y * numpy.sin(2.0 * l0rad) - 2.0 * e * numpy.sin(mrad)
+             + 4.0 * e * y * numpy.sin(mrad) * numpy.cos(2.0 * l0rad)
+             - 0.5 * y * y * numpy.sin(4.0 * l0rad)
+             - 1.25 * e * e * numpy.sin(2.0 * mrad))
+
+    return numpy.degrees(Etime) * 4.0, solarDec
+
+
+def calcHourAngleArray(lat, solarDec):
+    """Hour angle of the sun at sunrise (radians), for arrays; the sunset
+    hour angle is the opposite (see calcHourAngleSunrise)
+    """
+    latRad = numpy.radians(lat)
+    sdRad = numpy.radians(solarDec)
+
+    return numpy.arccos(numpy.cos(numpy.radians(90.833)) / (numpy.cos(latRad) * numpy.cos(sdRad))
+                        - numpy.tan(latRad) * numpy.tan(sdRad))
+
+
+def calcSolNoonUTCArray(t, longitude):
+    """Solar noon in minutes from zero Z, for arrays (see calcSolNoonUTC)"""
+    eqTime, _ = calcEquationOfTimeAndDeclinationArray(
+        calcTimeJulianCent(calcJDFromJulianCent(t) + longitude / 360.0))
+    solNoonUTC = 720 + (longitude * 4) - eqTime
+
+    eqTime, _ = calcEquationOfTimeAndDeclinationArray(
+        calcTimeJulianCent(calcJDFromJulianCent(t) - 0.5 + solNoonUTC / 1440.0))
+    return 720 + (longitude * 4) - eqTime
+
+
+def calcSunriseOrSunsetUTCArray(JD, latitude, longitude, sign):
+    """Sunrise (sign=1) or sunset (sign=-1) in minutes from zero Z, for
+    arrays (see calcSunriseUTC and calcSunsetUTC)
+    """
+    t = calcTimeJulianCent(JD)
+
+    noonmin = calcSolNoonUTCArray(t, longitude)
+    tnoon = calcTimeJulianCent(JD + noonmin / 1440.0)
+
+    # First pass using solar noon, second pass includes the fractional day
+    eqTime, solarDec = calcEquationOfTimeAndDeclinationArray(tnoon)
+    timeUTC = 720 + 4 * (longitude - numpy.degrees(sign * calcHourAngleArray(latitude, solarDec))) - eqTime
+
+    newt = calcTimeJulianCent(calcJDFromJulianCent(t) + timeUTC / 1440.0)
+    eqTime, solarDec = calcEquationOfTimeAndDeclinationArray(newt)
+    return 720 + 4 * (longitude - numpy.degrees(sign * calcHourAngleArray(latitude, solarDec))) - eqTime
+
+
 # Public functions
 
 def get_sunrise(date, latitude, longitude, utc_offset, **kwargs):
@@ -449,6 +551,38 @@ def get_sunset(date, latitude, longitude, utc_offset, **kwargs):
             datetime.timedelta(minutes=mins, hours=utc_offset))
 
 
+def get_sun_times(dates, latitude, longitude, utc_offset, **kwargs):
+    """Returns sunrise, sunset and solar noon for many dates at once, as a
+    `dict` of numpy arrays of local fractional hours ('sunrise', 'sunset',
+    'noon'), `nan` where there is no sunrise or sunset.
+
+    dates: sequence of `datetime.date`, numpy `datetime64` array or pandas
+           `DatetimeIndex`
+    latitude: latitidue in decimal degrees
+    longitude: longitude in decimal degrees
+    utc_offset: offset from UTC in hours (e.g. -5 is CDT)
+    """
+    # Same reversed longitude as get_sunrise and get_sunset
+    longitude = -longitude
+
+    day, month, year = dates_to_arrays(dates)
+    jd = calcJDArray(year, month, day)
+
+    with numpy.errstate(invalid='ignore'):
+        return {
+            'sunrise': calcSunriseOrSunsetUTCArray(jd, latitude, longitude, 1) / 60 + utc_offset,
+            'sunset': calcSunriseOrSunsetUTCArray(jd, latitude, longitude, -1) / 60 + utc_offset,
+            'noon': calcSolNoonUTCArray(calcTimeJulianCent(jd), longitude) / 60 + utc_offset
+        }
+
+
+def to_local_hours(hours, utc_offset):
+    """Converts UTC fractional hours given by `get_sun_times` with a zero
+    `utc_offset` into local hours.
+    """
+    return hours + utc_offset
+
+
 if __name__ == "__main__":
     today = datetime.date.today()
 
@@ -30,3 +30,34 @@ acos = _rad_to_deg(acos)
 atan = _rad_to_deg(atan)
 
 del _rad_to_deg
+
+
+"""
+The same functions for numpy arrays, used by the vectorized computations over
+many dates at once.
+"""
+import numpy
+
+
+def _deg_to_rad(f):
+    def inner(x):
+        return f(numpy.radians(x))
+    return inner
+
+array_sin = _deg_to_rad(numpy.sin)
+array_cos = _deg_to_rad(numpy.cos)
+array_tan = _deg_to_rad(numpy.tan)
+
+del _deg_to_rad
+
+
+def _rad_to_deg(f):
+    def inner(x):
+        return numpy.degrees(f(x))
+    return inner
+
+array_asin = _rad_to_deg(numpy.arcsin)
+array_acos = _rad_to_deg(numpy.arccos)
+array_atan = _rad_to_deg(numpy.arctan)
+
+del _rad_to_deg
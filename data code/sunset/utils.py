@@ -10,3 +10,130 @@ def DMS_to_decimal(degrees, minutes, seconds):
     DD = D + M/60 + S/3600
     """
     return degrees + minutes / 60 + seconds / 3600
+
+
+def dates_to_arrays(dates):
+    """
+    Split dates into day, month and year integer arrays.
+
+    dates: sequence of `datetime.date` objects, ISO date strings, numpy
+           `datetime64` array or pandas `DatetimeIndex`
+    """
+    import numpy
+
+    dates = numpy.asarray(dates, dtype='datetime64[D]').reshape(-1)
+    months = dates.astype('datetime64[M]')
+    year = dates.astype('datetime64[Y]').astype(int) + 1970
+    month = months.astype(int) % 12 + 1
+    day = (dates - months).astype(int) + 1
+    return day, month, year
+
+
+def hours_to_slots(hours, slot_minutes):
+    """
+    Convert fractional hours into the index of the time slot of
+    `slot_minutes` minutes they fall in, -1 when there is no value (nan).
+
+    The index is the number of slot ends (00:15, 00:30, ...) that are not
+    later than the given time, the same index FindHypotheticalIndex gives
+    in the time list of createTimeList.
+    """
+    import numpy
+
+    hours = numpy.asarray(hours, dtype=float)
+    slots = numpy.full(hours.shape, -1, dtype=int)
+    valid = ~numpy.isnan(hours)
+    slots[valid] = numpy.floor(hours[valid] * 60 / slot_minutes + 1e-9).astype(int)
+    return slots
+
+
+def get_zone(utc_offset):
+    """
+    Returns the time zone of `utc_offset` as a `tzinfo` if it is a time zone
+    (an IANA name such as 'Europe/Zurich' or a `tzinfo` object), `None` if it
+    is a fixed offset from UTC in hours.
+    """
+    import datetime
+
+    if isinstance(utc_offset, datetime.tzinfo):
+        return utc_offset
+    if isinstance(utc_offset, str):
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(utc_offset)
+    return None
+
+
+def solar_day_hours(hours, longitude):
+    """
+    Move UTC fractional hours (computed with a zero `utc_offset`, possibly
+    wrapped into [0, 24)) into the solar day of the site, i.e. into
+    [-longitude / 15, 24 - longitude / 15), so that they belong to the
+    given date even far from the Greenwich meridian.
+    """
+    import numpy
+
+    lngHour = longitude / 15
+    return (numpy.asarray(hours, dtype=float) + lngHour) % 24 - lngHour
+
+
+def epoch_seconds(dates, hours):
+    """
+    Convert UTC fractional hours of dates into seconds since
+    1970-01-01 00:00 UTC (`nan` is kept).
+
+    dates: sequence of `datetime.date` objects, ISO date strings, numpy
+           `datetime64` array or pandas `DatetimeIndex`
+    """
+    import numpy
+
+    days = numpy.asarray(dates, dtype='datetime64[D]').reshape(-1).astype('int64')
+    return days * 86400. + numpy.asarray(hours, dtype=float) * 3600
+
+
+def zone_offsets(seconds, zone, span=31):
+    """
+    Offsets from UTC in hours of a time zone at instants given in epoch
+    seconds (`nan` where the instant is `nan`).
+
+    The offsets at the start of the UTC days are found by bisection: a range
+    of at most `span` days whose first and last days have the same offset is
+    taken as constant (the summer/winter time changes are months apart), so
+    the zone is asked a few dozen times per year. Only the instants of the
+    days of a change are asked one by one.
+    """
+    import datetime
+    import numpy
+
+    def offset(second):
+        return datetime.datetime.fromtimestamp(second, zone).utcoffset().total_seconds() / 3600
+
+    seconds = numpy.asarray(seconds, dtype=float)
+    offsets = numpy.full(seconds.shape, numpy.nan)
+    valid = ~numpy.isnan(seconds)
+    if not valid.any():
+        return offsets
+
+    instants = seconds[valid]
+    days = numpy.floor(instants / 86400).astype('int64')
+    first = int(days.min())
+    starts = numpy.full(int(days.max()) - first + 2, numpy.nan)  # start of each day, and of the day after the last one
+    last = len(starts) - 1
+    starts[0], starts[last] = offset(first * 86400), offset((first + last) * 86400)
+    ranges = [(0, last)]
+    while ranges:
+        lo, hi = ranges.pop()
+        if hi - lo <= 1:
+            continue
+        if hi - lo <= span and starts[lo] == starts[hi]:
+            starts[lo:hi] = starts[lo]
+            continue
+        mid = (lo + hi) // 2
+        starts[mid] = offset((first + mid) * 86400)
+        ranges += [(lo, mid), (mid, hi)]
+
+    day = days - first
+    values = starts[day]
+    for i in numpy.flatnonzero(starts[day] != starts[day + 1]):
+        values[i] = offset(float(instants[i]))
+    offsets[valid] = values
+    return offsets
@@ -17,15 +17,20 @@ https://github.com/rconradharris/pysunset
 
 """
 
-from numpy import array, zeros, repeat, amin # import module to work with arrays / matrices
-from datetime import datetime, date # import module to deal with dates, time, etc.
-from pandas import read_excel, DataFrame # import module to load excel data
-from numpy import array, concatenate # import module to work with arrays / matrices
-from sunset import get_sunset, get_sunrise # import module to access to the hours of sunrise/sunset at a precise location, at a given date
-from General_functions import createTimeList, FindHypotheticalIndex
-import matplotlib.pyplot as plt # import module to make graphs
-from matplotlib.font_manager import FontProperties
-from matplotlib.backends.backend_pdf import PdfPages
+from datetime import datetime # import module to deal with dates, time, etc.
+from pandas import DataFrame # import module to write csv data
+from ingestion import load_columns, day_slot_matrix # import module to load the measurements as typed columns, cached after the first run
+from regularize import regularize, day_grid, local_timestamps # import module to put the readings on regular UTC slots, then on local days, whatever the DST changes
+from binary_export import write_series # import module to write the compact binary time series of the front end
+from loadcurve_store import LoadCurveStore # import module to keep the household x day x slot load curves in a memory-mapped store
+from baseline import same_weekday_baseline # import module to compute the rolling same-weekday average
+from aggregation import monthly_profiles, seasonal_profiles, weekday_labels, month_list, season_list # import module to compute the monthly and seasonal profiles
+from sunset import SunTimeCache # import module to access to the hours of sunrise/sunset at a precise location, for all dates at once, computed once per site and year
+from General_functions import createTimeList
+from canton import build_reference, reference_grid, CANTON_FILES # import module to build the canton reference curve, scaled server-side for each household
+from recommendation import recommend_household, write_recommendations, threshold, solar_weight # import module to precompute the light-bulb recommendations of the front end
+from report import render_report_incremental # import module to render the PDF reports in parallel, re-rendering only the pages that changed since the last run
+from instrumentation import configure, span, count, write_report, summary # import module to time the stages of the run and write the run report
 
 dico_weekday = {0:'Monday', 1:'Tuesday', 2:'Wednesday', 3:'Thursday', 4:'Friday', 5:'Saturday', 6:'Sunday'}
 dico_weekday_index = {0:0, 1:0, 2:0, 3:0, 4:0, 5:1, 6:2} # for each weekday key returns the index value to use in the probability matrices of the Houshold objects (hld.initP, hld.transP, hld.durationD)
@@ -36,26 +41,30 @@ Time = createTimeList(Ntmp,timeratio) # create a list of string code time points
 
 
 lat, lng =  47.0982, 7.4405 # St-Imier GPS coordinates (Flexi project measurments reference location) => latitudes, longitudes
-utc_offset = 1 # Universal Time Coordinated => CDT => apparently time sumer/winter time change was not taken into account during the measurment so no need to bother with the hour switching        
+zone = 'Europe/Zurich' # time zone of the meter labels and of the sunrise/sunset hours => the summer/winter time changes are taken into account by the regularization and the sunset module
 startDay = 0 # included => int(input('Select the index of the first day taken for the simulation, between 0 and len(load): '))
 endDay = 396 # 30 # 396 # not included => int(input('Select the index of the last day taken for the simulation, between startDay and len(load)-1: '))
+configure(profile=(), memory=()) # stages profiled with cProfile / traced with tracemalloc, e.g. profile=('rendering',) => in the run report
 
-data = read_excel('MD_T1_MFH1.xlsx')#,na_values="*)") # load excel file
-matrixdata = data.as_matrix() # convert data into a matrix
+with span('ingestion'):
+    meter = load_columns('MD_T1_MFH1.xlsx', 'Results/cache', 'household') # Datum + Zeit (datetime64) and Wirkleistung (float32) columns => memory-mapped from Results/cache after the first run
+    regular = regularize(meter.timestamps, meter.values, zone, timeratio, duplicates='last', fill='nan') # local labels => one UTC slot per 15 minutes, gaps and duplicates detected => cf: regularize
+    grid = day_grid(regular, zone, timeratio) # back on local days of 96 slots => the skipped hour of the spring DST change is NaN, the repeated hour of the autumn change is averaged
+    print('Regularization:', regular.report['duplicates'], 'duplicates,', regular.report['gaps'], 'missing slots,', sum(grid.slots!=Ntmp), 'DST days')
 
-Datum = array(matrixdata[0:len(matrixdata),0:1])[list(range(len(matrixdata))),[0]*len(matrixdata)] # devCode is the list of devices' names =>  to correct the really annoying format of the original array loaded by the matlab file... => we move from array([array([0]),array([1])...]) to array([0,1]), which is way more suitable for the next parts !       
-Zeit = array(matrixdata[0:len(matrixdata),1:2])[list(range(len(matrixdata))),[0]*len(matrixdata)] # devCode is the list of devices' names =>  to correct the really annoying format of the original array loaded by the matlab file... => we move from array([array([0]),array([1])...]) to array([0,1]), which is way more suitable for the next parts !       
-Wirkleistung = array(matrixdata[0:len(matrixdata),2:3])[list(range(len(matrixdata))),[0]*len(matrixdata)] # devCode is the list of devices' names =>  to correct the really annoying format of the original array loaded by the matlab file... => we move from array([array([0]),array([1])...]) to array([0,1]), which is way more suitable for the next parts !       
+    Dates = [str(day) for day in grid.dates] # date of each day (the 96 timepoints of a day start at 00:15 and end at 00:00 the next day)
+    Timestamps = local_timestamps(grid.dates, Ntmp, timeratio) # end of each 15 minutes interval
+    Wirkleistung = grid.values.reshape(-1) # measured Wirkleistung, NaN where not measured
 
-Dates = [] # empty list
-for day in Datum[1:]: # loop for each line/row of the file
-    Dates.append(str(day).split(' ')[0]) # saving the date
-Dates = list(zip(*[iter(Dates)]*Ntmp)) # changing the list into a list of sub-lists => each sublist corresponds to one day timepoints (96 x 15 minutes)
-Dates = [sorted(list(set(dates)))[0] for dates in Dates] # we want each date only onc
+    loadcurve = grid.values # total loadcurve of the selected Household => each row corresponds to the loadcurve for one day (96 x 15 minutes timepoints)
+    loadcurve = loadcurve*4*1000 # loadcurve converted from kiloWatt hour per 15min [kWh] in Watt [W]
 
-loadcurve = array(list(zip(*[iter(list(Wirkleistung[1:]))]*Ntmp))) # total loadcurve of the selected Household => list subdivided into sub-lists => each sublist corresponds to the loadcurve for one day (96 x 15 minutes timepoints)
-loadcurve = loadcurve*4*1000 # loadcurve converted from kiloWatt hour per 15min [kWh] in Watt [W]
+with span('store'):
+    store = LoadCurveStore.open('Results/store', Dates[0], len(Dates), Ntmp) # store of the load curves of all households => the fleet analyses slice it without loading everything
+    store.put('MD_T1_MFH1', loadcurve, Dates[0]) # add (or update) the selected Household
+    loadcurve = store.household('MD_T1_MFH1') # memory-mapped (days x 96) load curves of the selected Household
 
+today = datetime.now().strftime('%Y-%m-%d_%H-%M-%S') # time of the run, used in the file names of the results
 
 seasons = {
 '2017':{'spring':'03-20','summer':'06-21','autumn':'09-22','winter':'12-21'},
@@ -67,210 +76,69 @@ seasons = {
 # ------------------------ #
 # 4 previous weeks Average #
 # ------------------------ #            
-Average4 = zeros((len(loadcurve),len(loadcurve[0]))) + loadcurve
-Average4 += roll(loadcurve,-21,0)
-Average4 += roll(loadcurve,-14,0)
-Average4 += roll(loadcurve,-7,0)
-Average4 /= 4
-Average4 = Average4/4/1000
-
-averageFrame = array(zeros((len(Wirkleistung[1:]),4)),dtype=object)
-averageFrame[:,0] = Datum[1:] #array(Time*396)
-averageFrame[:,1] = Zeit[1:]
-averageFrame[:,2] = reshape(Average4,len(Wirkleistung[1:]))
-averageFrame[:,3] = Wirkleistung[1:]
-DataFrame(averageFrame).to_csv('Results/4weeks_dataset1.csv')
-
-month_average = zeros((len(loadcurve),len(loadcurve[0])))
-season_average = zeros((len(loadcurve),len(loadcurve[0])))
-"""
-split = Dates[Nday].split(' ')[0].split('-') # splits the day string into a list separating the day, month and year
-dateofday = date(int(split[0]),int(split[1]),int(split[2])) # uses the datetime module to give the exact date in a usable format
-old_month = str(dateofday).split('-')[1]
-M = 0
-"""
-S = 0
-
-for Nday in range(startDay,min(endDay,len(loadcurve))): # main loop of the simulation for the day => mesload is the measured loadcurve        
-        
-        # -------------------------------- #
-        #   Find the weekday of the date   #
-        # -------------------------------- #
-        split = Dates[Nday].split(' ')[0].split('-') # splits the day string into a list separating the day, month and year
-        dateofday = date(int(split[0]),int(split[1]),int(split[2])) # uses the datetime module to give the exact date in a usable format
-        weekday = dateofday.weekday() # uses the datetime module: gives the week of the day for the given date in the form of an integer (0=monday, 1=tuesday, 2=wednesday, 3=thursday, 4=friday, 5=saturday, 6=sunday)
-        year = str(dateofday).split('-')[0]
-        day = dico_weekday[weekday] # day of the week in string (monday, tuesday, wednesday, thursday, friday, saturday, sunday)
-        month = str(dateofday).split('-')[1]
-        daymonth = str(dateofday).split('-')[2] 
-    
-
-        # --------------- #
-        # Monthly Average #
-        # --------------- #  
-        month_average[int(month)] += loadcurve[Nday]
-        """
-        if old_month == month:
-            M += 1
-        else:
-            month_average[int(month)-1] /= M
-            M = 0
-            old_month = month
-        """
-        
-        # -------------- #
-        # season Average #
-        # -------------- #
-        index = Dates.index(str(dateofday))
-        if 50 < index < 143: # Autumn 2017
-            case = 2
-        elif 143 < index < 232: # Winter 2017-2018
-            case = 3
-        elif 232 < index < 324: # Spring 2018
-            case = 0
-        else: # Summer -> mix 2017-2018
-            case = 1
-        season_average[case] += loadcurve[Nday]
-
-month_average[0] /= 31
-month_average[1] /= 28
-month_average[2] /= 31
-month_average[3] /= 30
-month_average[4] /= 31
-month_average[5] /= 30
-month_average[6] /= 31
-month_average[7] /= 30
-month_average[8] /= 31
-month_average[9] /= 30
-month_average[10] /= 31
-month_average[11] /= 30
-month_average[12] /= 31
-
-
-
-season_average[2] /= 143-50
-season_average[3] /= 232-143
-season_average[0] /= 324-232
-season_average[1] /= len(Dates)-324+50
+with span('averaging'):
+    Average4 = same_weekday_baseline(loadcurve, weeks=4) # average of the same weekday over the 4 previous weeks (the day included), without wrapping around the ends of the dataset => cf: baseline
+    Average4 = Average4/4/1000 # back in kiloWatt hour per 15min [kWh], like Wirkleistung
+
+    averageFrame = DataFrame({'DateTime':Timestamps.astype('datetime64[s]'), 'average':Average4.reshape(-1), 'power':Wirkleistung}) # same columns as the file read by the front end
+    averageFrame.to_csv('Results/4weeks_dataset1.csv', index=False, float_format='%g')
+    write_series('Results/4weeks_dataset1.bin', Timestamps[0], timeratio, [('average',Average4.reshape(-1)), ('power',Wirkleistung)]) # same series in the compact binary format => cf: binary_export
+
+# --------------------------------- #
+# Light-bulb recommendations (int8) #
+# --------------------------------- #
+with span('recommendations'):
+    canton = reference_grid(store.dates(), CANTON_FILES, 'Results/cache', Ntmp, zone) # consumption of the canton, the reference of the front end => regularized like the household, on the calendar of the store
+    reference = canton[store.day_index(Dates[0]):][:len(Dates)] # on the days of the household
+    solar = load_columns('Solarenergie-6.csv', 'Results/cache', 'solar') # solar energy forecast of the 4 TSO
+    solar = day_slot_matrix(solar.timestamps, solar.values, Dates, Ntmp) # NaN on the days without forecast => no solar term
+    codes, scores = recommend_household(loadcurve/4/1000, reference, solar) # use/ok/save code and score of each 15 minutes slot, in kWh per 15 minutes like the front end => cf: recommendation
+    write_recommendations('Results/recommendations', 'MD_T1_MFH1', Dates[0], codes, scores, threshold=threshold, solar_weight=solar_weight) # 96 bytes of codes per day
+    build_reference(store, 'Results/reference', 'canton', CANTON_FILES, 'Results/cache', reference=canton) # the same canton grid and the scale factors of the households of the store, served by server.py
+
+# ------------------------------ #
+# Monthly and seasonal Averages  #
+# ------------------------------ #
+with span('aggregation'):
+    month_average = monthly_profiles(loadcurve, Dates)['mean'] # average day of each month (0 = January), divided by the exact number of days of each month in the dataset => cf: aggregation
+    season_average = seasonal_profiles(loadcurve, Dates, seasons)['mean'] # average day of each season (0 = Spring), with the season start dates given above
+
+# ---------------------------------------------------- #
+# Calculate sunrise and sunset hours for all the dates # 
+# ---------------------------------------------------- #
+with span('ephemeris'):
+    sun_cache = SunTimeCache() # cache of the sunrise/sunset hours => tables per site and year are kept in Results/sun so the next runs do not compute them again
+    for year in sorted(set(dates[:4] for dates in Dates)): # each year of the dataset
+        sun_cache.precompute(int(year), lat, lng, directory='Results/sun') # computes (or reads) the table of the year for this site
+    sun_slots = sun_cache.get_sun_times(grid.dates, lat, lng, zone, slot_minutes=timeratio) # uses the sunset module to calculate the sunrise/sunset time points (indexes in Time, wall-clock time with the summer time) of every day in one pass
+    count('sun days',len(Dates))
 
 ####################################
 # CREATE FILES FOR RESULTS STORAGE #
 ####################################
 
-with PdfPages('Results/Loadcurve_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf') as pdf:
-
-    ###########################################
-    # FIRST MAIN LOOP - FOR EACH MEASURED DAY #
-    ###########################################
-        
-    for Nday in range(startDay,min(endDay,len(loadcurve))): # main loop of the simulation for the day => mesload is the measured loadcurve        
-        
-        print('Progression Run:\tDay ===',Nday+1,'/',endDay)
-        
-        
-        # -------------------------------- #
-        #   Find the weekday of the date   #
-        # -------------------------------- #
-        split = Dates[Nday].split(' ')[0].split('-') # splits the day string into a list separating the day, month and year
-        dateofday = date(int(split[0]),int(split[1]),int(split[2])) # uses the datetime module to give the exact date in a usable format
-        weekday = dateofday.weekday() # uses the datetime module: gives the week of the day for the given date in the form of an integer (0=monday, 1=tuesday, 2=wednesday, 3=thursday, 4=friday, 5=saturday, 6=sunday)
-        year = str(dateofday).split('-')[0]
-        day = dico_weekday[weekday] # day of the week in string (monday, tuesday, wednesday, thursday, friday, saturday, sunday)
-        month = str(dateofday).split('-')[1]
-        daymonth = str(dateofday).split('-')[2] 
-        
-
-        # ---------------------------------------------------- #
-        # Calculate sunrise and sunset hours at the given date # 
-        # ---------------------------------------------------- #
-        sunset = str(get_sunset(dateofday, lat, lng, utc_offset)).split(' ')[1] # uses the sunset module to calculate the sunset hour at this date
-        sunrise = str(get_sunrise(dateofday, lat, lng, utc_offset)).split(' ')[1] # uses the sunset module to calculate the sunrise hour at this date
-        sunset_index = FindHypotheticalIndex(Time,sunset)
-        sunrise_index = FindHypotheticalIndex(Time,sunrise)
-        
-        # ----------------------------------------------- #
-        # PDF containg graphs for each day of the profile #
-        # ----------------------------------------------- #
-        fig=plt.figure # initialize a figure
-        
-        OBSERVED = plt.plot(Time,loadcurve[Nday],linestyle="-",marker="",label="Observed",color="green") # make the graph
-        #AVERAGE = plt.plot(Time,Average4[Nday]*4*1000,linestyle="-",marker="",label="Average 4 w",color="cyan") # make the graph
-        plt.grid(True)
-        ax=plt.gca() # To customize the axis ticks A
-        ax.set_xticks([0,16,32,48,64,80,95]) # choose which x locations to have ticks
-        ax.set_xticklabels(['00:15','04:15','08:15','12:15','16:15','20:15','24:00']) # set the labels to display at those ticks
-            
-        ax.annotate('', xy=(Time[sunrise_index], min(loadcurve[Nday])-0.003), xytext=(Time[sunrise_index], min(loadcurve[Nday])-0.006),arrowprops=dict(facecolor='darkorange', shrink=0.05,headwidth=7))
-        ax.annotate('', xy=(Time[sunset_index], min(loadcurve[Nday])-0.003), xytext=(Time[sunset_index], min(loadcurve[Nday])-0.006),arrowprops=dict(facecolor='turquoise', shrink=0.05,headwidth=7))
-
-        plt.suptitle('Load curve of '+day+' '+str(dateofday)+' for MD_T1_MFH1')
-        plt.xlabel("Time [15 minutes timepoints]") # title for X axis
-        plt.ylabel("Energy in Watt [W]") # title for Y axis
-        
-        
-        fontP = FontProperties()
-        fontP.set_size('small') # xx-small / x-small / small / medium / large / x-large / xx-large
-        plt.legend([OBSERVED[0]])
-        #plt.legend([OBSERVED[0],AVERAGE[0]])
-            
-        pdf.savefig(bbox_inches='tight')
-        plt.clf()
-
-with PdfPages('Results/month_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf') as pdf:
-    
-    month_list = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-    
-    for i in range(12):
-        
-        # ----------------------------------------------- #
-        # PDF containg graphs for each day of the profile #
-        # ----------------------------------------------- #
-        fig=plt.figure # initialize a figure
-        
-        MONTH = plt.plot(Time,month_average[i],linestyle="-",marker="",label="Month",color="green") # make the graph
-        plt.grid(True)
-        ax=plt.gca() # To customize the axis ticks A
-        ax.set_xticks([0,16,32,48,64,80,95]) # choose which x locations to have ticks
-        ax.set_xticklabels(['00:15','04:15','08:15','12:15','16:15','20:15','24:00']) # set the labels to display at those ticks
-            
-        plt.suptitle('Load curve of '+month_list[i]+' for MD_T1_MFH1')
-        plt.xlabel("Time [15 minutes timepoints]") # title for X axis
-        plt.ylabel("Energy in Watt [W]") # title for Y axis        
-        
-        fontP = FontProperties()
-        fontP.set_size('small') # xx-small / x-small / small / medium / large / x-large / xx-large
-        #plt.legend([OBSERVED[0])
-        plt.legend([MONTH[0]])
-            
-        pdf.savefig(bbox_inches='tight')
-        plt.clf()    
-    
-
-with PdfPages('Results/season_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf') as pdf:
-    
-    season_list = ['Spring','Summer','Autumn','Winter']
-    
-    for i in range(4):
-        
-        # ----------------------------------------------- #
-        # PDF containg graphs for each day of the profile #
-        # ----------------------------------------------- #
-        fig=plt.figure # initialize a figure
-        
-        SEASON = plt.plot(Time,season_average[i],linestyle="-",marker="",label="Season",color="green") # make the graph
-        plt.grid(True)
-        ax=plt.gca() # To customize the axis ticks A
-        ax.set_xticks([0,16,32,48,64,80,95]) # choose which x locations to have ticks
-        ax.set_xticklabels(['00:15','04:15','08:15','12:15','16:15','20:15','24:00']) # set the labels to display at those ticks
-            
-        plt.suptitle('Load curve of '+season_list[i]+' for MD_T1_MFH1')
-        plt.xlabel("Time [15 minutes timepoints]") # title for X axis
-        plt.ylabel("Energy in Watt [W]") # title for Y axis        
-        
-        fontP = FontProperties()
-        fontP.set_size('small') # xx-small / x-small / small / medium / large / x-large / xx-large
-        #plt.legend([OBSERVED[0])
-        plt.legend([SEASON[0]])
-            
-        pdf.savefig(bbox_inches='tight')
-        plt.clf()    
+workers = None # number of processes rendering the PDF pages => None for the number of CPUs, 1 to render in this process only
+chunk_size = 32 # number of pages rendered at once by a process
+page_cache = 'Results/pages' # one PDF file per page, named after the hash of its content => the next runs only render the new or changed pages
+
+days = range(startDay,min(endDay,len(loadcurve))) # the measured days of the report
+weekdays = weekday_labels(Dates) # uses the aggregation module: gives the week of the day for each date in the form of an integer (0=monday, 1=tuesday, 2=wednesday, 3=thursday, 4=friday, 5=saturday, 6=sunday)
+
+with span('rendering'):
+    pages = [{'title':'Load curve of '+dico_weekday[weekdays[Nday]]+' '+Dates[Nday]+' for MD_T1_MFH1', # PDF containg graphs for each day of the profile
+              'curves':[(loadcurve[Nday],'Observed','green')], # [(Average4[Nday]*4*1000,'Average 4 w','cyan')] to add the average
+              'sunrise':sun_slots['sunrise'][Nday], 'sunset':sun_slots['sunset'][Nday]} for Nday in days]
+    n = render_report_incremental(pages,'Results/Loadcurve_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf',page_cache,workers,chunk_size)
+    print('Loadcurve:',n,'/',len(pages),'pages rendered')
+
+    pages = [{'title':'Load curve of '+month_list[i]+' for MD_T1_MFH1', 'curves':[(month_average[i],'Month','green')]} for i in range(12)] # PDF containg graphs for each month of the profile
+    n = render_report_incremental(pages,'Results/month_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf',page_cache,workers,chunk_size)
+    print('month:',n,'/',len(pages),'pages rendered')
+
+    pages = [{'title':'Load curve of '+season_list[i]+' for MD_T1_MFH1', 'curves':[(season_average[i],'Season','green')]} for i in range(4)] # PDF containg graphs for each season of the profile
+    n = render_report_incremental(pages,'Results/season_'+str(startDay)+'-'+str(endDay)+'_'+today+'.pdf',page_cache,workers,chunk_size)
+    print('season:',n,'/',len(pages),'pages rendered')
+
+report_file = write_report('Results', 'run_'+today+'.json', household='MD_T1_MFH1', days=len(Dates), startDay=startDay, endDay=endDay) # time of each stage, rows parsed, pages rendered... => cf: instrumentation
+print(summary())
+print('run report:',report_file)